@@ -25,7 +25,7 @@
 #
 
 __all__ = [
-    "BME280", "BME280Error",
+    "BME280", "BME280Error", "BME280Stats", "BME280Transport",
     "MODE_SLEEP", "MODE_FORCED", "MODE_NORMAL",
     "OVSMPL_SKIP", "OVSMPL_1", "OVSMPL_2", "OVSMPL_4", "OVSMPL_8", "OVSMPL_16",
     "T_SB_p5ms", "T_SB_10ms", "T_SB_20ms", "T_SB_62p5ms", "T_SB_125ms", "T_SB_250ms", "T_SB_500ms", "T_SB_1000ms",
@@ -34,7 +34,7 @@ __all__ = [
 ]
 
 # Export public classes
-from .bme280 import BME280, BME280Error
+from .bme280 import BME280, BME280Error, BME280Stats, BME280Transport
 # Export public constants
 from .bme280 import MODE_SLEEP, MODE_FORCED, MODE_NORMAL
 from .bme280 import OVSMPL_SKIP, OVSMPL_1, OVSMPL_2, OVSMPL_4, OVSMPL_8, OVSMPL_16
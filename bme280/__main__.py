@@ -0,0 +1,420 @@
+#
+# BME280 device driver - Command line data logger
+# Copyright (c) 2020-2023 Michael Büsch <m@bues.ch>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import argparse
+import asyncio
+import json
+import struct
+import sys
+import time
+
+import bme280
+
+OVSMPL = {
+    "0"     : bme280.OVSMPL_SKIP,
+    "1"     : bme280.OVSMPL_1,
+    "2"     : bme280.OVSMPL_2,
+    "4"     : bme280.OVSMPL_4,
+    "8"     : bme280.OVSMPL_8,
+    "16"    : bme280.OVSMPL_16,
+}
+
+FILTER = {
+    "0"     : bme280.FILTER_OFF,
+    "2"     : bme280.FILTER_2,
+    "4"     : bme280.FILTER_4,
+    "8"     : bme280.FILTER_8,
+    "16"    : bme280.FILTER_16,
+}
+
+T_SB = {
+    "0.5"   : bme280.T_SB_p5ms,
+    "10"    : bme280.T_SB_10ms,
+    "20"    : bme280.T_SB_20ms,
+    "62.5"  : bme280.T_SB_62p5ms,
+    "125"   : bme280.T_SB_125ms,
+    "250"   : bme280.T_SB_250ms,
+    "500"   : bme280.T_SB_500ms,
+    "1000"  : bme280.T_SB_1000ms,
+}
+
+CALC = {
+    "float" : bme280.CALC_FLOAT,
+    "int32" : bme280.CALC_INT32,
+    "int64" : bme280.CALC_INT64,
+}
+
+class LogWriter:
+    """Buffered sample writer base class.
+    """
+    __slots__ = (
+        "_fd",
+        "_flushInterval",
+        "_nextFlush",
+    )
+
+    def __init__(self, fd, flushInterval):
+        self._fd = fd
+        self._flushInterval = flushInterval
+        self._nextFlush = time.monotonic() + flushInterval
+
+    def writeSample(self, timestamp, sensor, t, h, p):
+        """Write one sample and flush, if the flush interval elapsed.
+        """
+        self._write(timestamp, sensor, t, h, p)
+        now = time.monotonic()
+        if now >= self._nextFlush:
+            self._fd.flush()
+            self._nextFlush = now + self._flushInterval
+
+    def _write(self, timestamp, sensor, t, h, p):
+        raise NotImplementedError
+
+    def close(self):
+        self._fd.flush()
+
+class CsvWriter(LogWriter):
+    """CSV sample writer.
+    """
+    __slots__ = (
+    )
+
+    def __init__(self, fd, flushInterval):
+        LogWriter.__init__(self, fd, flushInterval)
+        fd.write(b"timestamp,sensor,temperature,humidity,pressure\n")
+
+    def _write(self, timestamp, sensor, t, h, p):
+        self._fd.write(b"%.6f,%d,%.2f,%.4f,%.1f\n" % (timestamp, sensor, t, h, p))
+
+class JsonWriter(LogWriter):
+    """JSON lines sample writer.
+    """
+    __slots__ = (
+    )
+
+    def _write(self, timestamp, sensor, t, h, p):
+        self._fd.write(json.dumps({
+            "timestamp"     : round(timestamp, 6),
+            "sensor"        : sensor,
+            "temperature"   : round(t, 2),
+            "humidity"      : round(h, 4),
+            "pressure"      : round(p, 1),
+        }).encode("UTF-8") + b"\n")
+
+class BinaryWriter(LogWriter):
+    """Binary sample writer.
+    The file starts with the 8 byte MAGIC.
+    Each sample is a little endian RECORD:
+    timestamp (double, seconds), sensor index (u8),
+    temperature (s16, 1/100 degree C), humidity (u16, 1/100 %),
+    pressure (u32, 1/100 Pa).
+    """
+    __slots__ = (
+    )
+
+    MAGIC = b"BME280L1"
+    RECORD = struct.Struct("<dBhHI")
+
+    def __init__(self, fd, flushInterval):
+        LogWriter.__init__(self, fd, flushInterval)
+        fd.write(self.MAGIC)
+
+    def _write(self, timestamp, sensor, t, h, p):
+        self._fd.write(self.RECORD.pack(timestamp,
+                                        sensor,
+                                        round(t * 100.0),
+                                        round(h * 10000.0),
+                                        round(p * 100.0)))
+
+WRITERS = {
+    "csv"       : CsvWriter,
+    "json"      : JsonWriter,
+    "binary"    : BinaryWriter,
+}
+
+def parseI2C(spec):
+    """Parse an I2C sensor specification BUS[:ADDR][@MUX:CHANNEL].
+    """
+    spec, _, mux = spec.partition("@")
+    bus, _, addr = spec.partition(":")
+    i2cBus = int(bus, 0)
+    if mux:
+        mux, _, channel = mux.partition(":")
+        i2cBus = {
+            "index"     : i2cBus,
+            "mux"       : int(mux, 0),
+            "channel"   : int(channel, 0) if channel else 0,
+        }
+    return {
+        "i2cBus"    : i2cBus,
+        "i2cAddr"   : int(addr, 0) if addr else 0x76,
+    }
+
+def parseSPI(spec):
+    """Parse an SPI sensor specification BUS:CS.
+    """
+    bus, _, cs = spec.partition(":")
+    return {
+        "spiBus"    : int(bus, 0),
+        "spiCS"     : int(cs, 0) if cs else 0,
+    }
+
+def busOf(spec):
+    """The physical bus of a parsed sensor specification.
+    """
+    if "spiBus" in spec:
+        return ("spi", spec["spiBus"])
+    bus = spec["i2cBus"]
+    if isinstance(bus, dict):
+        bus = bus["index"]
+    return ("i2c", bus)
+
+class Logger:
+    """Sample all sensors at the target rate and write the results.
+    """
+    __slots__ = (
+        "__sensors",
+        "__schedule",
+        "__writer",
+        "__settings",
+        "__normalMode",
+        "__rate",
+        "__pollSleep",
+        "samples",
+        "dropped",
+        "errors",
+        "elapsed",
+    )
+
+    def __init__(self, sensors, buses, writer, settings, normalMode, rate, pollSleep):
+        """'sensors': List of BME280 instances.
+        'buses': The physical bus of each sensor. See busOf().
+        """
+        self.__sensors = sensors
+        # Sensors on different buses are sampled concurrently.
+        # On one bus the sensors behind the same multiplexer channel are
+        # sampled as a group, one channel after the other, to minimize
+        # channel switches.
+        channelsByBus = {}
+        for i, bme in enumerate(sensors):
+            channels = channelsByBus.setdefault(buses[i], {})
+            channels.setdefault(bme.muxChannel, []).append(i)
+        self.__schedule = [
+            [ channels[c] for c in sorted(channels, key=lambda c: c or (-1, -1)) ]
+            for channels in channelsByBus.values()
+        ]
+        self.__writer = writer
+        self.__settings = settings
+        self.__normalMode = normalMode
+        self.__rate = rate
+        self.__pollSleep = pollSleep
+        self.samples = 0
+        self.dropped = 0
+        self.errors = 0
+        self.elapsed = 0.0
+
+    async def __sampleOne(self, index, bme):
+        try:
+            if self.__normalMode:
+                t, h, p = await bme.readAsync()
+            else:
+                t, h, p = await bme.readForcedAsync(pollSleep=self.__pollSleep,
+                                                    **self.__settings)
+        except bme280.BME280Error as e:
+            print("Sensor %d: %s" % (index, str(e)), file=sys.stderr)
+            self.errors += 1
+            return
+        self.__writer.writeSample(time.time(), index, t, h, p)
+        self.samples += 1
+
+    async def __sampleBus(self, groups):
+        """Sample the channel groups of one bus.
+        The sensors of a group are sampled concurrently. The next group
+        is only started after the previous one completed.
+        """
+        sensors = self.__sensors
+        for group in groups:
+            await asyncio.gather(*(self.__sampleOne(i, sensors[i]) for i in group))
+
+    async def run(self, count=None, duration=None):
+        """Run the sampling loop until 'count' sampling rounds
+        or 'duration' seconds are done, or until cancelled.
+        """
+        if self.__normalMode:
+            for bme in self.__sensors:
+                await bme.startAsync(mode=bme280.MODE_NORMAL, **self.__settings)
+        period = (1.0 / self.__rate) if self.__rate > 0 else 0.0
+        begin = time.monotonic()
+        deadline = begin
+        rounds = 0
+        try:
+            while count is None or rounds < count:
+                now = time.monotonic()
+                if duration is not None and now - begin >= duration:
+                    break
+                if period:
+                    if now < deadline:
+                        await asyncio.sleep(deadline - now)
+                    elif now - deadline >= period:
+                        # We are late by at least one full period.
+                        # Skip the missed slots instead of bursting.
+                        missed = int((now - deadline) / period)
+                        self.dropped += missed * len(self.__sensors)
+                        deadline += missed * period
+                    deadline += period
+                await asyncio.gather(*(self.__sampleBus(groups)
+                                       for groups in self.__schedule))
+                rounds += 1
+        finally:
+            self.elapsed = time.monotonic() - begin
+
+def serve(args, specs, settings):
+    """Run the multi client sensor daemon.
+    """
+    from bme280.daemon import SensorDaemon
+    sensors = []
+    try:
+        for spec in specs:
+            sensors.append(bme280.BME280(busFreq=args.bus_freq,
+                                         calc=CALC[args.calc],
+                                         **spec))
+        daemon = SensorDaemon(args.serve, sensors,
+                              interval=((1.0 / args.rate) if args.rate > 0 else None),
+                              pollSleep=args.poll,
+                              **settings)
+        try:
+            daemon.run()
+        except KeyboardInterrupt:
+            pass
+    except bme280.BME280Error as e:
+        print("BME280 error: %s" % str(e), file=sys.stderr)
+        return 1
+    finally:
+        for bme in sensors:
+            bme.close()
+    return 0
+
+def main(argv=None):
+    p = argparse.ArgumentParser(
+        prog="python -m bme280",
+        description="BME280 data logger.")
+    p.add_argument("-i", "--i2c", metavar="BUS[:ADDR][@MUX:CHANNEL]", action="append", default=[],
+                   help="Add an I2C sensor on bus index BUS with address ADDR (default 0x76). "
+                        "If the sensor is behind a TCA9548A multiplexer, MUX is the "
+                        "multiplexer address and CHANNEL the channel number. "
+                        "May be given multiple times.")
+    p.add_argument("-s", "--spi", metavar="BUS:CS", action="append", default=[],
+                   help="Add an SPI sensor on bus index BUS with chip select CS. "
+                        "May be given multiple times.")
+    p.add_argument("-F", "--bus-freq", type=int, default=100,
+                   help="Bus clock frequency, in kHz. Default: 100")
+    p.add_argument("-m", "--mode", choices=("forced", "normal"), default="forced",
+                   help="Sensor operation mode. Default: forced")
+    p.add_argument("-T", "--osrs-t", choices=OVSMPL.keys(), default="1",
+                   help="Temperature oversampling. Default: 1")
+    p.add_argument("-H", "--osrs-h", choices=OVSMPL.keys(), default="1",
+                   help="Humidity oversampling. Default: 1")
+    p.add_argument("-P", "--osrs-p", choices=OVSMPL.keys(), default="1",
+                   help="Pressure oversampling. Default: 1")
+    p.add_argument("-f", "--filter", choices=FILTER.keys(), default="0",
+                   help="IIR filter coefficient. Default: 0 (off)")
+    p.add_argument("-S", "--standby", choices=T_SB.keys(), default="0.5",
+                   help="Normal mode standby time, in ms. Default: 0.5")
+    p.add_argument("-c", "--calc", choices=CALC.keys(), default="float",
+                   help="Compensation calculation mode. Default: float")
+    p.add_argument("-r", "--rate", type=float, default=1.0,
+                   help="Target sampling rate per sensor, in Hz. "
+                        "0 means as fast as possible. Default: 1")
+    p.add_argument("--poll", type=float, default=0.001,
+                   help="Forced mode status poll interval, in seconds. Default: 0.001")
+    p.add_argument("-n", "--count", type=int, default=None,
+                   help="Stop after this many sampling rounds.")
+    p.add_argument("-d", "--duration", type=float, default=None,
+                   help="Stop after this many seconds.")
+    p.add_argument("-o", "--output", default="-",
+                   help="Output file. Default: - (stdout)")
+    p.add_argument("-O", "--format", choices=WRITERS.keys(), default="csv",
+                   help="Output format. Default: csv")
+    p.add_argument("--flush", type=float, default=1.0,
+                   help="Output flush interval, in seconds. Default: 1")
+    p.add_argument("--serve", metavar="SOCKET", default=None,
+                   help="Do not log. Instead run a daemon that shares the sensors "
+                        "with local clients on the Unix domain socket SOCKET. "
+                        "The sensors are sampled in forced mode at the target rate.")
+    args = p.parse_args(argv)
+
+    specs = [ parseI2C(s) for s in args.i2c ] + [ parseSPI(s) for s in args.spi ]
+    if not specs:
+        p.error("No sensor specified. Use --i2c or --spi.")
+
+    settings = {
+        "filter"                : FILTER[args.filter],
+        "tempOversampling"      : OVSMPL[args.osrs_t],
+        "humidityOversampling"  : OVSMPL[args.osrs_h],
+        "pressureOversampling"  : OVSMPL[args.osrs_p],
+    }
+    if args.mode == "normal":
+        settings["standbyTime"] = T_SB[args.standby]
+
+    if args.serve:
+        return serve(args, specs, settings)
+
+    useStdout = (args.output == "-")
+    if useStdout:
+        fd = sys.stdout.buffer
+    else:
+        fd = open(args.output, "wb", buffering=1 << 16)
+    sensors = []
+    try:
+        for spec in specs:
+            sensors.append(bme280.BME280(busFreq=args.bus_freq,
+                                         calc=CALC[args.calc],
+                                         **spec))
+        writer = WRITERS[args.format](fd, args.flush)
+        logger = Logger(sensors=sensors,
+                        buses=[ busOf(spec) for spec in specs ],
+                        writer=writer,
+                        settings=settings,
+                        normalMode=(args.mode == "normal"),
+                        rate=args.rate,
+                        pollSleep=args.poll)
+        try:
+            asyncio.run(logger.run(count=args.count, duration=args.duration))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            writer.close()
+        rate = (logger.samples / logger.elapsed) if logger.elapsed > 0 else 0.0
+        print("%d samples in %.3f s (%.1f samples/s), %d dropped, %d errors" % (
+              logger.samples, logger.elapsed, rate, logger.dropped, logger.errors),
+              file=sys.stderr)
+    except bme280.BME280Error as e:
+        print("BME280 error: %s" % str(e), file=sys.stderr)
+        return 1
+    finally:
+        for bme in sensors:
+            bme.close()
+        if not useStdout:
+            fd.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# vim: ts=4 sw=4 expandtab
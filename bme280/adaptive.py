@@ -0,0 +1,306 @@
+#
+# BME280 device driver - Adaptive sampling scheduler
+# Copyright (c) 2020-2023 Michael Büsch <m@bues.ch>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# The sampler runs the device in normal mode and moves between the
+# configured levels. Level 0 is the fastest and coarsest configuration,
+# the last level the slowest one with the highest oversampling.
+#
+# The noise of one channel is estimated from the smoothed absolute second
+# difference of the samples. The trend is the mean change per sample over
+# a window that covers 'settle' sample periods of the next slower level.
+# At the end of each window the ratio of the trend to the noise decides:
+# If it exceeds 'raiseAt', the next faster level is used.
+# If the ratio predicted for the next slower level is below 'lowerAt',
+# the next slower level is used. The prediction scales the trend with the
+# sample period and the noise with the square root of the oversampling
+# ratio, so the hysteresis between the two thresholds holds across levels.
+# A single step of more than 2 * raiseAt times the noise switches to the
+# next faster level immediately.
+#
+
+__all__ = [
+    "LEVELS",
+    "AdaptiveSampler",
+]
+
+from .bme280 import (
+    MODE_SLEEP, MODE_NORMAL, FILTER_OFF,
+    OVSMPL_1, OVSMPL_2, OVSMPL_4, OVSMPL_8, OVSMPL_16,
+    T_SB_p5ms, T_SB_62p5ms, T_SB_125ms, T_SB_500ms, T_SB_1000ms,
+)
+from .planner import outputDataRate
+
+# Default levels (oversampling, standbyTime) from fast/coarse to slow/fine.
+LEVELS = (
+    (OVSMPL_1,  T_SB_p5ms),
+    (OVSMPL_2,  T_SB_62p5ms),
+    (OVSMPL_4,  T_SB_125ms),
+    (OVSMPL_8,  T_SB_500ms),
+    (OVSMPL_16, T_SB_1000ms),
+)
+
+# Default noise floor of each channel (t, h, p).
+# About the resolution of the integer compensation.
+_NOISE_FLOOR = (0.01, 0.001, 1.0)
+
+# Mean absolute second difference of white noise, in units of sigma.
+_D2_SIGMA = 1.954
+
+def _factor(osrs):
+    return 1 << (osrs - 1)
+
+def _period(level):
+    """Normal mode sample period of the (oversampling, standbyTime) 'level', in seconds.
+    """
+    osrs, t_sb = level
+    return 1.0 / outputDataRate(osrs, osrs, osrs, t_sb)
+
+class AdaptiveSampler:
+    """Normal mode sampling that adapts oversampling and standby time
+    to the rate of change and the noise of the signal.
+    """
+    __slots__ = (
+        "__bme",
+        "__levels",
+        "__periods",
+        "__minLevel",
+        "__maxLevel",
+        "__filter",
+        "__channel",
+        "__noiseFloor",
+        "__raiseAt",
+        "__lowerAt",
+        "__settle",
+        "__alpha",
+        "__level",
+        "__running",
+        "__history",
+        "__x1",
+        "__x2",
+        "__xStart",
+        "__noise",
+        "__window",
+    )
+
+    def __init__(self, bme,
+                 levels=LEVELS,
+                 minLevel=0,
+                 maxLevel=None,
+                 filter=FILTER_OFF,
+                 channel=2,
+                 noiseFloor=None,
+                 raiseAt=2.0,
+                 lowerAt=0.5,
+                 settle=8,
+                 alpha=0.25):
+        """'bme': The BME280 instance.
+        'levels': Sequence of (oversampling, standbyTime) tuples,
+                  ordered from fast/coarse to slow/fine.
+                  The oversampling is used for all channels.
+        'minLevel', 'maxLevel': Limit the used levels to this index range.
+        'filter': Hardware IIR filter configuration. One of FILTER_...
+        'channel': Watched channel. 0 = temperature, 1 = humidity, 2 = pressure.
+        'noiseFloor': Minimum noise of the channel, in its units.
+        'raiseAt': Change per sample to noise ratio above which a faster level is used.
+        'lowerAt': Predicted ratio below which a slower level is used.
+        'settle': Length of the trend window, in sample periods of the next slower level.
+        'alpha': Smoothing factor of the trend and noise estimation.
+        """
+        if maxLevel is None:
+            maxLevel = len(levels) - 1
+        if not 0 <= minLevel <= maxLevel < len(levels):
+            raise ValueError("Invalid level limits.")
+        if lowerAt >= raiseAt:
+            raise ValueError("lowerAt must be smaller than raiseAt.")
+        self.__bme = bme
+        self.__levels = tuple(levels)
+        self.__periods = tuple(_period(level) for level in self.__levels)
+        self.__minLevel = minLevel
+        self.__maxLevel = maxLevel
+        self.__filter = filter
+        self.__channel = channel
+        self.__noiseFloor = _NOISE_FLOOR[channel] if noiseFloor is None else noiseFloor
+        self.__raiseAt = raiseAt
+        self.__lowerAt = lowerAt
+        self.__settle = settle
+        self.__alpha = alpha
+        self.__level = maxLevel
+        self.__running = False
+        self.__resetEstimation()
+
+    def __resetEstimation(self):
+        self.__history = 0
+        self.__x1 = 0.0
+        self.__x2 = 0.0
+        self.__xStart = 0.0
+        self.__noise = 0.0
+        # The window covers 'settle' periods of the next slower level.
+        level = self.__level
+        slower = min(level + 1, len(self.__levels) - 1)
+        self.__window = max(self.__settle,
+                            int(self.__settle * self.__periods[slower] / self.__periods[level] + 0.5))
+
+    @property
+    def level(self):
+        """The index of the current level.
+        """
+        return self.__level
+
+    @property
+    def interval(self):
+        """The sample period of the current level, in seconds.
+        A new sample is available after this time.
+        """
+        return self.__periods[self.__level]
+
+    def __configs(self, level):
+        """Get the list of BME280.start() keyword arguments
+        that configure the device for 'level'.
+        Unchanged registers are not written again by the driver.
+        """
+        osrs, t_sb = self.__levels[level]
+        kwargs = {
+            "standbyTime"           : t_sb,
+            "filter"                : self.__filter,
+            "tempOversampling"      : osrs,
+            "humidityOversampling"  : osrs,
+            "pressureOversampling"  : osrs,
+        }
+        configs = []
+        if self.__running and self.__levels[self.__level][1] != t_sb:
+            # Writes to 'config' may be ignored in normal mode.
+            configs.append(dict(kwargs, mode=MODE_SLEEP))
+        configs.append(dict(kwargs, mode=MODE_NORMAL))
+        return configs
+
+    def __applied(self, level):
+        self.__level = level
+        self.__running = True
+        self.__resetEstimation()
+
+    async def __applyAsync(self, level):
+        """Configure the device for 'level'.
+        """
+        for kwargs in self.__configs(level):
+            await self.__bme.startAsync(**kwargs)
+        self.__applied(level)
+
+    def __apply(self, level):
+        """Configure the device for 'level'.
+        """
+        for kwargs in self.__configs(level):
+            self.__bme.start(**kwargs)
+        self.__applied(level)
+
+    def __startLevel(self, level):
+        if level is None:
+            level = self.__maxLevel
+        self.__running = False
+        return min(max(level, self.__minLevel), self.__maxLevel)
+
+    async def startAsync(self, level=None):
+        """Start normal mode sampling at 'level'.
+        By default start at the slowest allowed level.
+        This is a coroutine.
+        """
+        await self.__applyAsync(self.__startLevel(level))
+
+    def start(self, level=None):
+        """Synchronous variant of startAsync().
+        It uses the synchronous BME280 API and does not need an event loop.
+        See startAsync() for documentation about behaviour, arguments and return value.
+        """
+        self.__apply(self.__startLevel(level))
+
+    async def readAsync(self):
+        """Read the current sample with BME280.readAsync()
+        and adapt the configuration.
+        Call it once per 'interval'.
+        Returns the tuple (temperature, humidity, pressure).
+        This is a coroutine.
+        """
+        if not self.__running:
+            await self.startAsync()
+        values = await self.__bme.readAsync()
+        level = self.__update(values[self.__channel])
+        if level != self.__level:
+            await self.__applyAsync(level)
+        return values
+
+    def read(self):
+        """Synchronous variant of readAsync().
+        It uses the synchronous BME280 API and does not need an event loop.
+        See readAsync() for documentation about behaviour, arguments and return value.
+        """
+        if not self.__running:
+            self.start()
+        values = self.__bme.read()
+        level = self.__update(values[self.__channel])
+        if level != self.__level:
+            self.__apply(level)
+        return values
+
+    def __update(self, x):
+        """Update the estimation with the new value 'x'.
+        Returns the level to use.
+        """
+        n = self.__history
+        self.__history = n + 1
+        x1 = self.__x1
+        x2 = self.__x2
+        self.__x2 = x1
+        self.__x1 = x
+        if n == 0:
+            self.__xStart = x
+            return self.__level
+        d1 = x - x1
+        if n >= 2:
+            d2 = d1 - (x1 - x2)
+            if n == 2:
+                self.__noise = abs(d2)
+            else:
+                self.__noise += self.__alpha * (abs(d2) - self.__noise)
+        if n < 3:
+            return self.__level
+
+        level = self.__level
+        sigma = max(self.__noise / _D2_SIGMA, self.__noiseFloor)
+        faster = max(level - 1, self.__minLevel)
+        # A step far outside of the noise.
+        if abs(d1) > 2.0 * self.__raiseAt * sigma:
+            return faster
+        if n < self.__window:
+            return level
+
+        # Mean change per sample over the window.
+        slope = abs(x - self.__xStart) / n
+        if slope > self.__raiseAt * sigma:
+            return faster
+        if level < self.__maxLevel:
+            slower = level + 1
+            osrs = self.__levels[level][0]
+            sigmaSlower = sigma * (_factor(osrs) / _factor(self.__levels[slower][0])) ** 0.5
+            slopeSlower = slope * self.__periods[slower] / self.__periods[level]
+            if slopeSlower < self.__lowerAt * max(sigmaSlower, self.__noiseFloor):
+                return slower
+        # Start the next window.
+        self.__xStart = x
+        self.__history = 1
+        return level
+
+# vim: ts=4 sw=4 expandtab
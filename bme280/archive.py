@@ -0,0 +1,266 @@
+#
+# BME280 device driver - Parallel raw archive decoder
+# Copyright (c) 2020-2023 Michael Büsch <m@bues.ch>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# This is an offline tool for CPython. It decodes capture files as written
+# by bme280.replay.Capture.save(). Each file holds the raw data of one sensor.
+# The files are split into shards of consecutive records, optionally limited
+# to a time range. The shards are decoded by a pool of worker processes.
+# Each worker keeps one compensator per calibration, so the calibration is
+# decoded only once per worker and sensor. With OUTPUT_CSV the workers also
+# format the CSV text, so the calling process only writes it out.
+# The results are delivered in file and record order, while a bounded
+# number of shards is in flight.
+#
+# Command line usage:
+#   python3 -m bme280.archive [-s START] [-e END] [-j JOBS] [-o OUT] CAPTURE...
+#
+
+__all__ = [
+    "OUTPUT_ARRAY",
+    "OUTPUT_CSV",
+    "CSV_HEADER",
+    "Shard",
+    "shard",
+    "decodeShard",
+    "decode",
+]
+
+import argparse
+import collections
+import concurrent.futures
+import os
+import sys
+from array import array
+
+from .bme280 import BME280, BME280Error, CALC_FLOAT, CALC_INT32, CALC_INT64
+from .replay import HEADER, RECORD, MAGIC, VERSION
+
+# Result formats of decodeShard().
+OUTPUT_ARRAY    = 0
+OUTPUT_CSV      = 1
+
+CSV_HEADER = "sensor,timestamp,temperature,humidity,pressure\n"
+_CSV_RECORD = ",%.6f,%.2f,%.4f,%.1f\n"
+
+# Worker process local compensators. Key: (calibration, calc).
+_compensators = {}
+
+class Shard:
+    """A range of consecutive records in a capture file.
+    """
+    __slots__ = (
+        "path",
+        "first",
+        "count",
+    )
+
+    def __init__(self, path, first, count):
+        """'path': The capture file.
+        'first': Index of the first record.
+        'count': Number of records.
+        """
+        self.path = path
+        self.first = first
+        self.count = count
+
+    def __repr__(self):
+        return "Shard(%r, %d, %d)" % (self.path, self.first, self.count)
+
+def _readHeader(f):
+    """Read and check the header of the open capture file 'f'.
+    Returns (calibration, number of records).
+    """
+    f.seek(0)
+    data = f.read(HEADER.size)
+    if len(data) < HEADER.size:
+        raise BME280Error("BME280: Capture file is truncated.")
+    magic, version, calibration, _ = HEADER.unpack(data)
+    if magic != MAGIC or version != VERSION:
+        raise BME280Error("BME280: Unknown capture file format.")
+    size = os.fstat(f.fileno()).st_size - HEADER.size
+    return calibration, size // RECORD.size
+
+def _timestamp(f, index):
+    f.seek(HEADER.size + index * RECORD.size)
+    return RECORD.unpack(f.read(RECORD.size))[0]
+
+def _bisect(f, lo, hi, timestamp):
+    """Find the first record in [lo, hi) with a timestamp >= 'timestamp'.
+    """
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if _timestamp(f, mid) < timestamp:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def shard(paths, start=None, end=None, shardSize=1 << 16):
+    """Split the capture files 'paths' into shards.
+    'start', 'end': Only include records with start <= timestamp < end.
+                    None does not limit the range.
+    'shardSize': Maximum number of records per shard.
+    Returns a list of Shard in file and record order.
+    """
+    if shardSize < 1:
+        raise ValueError("Invalid shard size.")
+    shards = []
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                calibration, count = _readHeader(f)
+                first = 0 if start is None else _bisect(f, 0, count, start)
+                last = count if end is None else _bisect(f, first, count, end)
+        except OSError as e:
+            raise BME280Error("BME280: Failed to read capture: %s" % str(e))
+        for index in range(first, last, shardSize):
+            shards.append(Shard(path, index, min(shardSize, last - index)))
+    return shards
+
+def decodeShard(shard, calc=CALC_FLOAT, output=OUTPUT_ARRAY):
+    """Decode the records of 'shard'.
+    'calc': Calculation mode of the compensation. One of CALC_...
+    'output': OUTPUT_ARRAY returns an array("d") of consecutive
+              (timestamp, t, h, p) values.
+              OUTPUT_CSV returns the CSV lines as str. The first column
+              is the capture file path. See CSV_HEADER.
+    """
+    try:
+        with open(shard.path, "rb") as f:
+            calibration, count = _readHeader(f)
+            if shard.first + shard.count > count:
+                raise BME280Error("BME280: Shard exceeds the capture.")
+            f.seek(HEADER.size + shard.first * RECORD.size)
+            data = f.read(shard.count * RECORD.size)
+    except OSError as e:
+        raise BME280Error("BME280: Failed to read capture: %s" % str(e))
+
+    key = (calibration, calc)
+    comp = _compensators.get(key)
+    if comp is None:
+        comp = _compensators[key] = BME280(calibration=calibration, calc=calc).compensate
+
+    out = array("d")
+    extend = out.extend
+    for timestamp, b in RECORD.iter_unpack(data):
+        t, h, p = comp((b[3] << 12) | (b[4] << 4) | (b[5] >> 4),
+                       (b[6] << 8) | b[7],
+                       (b[0] << 12) | (b[1] << 4) | (b[2] >> 4))
+        extend((timestamp, t, h, p))
+    if output == OUTPUT_CSV:
+        # One format operation for the whole shard.
+        template = (shard.path.replace("%", "%%") + _CSV_RECORD) * shard.count
+        return template % tuple(out)
+    return out
+
+def decode(paths,
+           start=None,
+           end=None,
+           workers=None,
+           calc=CALC_FLOAT,
+           shardSize=1 << 16,
+           inFlight=None,
+           output=OUTPUT_ARRAY):
+    """Decode the capture files 'paths' in parallel.
+    'start', 'end': Time range. See shard().
+    'workers': Number of worker processes. None uses all CPUs.
+               0 decodes in the calling process.
+    'calc': Calculation mode of the compensation. One of CALC_...
+    'shardSize': Maximum number of records per shard.
+    'inFlight': Maximum number of shards that are queued or decoded
+                at the same time. Default: 4 per worker.
+    'output': Result format. See decodeShard().
+    This is a generator. It yields a tuple (shard, values) for each shard
+    in file and record order. 'values' is the result of decodeShard().
+    """
+    shards = shard(paths, start, end, shardSize)
+    if workers == 0:
+        for s in shards:
+            yield s, decodeShard(s, calc, output)
+        return
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if inFlight is None:
+        inFlight = 4 * workers
+    inFlight = max(inFlight, 1)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        try:
+            for s in shards:
+                if len(pending) >= inFlight:
+                    done = pending.popleft()
+                    yield done[0], done[1].result()
+                pending.append((s, executor.submit(decodeShard, s, calc, output)))
+            while pending:
+                done = pending.popleft()
+                yield done[0], done[1].result()
+        finally:
+            for s, future in pending:
+                future.cancel()
+
+CALC = {
+    "float"     : CALC_FLOAT,
+    "int32"     : CALC_INT32,
+    "int64"     : CALC_INT64,
+}
+
+def main(argv=None):
+    p = argparse.ArgumentParser(
+        prog="python -m bme280.archive",
+        description="Decode BME280 raw capture files in parallel and write CSV.")
+    p.add_argument("captures", nargs="+", metavar="CAPTURE",
+                   help="Capture file, one per sensor.")
+    p.add_argument("-s", "--start", type=float, default=None,
+                   help="Only decode records with a timestamp >= START.")
+    p.add_argument("-e", "--end", type=float, default=None,
+                   help="Only decode records with a timestamp < END.")
+    p.add_argument("-j", "--jobs", type=int, default=None,
+                   help="Number of worker processes. 0 decodes in the main process. "
+                        "Default: number of CPUs")
+    p.add_argument("-c", "--calc", choices=CALC.keys(), default="float",
+                   help="Compensation calculation mode. Default: float")
+    p.add_argument("-S", "--shard-size", type=int, default=1 << 16,
+                   help="Number of records per shard. Default: 65536")
+    p.add_argument("-o", "--output", default="-",
+                   help="Output file. Default: stdout")
+    args = p.parse_args(argv)
+
+    useStdout = (args.output == "-")
+    fd = sys.stdout if useStdout else open(args.output, "w", buffering=1 << 20)
+    try:
+        fd.write(CSV_HEADER)
+        for s, text in decode(args.captures,
+                              start=args.start,
+                              end=args.end,
+                              workers=args.jobs,
+                              calc=CALC[args.calc],
+                              shardSize=args.shard_size,
+                              output=OUTPUT_CSV):
+            fd.write(text)
+    except BME280Error as e:
+        print("BME280 error: %s" % str(e), file=sys.stderr)
+        return 1
+    finally:
+        if not useStdout:
+            fd.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# vim: ts=4 sw=4 expandtab
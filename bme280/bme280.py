@@ -26,6 +26,8 @@
 
 __all__ = [
     "BME280Error",
+    "BME280Stats",
+    "BME280Transport",
     "BME280",
 ]
 
@@ -35,14 +37,37 @@ assert sys.version_info[0] == 3
 isMicropython = sys.implementation.name == "micropython"
 
 if isMicropython:
-    import uasyncio as asyncio
     import micropython
     from micropython import const
+    from time import ticks_us, ticks_diff
 else:
-    import asyncio
     class micropython:
         const = native = viper = lambda x: x
     const = micropython.const
+    from time import perf_counter_ns
+    def ticks_us():
+        return perf_counter_ns() // 1000
+    def ticks_diff(a, b):
+        return a - b
+
+from time import sleep as _sleep
+
+try:
+    from _thread import allocate_lock as _allocateLock
+except ImportError:
+    _allocateLock = None
+
+# asyncio is only imported, if a coroutine needs the event loop.
+_asyncioName = "uasyncio" if isMicropython else "asyncio"
+_asyncioModule = None
+
+def _asyncio():
+    """Get the asyncio module. It is imported on first use.
+    """
+    global _asyncioModule
+    if _asyncioModule is None:
+        _asyncioModule = __import__(_asyncioName)
+    return _asyncioModule
 
 class BME280Error(Exception):
     """BME280 exception.
@@ -56,153 +81,394 @@ def makePin(pin, constructor):
         return pin
     return constructor(pin)
 
-class BME280I2C:
+class BME280Transport:
+    """BME280 bus transport protocol.
+    A transport moves register data between the driver and the device.
+    Any object that implements the following methods can be passed
+    to the 'transport' argument of the BME280 constructor.
+    Deriving from this class is optional.
+
+    Required:
+    read(reg, length): Burst read 'length' registers starting at 'reg'.
+                       Returns a bytes-like object.
+    write(reg, data): Burst write the bytes 'data' starting at 'reg'.
+    close(): Release the bus.
+
+    Optional:
+    maxBurst: Maximum number of registers per read burst.
+              None, if there is no limit.
+    transfer(ops): Run multiple transactions in one batch.
+                   'ops' is a sequence of (reg, length) reads and
+                   (reg, data) writes, where 'length' is an int and
+                   'data' a bytes-like object.
+                   Returns a list with one entry per op:
+                   The read data for reads and None for writes.
+                   The driver submits multi-transaction sequences
+                   as one batch, if the transport offers this.
+    readAsync(reg, length), writeAsync(reg, data), transferAsync(ops):
+                   Coroutine variants of the above.
+                   If a transport has readAsync(), it must also have
+                   writeAsync(). The driver then awaits the coroutine
+                   variants instead of calling the blocking methods.
+    blocking: True, if a transport with coroutine variants also has working
+              blocking methods. Synchronous calls then use the blocking
+              methods without an event loop. Coroutines use the coroutine
+              variants.
+
+    Errors shall be raised as BME280Error.
+    """
+    __slots__ = (
+    )
+
+    maxBurst = None
+
+    def close(self):
+        pass
+
+    def read(self, reg, length):
+        raise NotImplementedError
+
+    def write(self, reg, data):
+        raise NotImplementedError
+
+# Currently selected channel mask of each I2C multiplexer.
+# Key: (bus, multiplexer address).
+# This is shared by all BME280I2C instances behind the same multiplexer.
+# None means unknown.
+_muxChannels = {}
+
+class _BusPool:
+    """Reference counted pool of open bus objects.
+    Devices on the same bus share one bus object. It is closed,
+    when the last device that uses it is closed.
+    """
+    __slots__ = (
+        "__entries",
+        "__lock",
+    )
+
+    def __init__(self):
+        # Key -> [bus, number of users, bus lock or None]
+        self.__entries = {}
+        self.__lock = _allocateLock() if _allocateLock else None
+
+    def acquire(self, key, opener, lock=False):
+        """Get the bus 'key' and increment its user count.
+        'opener': Called without arguments to open the bus, if it is not in the pool.
+        'lock': Also return the bus lock. It is created on first request.
+        Returns (bus, bus lock or None).
+        """
+        if self.__lock:
+            self.__lock.acquire()
+        try:
+            entry = self.__entries.get(key)
+            if entry is None:
+                entry = [ opener(), 0, None ]
+                self.__entries[key] = entry
+            if lock and entry[2] is None:
+                if not _allocateLock:
+                    raise BME280Error("BME280: Bus locks are not supported.")
+                entry[2] = _allocateLock()
+            entry[1] += 1
+            return entry[0], (entry[2] if lock else None)
+        finally:
+            if self.__lock:
+                self.__lock.release()
+
+    def release(self, key, closer):
+        """Decrement the user count of the bus 'key'.
+        'closer': Called with the bus object, if this was the last user.
+        """
+        if self.__lock:
+            self.__lock.acquire()
+        try:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del self.__entries[key]
+        finally:
+            if self.__lock:
+                self.__lock.release()
+        closer(entry[0])
+
+    def users(self, key):
+        """Get the number of users of the bus 'key'.
+        """
+        if self.__lock:
+            self.__lock.acquire()
+        try:
+            entry = self.__entries.get(key)
+            return entry[1] if entry else 0
+        finally:
+            if self.__lock:
+                self.__lock.release()
+
+_busPool = _BusPool()
+
+class BME280I2C(BME280Transport):
     """BME280 low level I2C wrapper.
     """
     __slots__ = (
         "__micropython",
         "__addr",
         "__i2c",
+        "__key",
+        "__lock",
+        "__mux",
     )
 
-    def __init__(self, i2cBus, i2cAddr, i2cFreq):
+    def __init__(self, i2cBus, i2cAddr, i2cFreq, busLock=False):
         self.__addr = i2cAddr
         self.__micropython = isMicropython
+        self.__i2c = None
+        self.__mux = None
         try:
+            if isinstance(i2cBus, dict) and "mux" in i2cBus:
+                # TCA9548A style multiplexer.
+                channel = i2cBus.get("channel", 0)
+                if not 0 <= channel <= 7:
+                    raise Exception("Invalid multiplexer channel %d." % channel)
+                if "scl" in i2cBus:
+                    busKey = (i2cBus.get("index", -1), i2cBus["scl"], i2cBus["sda"])
+                else:
+                    busKey = i2cBus["index"]
+                self.__mux = ((busKey, i2cBus["mux"]), i2cBus["mux"], 1 << channel)
+                if "scl" not in i2cBus:
+                    i2cBus = i2cBus["index"]
             if self.__micropython:
-                from machine import I2C, SoftI2C, Pin
-                if isinstance(i2cBus, (I2C, SoftI2C)):
-                    self.__i2c = i2cBus
+                if hasattr(i2cBus, "readfrom_mem"):
+                    key = ("obj", id(i2cBus))
+                    opener = lambda: i2cBus
                 else:
-                    opts = {
-                        "freq"  : i2cFreq * 1000,
-                    }
                     if isinstance(i2cBus, dict):
-                        opts["scl"] = makePin(i2cBus["scl"], lambda p: Pin(p, mode=Pin.OPEN_DRAIN, value=1))
-                        opts["sda"] = makePin(i2cBus["sda"], lambda p: Pin(p, mode=Pin.OPEN_DRAIN, value=1))
-                        i2cBus = i2cBus.get("index", -1)
+                        key = ("i2c", i2cBus.get("index", -1), i2cBus["scl"], i2cBus["sda"])
                     else:
                         assert i2cBus >= 0
-                    if i2cBus < 0:
-                        self.__i2c = SoftI2C(**opts)
-                    else:
-                        self.__i2c = I2C(i2cBus, **opts)
+                        key = ("i2c", i2cBus, None, None)
+                    def opener():
+                        from machine import I2C, SoftI2C, Pin
+                        index, scl, sda = key[1:]
+                        opts = {
+                            "freq"  : i2cFreq * 1000,
+                        }
+                        if scl is not None:
+                            opts["scl"] = makePin(scl, lambda p: Pin(p, mode=Pin.OPEN_DRAIN, value=1))
+                            opts["sda"] = makePin(sda, lambda p: Pin(p, mode=Pin.OPEN_DRAIN, value=1))
+                        if index < 0:
+                            return SoftI2C(**opts)
+                        return I2C(index, **opts)
             else:
-                from smbus import SMBus
-                if isinstance(i2cBus, SMBus):
-                    self.__i2c = i2cBus
+                if hasattr(i2cBus, "read_i2c_block_data"):
+                    key = ("obj", id(i2cBus))
+                    opener = lambda: i2cBus
                 else:
-                    self.__i2c = SMBus(i2cBus)
+                    key = ("smbus", i2cBus)
+                    def opener():
+                        from smbus import SMBus
+                        return SMBus(i2cBus)
+            self.__i2c, self.__lock = _busPool.acquire(key, opener, busLock)
+            self.__key = key
+        except BME280Error:
+            raise
         except Exception as e:
             raise BME280Error("BME280: I2C error: %s" % str(e))
 
-    def close(self):
+    @property
+    def maxBurst(self):
+        # The SMBus block read is limited to 32 bytes.
+        return None if self.__micropython else 32
+
+    @property
+    def muxChannel(self):
+        """The (multiplexer address, channel) of the device
+        or None, if the device is not behind a multiplexer.
+        """
+        mux = self.__mux
+        if mux is None:
+            return None
+        key, muxAddr, mask = mux
+        channel = 0
+        while mask > 1:
+            mask >>= 1
+            channel += 1
+        return muxAddr, channel
+
+    def __select(self):
+        """Switch the multiplexer to the channel of the device,
+        unless it already is selected.
+        """
+        key, muxAddr, mask = self.__mux
+        if _muxChannels.get(key) != mask:
+            _muxChannels[key] = None
+            if self.__micropython:
+                self.__i2c.writeto(muxAddr, mask.to_bytes(1, "little"))
+            else:
+                self.__i2c.write_byte(muxAddr, mask)
+            _muxChannels[key] = mask
+
+    def __muxError(self):
+        """The multiplexer state is unknown after a bus error.
+        """
+        if self.__mux is not None:
+            _muxChannels[self.__mux[0]] = None
+
+    def __closeBus(self, i2c):
         if self.__micropython:
             try:
-                if hasattr(self.__i2c, "deinit"):
-                    self.__i2c.deinit()
+                if hasattr(i2c, "deinit"):
+                    i2c.deinit()
             except Exception:
                 pass
         else:
             try:
-                self.__i2c.close()
+                i2c.close()
             except Exception:
                 pass
-        self.__i2c = None
+
+    def close(self):
+        if self.__i2c is not None:
+            self.__i2c = None
+            _busPool.release(self.__key, self.__closeBus)
 
     def write(self, reg, data):
+        lock = self.__lock
+        if lock:
+            lock.acquire()
         try:
+            if self.__mux is not None:
+                self.__select()
             if self.__micropython:
                 self.__i2c.writeto_mem(self.__addr, reg, data)
             else:
                 self.__i2c.write_i2c_block_data(self.__addr, reg, list(data))
         except Exception as e:
+            self.__muxError()
             raise BME280Error("BME280: I2C error: %s" % str(e))
+        finally:
+            if lock:
+                lock.release()
 
     def read(self, reg, length):
+        lock = self.__lock
+        if lock:
+            lock.acquire()
         try:
+            if self.__mux is not None:
+                self.__select()
             if self.__micropython:
                 return self.__i2c.readfrom_mem(self.__addr, reg, length)
             else:
                 return bytes(self.__i2c.read_i2c_block_data(self.__addr, reg, length))
         except Exception as e:
+            self.__muxError()
             raise BME280Error("BME280: I2C error: %s" % str(e))
+        finally:
+            if lock:
+                lock.release()
 
-class BME280SPI:
+class BME280SPI(BME280Transport):
     """BME280 low level SPI wrapper.
     """
     __slots__ = (
         "__micropython",
         "__spi",
         "__cs",
+        "__key",
+        "__lock",
     )
 
-    def __init__(self, spiBus, spiCS, spiFreq):
+    def __init__(self, spiBus, spiCS, spiFreq, busLock=False):
         self.__micropython = isMicropython
+        self.__spi = None
         try:
             if self.__micropython:
                 from machine import SPI, SoftSPI, Pin
                 if spiCS is None:
                     raise Exception("No spiCS parameter specified.")
-                if isinstance(spiBus, (SPI, SoftSPI)):
-                    self.__spi = spiBus
+                if hasattr(spiBus, "read"):
+                    key = ("obj", id(spiBus))
+                    opener = lambda: spiBus
                 else:
-                    opts = {
-                        "baudrate"  : spiFreq * 1000,
-                        "polarity"  : 0,
-                        "phase"     : 0,
-                        "bits"      : 8,
-                        "firstbit"  : SPI.MSB,
-                    }
                     if isinstance(spiBus, dict): # Software SPI
-                        opts["sck"]  = makePin(spiBus["sck"], lambda p: Pin(p, mode=Pin.OUT, value=0))
-                        opts["mosi"] = makePin(spiBus["mosi"], lambda p: Pin(p, mode=Pin.OUT, value=0))
-                        opts["miso"] = makePin(spiBus["miso"], lambda p: Pin(p, mode=Pin.IN))
-                        spiBus = spiBus.get("index", -1)
+                        key = ("spi", spiBus.get("index", -1),
+                               spiBus["sck"], spiBus["mosi"], spiBus["miso"])
                     else:
                         assert spiBus >= 0
-                    if spiBus < 0:
-                        self.__spi = SoftSPI(**opts)
-                    else:
-                        self.__spi = SPI(spiBus, **opts)
+                        key = ("spi", spiBus, None, None, None)
+                    def opener():
+                        index, sck, mosi, miso = key[1:]
+                        opts = {
+                            "baudrate"  : spiFreq * 1000,
+                            "polarity"  : 0,
+                            "phase"     : 0,
+                            "bits"      : 8,
+                            "firstbit"  : SPI.MSB,
+                        }
+                        if sck is not None:
+                            opts["sck"]  = makePin(sck, lambda p: Pin(p, mode=Pin.OUT, value=0))
+                            opts["mosi"] = makePin(mosi, lambda p: Pin(p, mode=Pin.OUT, value=0))
+                            opts["miso"] = makePin(miso, lambda p: Pin(p, mode=Pin.IN))
+                        if index < 0:
+                            return SoftSPI(**opts)
+                        return SPI(index, **opts)
                 self.__cs = makePin(spiCS, lambda p: Pin(p, mode=Pin.OUT, value=1))
             else:
-                from spidev import SpiDev
-                if isinstance(spiBus, SpiDev):
-                    self.__spi = spiBus
+                if hasattr(spiBus, "xfer2"):
+                    key = ("obj", id(spiBus))
+                    opener = lambda: spiBus
                 else:
                     if spiCS is None:
                         raise Exception("No spiCS parameter specified.")
-                    self.__spi = SpiDev()
-                    self.__spi.max_speed_hz = spiFreq * 1000
-                    self.__spi.mode = 0b00
-                    self.__spi.bits_per_word = 8
-                    self.__spi.threewire = False
-                    self.__spi.lsbfirst = False
-                    self.__spi.cshigh = False
-                    self.__spi.open(spiBus, spiCS)
+                    # A spidev handle belongs to one chip select.
+                    key = ("spidev", spiBus, spiCS)
+                    def opener():
+                        from spidev import SpiDev
+                        spi = SpiDev()
+                        spi.max_speed_hz = spiFreq * 1000
+                        spi.mode = 0b00
+                        spi.bits_per_word = 8
+                        spi.threewire = False
+                        spi.lsbfirst = False
+                        spi.cshigh = False
+                        spi.open(spiBus, spiCS)
+                        return spi
+            self.__spi, self.__lock = _busPool.acquire(key, opener, busLock)
+            self.__key = key
+        except BME280Error:
+            raise
         except Exception as e:
             raise BME280Error("BME280: SPI error: %s" % str(e))
 
-    def close(self):
+    def __closeBus(self, spi):
         if self.__micropython:
             try:
-                self.__cs(1)
-            except Exception:
-                pass
-            try:
-                if hasattr(self.__spi, "deinit"):
-                    self.__spi.deinit()
+                if hasattr(spi, "deinit"):
+                    spi.deinit()
             except Exception:
                 pass
         else:
             try:
-                self.__spi.close()
+                spi.close()
             except Exception:
                 pass
-        self.__spi = None
+
+    def close(self):
+        if self.__spi is not None:
+            if self.__micropython:
+                try:
+                    self.__cs(1)
+                except Exception:
+                    pass
+            self.__spi = None
+            _busPool.release(self.__key, self.__closeBus)
 
     def write(self, reg, data):
+        lock = self.__lock
+        if lock:
+            lock.acquire()
         try:
             reg &= 0x7F # clear RW bit
             writeData = reg.to_bytes(1, "little") + data
@@ -216,8 +482,14 @@ class BME280SPI:
                 self.__spi.xfer2(writeData)
         except Exception as e:
             raise BME280Error("BME280: SPI error: %s" % str(e))
+        finally:
+            if lock:
+                lock.release()
 
     def read(self, reg, length):
+        lock = self.__lock
+        if lock:
+            lock.acquire()
         try:
             reg |= 0x80 # set RW bit
             if self.__micropython:
@@ -228,9 +500,157 @@ class BME280SPI:
                     self.__cs(1)
             else:
                 writeData = reg.to_bytes(1, "little") * (length + 1)
-                return memoryview(self.__spi.xfer2(writeData))[1:]
+                return bytes(self.__spi.xfer2(writeData))[1:]
         except Exception as e:
             raise BME280Error("BME280: SPI error: %s" % str(e))
+        finally:
+            if lock:
+                lock.release()
+
+class BME280Stats:
+    """BME280 bus and operation statistics.
+    Install an instance with BME280.setStats() to enable instrumentation.
+    Without an installed instance the driver does not collect anything.
+    """
+    __slots__ = (
+        "transactions",
+        "bytesRead",
+        "bytesWritten",
+        "errors",
+        "retries",
+        "suppressed",
+        "histograms",
+        "events",
+        "__trace",
+        "__maxEvents",
+        "__hook",
+    )
+
+    # Instrumented operations.
+    OPS = ("reset", "calibration", "trigger", "status", "data", "compensation")
+
+    # Number of latency histogram buckets.
+    # Bucket i counts latencies below 2**i microseconds.
+    # The last bucket counts everything above.
+    NR_BUCKETS = 24
+
+    def __init__(self, trace=False, maxEvents=10000, hook=None):
+        """'trace': Record timestamped events for chromeTrace().
+        'maxEvents': Maximum number of recorded trace events.
+        'hook': Optional callable hook(op, startUs, durationUs) that is
+                called for each finished operation and bus transaction.
+        """
+        self.__trace = trace
+        self.__maxEvents = maxEvents
+        self.__hook = hook
+        self.clear()
+
+    def clear(self):
+        """Reset all counters, histograms and trace events.
+        """
+        self.transactions = 0
+        self.bytesRead = 0
+        self.bytesWritten = 0
+        self.errors = 0
+        self.retries = 0
+        self.suppressed = 0
+        self.histograms = { op: [ 0 ] * self.NR_BUCKETS for op in self.OPS }
+        self.events = []
+
+    def begin(self):
+        """Start timing an operation. Returns the start timestamp.
+        """
+        return ticks_us()
+
+    def end(self, op, begin):
+        """Finish timing the operation 'op' that started at 'begin'.
+        """
+        duration = ticks_diff(ticks_us(), begin)
+        bucket = 0
+        limit = 1
+        while duration >= limit and bucket < self.NR_BUCKETS - 1:
+            bucket += 1
+            limit <<= 1
+        self.histograms[op][bucket] += 1
+        self.__event(op, begin, duration)
+
+    def __event(self, name, begin, duration):
+        if self.__trace and len(self.events) < self.__maxEvents:
+            self.events.append((name, begin, duration))
+        if self.__hook:
+            self.__hook(name, begin, duration)
+
+    def busDone(self, name, begin, transactions, bytesRead=0, bytesWritten=0):
+        """Account finished bus transactions that started at 'begin'.
+        'name': Trace event name. "read", "write" or "transfer" (batch).
+        """
+        self.transactions += transactions
+        self.bytesRead += bytesRead
+        self.bytesWritten += bytesWritten
+        self.__event(name, begin, ticks_diff(ticks_us(), begin))
+
+    def busFailed(self, transactions):
+        """Account failed bus transactions.
+        """
+        self.transactions += transactions
+        self.errors += 1
+
+    def busRead(self, bus, reg, length):
+        """Run and account a bus read transaction.
+        """
+        begin = ticks_us()
+        try:
+            data = bus.read(reg, length)
+        except BME280Error:
+            self.busFailed(1)
+            raise
+        self.busDone("read", begin, 1, bytesRead=length)
+        return data
+
+    def busWrite(self, bus, reg, data):
+        """Run and account a bus write transaction.
+        """
+        begin = ticks_us()
+        try:
+            bus.write(reg, data)
+        except BME280Error:
+            self.busFailed(1)
+            raise
+        self.busDone("write", begin, 1, bytesWritten=len(data))
+
+    def percentile(self, op, fraction):
+        """Get an upper bound of the 'fraction' (0.0 - 1.0) latency
+        percentile of the operation 'op', in microseconds.
+        Returns None, if there is no sample.
+        """
+        histogram = self.histograms[op]
+        total = sum(histogram)
+        if not total:
+            return None
+        count = 0
+        for bucket, n in enumerate(histogram):
+            count += n
+            if count >= total * fraction:
+                return 1 << bucket
+        return 1 << (self.NR_BUCKETS - 1)
+
+    def chromeTrace(self):
+        """Get the recorded trace events as Chrome trace JSON string.
+        It can be loaded into chrome://tracing or Perfetto.
+        """
+        import json
+        return json.dumps({
+            "traceEvents" : [ {
+                "name"  : name,
+                "cat"   : "bme280",
+                "ph"    : "X",
+                "ts"    : begin,
+                "dur"   : duration,
+                "pid"   : 0,
+                "tid"   : 0,
+            } for name, begin, duration in self.events ],
+            "displayTimeUnit" : "ms",
+        })
 
 # Registers
 _REG_dig_T1         = const(0x88) # 16 bit LE
@@ -301,12 +721,32 @@ CALC_FLOAT          = const(0)
 CALC_INT32          = const(1)
 CALC_INT64          = const(2)
 
+# Raw (ut, uh, up) measurements that indicate a problem:
+# The reset value (no conversion) and the all-0xFF pattern of a floating bus.
+_INVALID_RAW = (
+    (0x80000, 0x8000, 0x80000),
+    (0xFFFFF, 0xFFFF, 0xFFFFF),
+)
+
+# Recovery actions requested by the health monitor.
+# See bme280.health.
+_RECOVER_REVALIDATE = const(1)
+_RECOVER_RESET      = const(2)
+
+# Batch submission capability of the transport.
+_BATCH_NONE         = const(0)
+_BATCH_SYNC         = const(1)
+_BATCH_ASYNC        = const(2)
+
 class BME280:
     """BME280 device driver.
     """
     __slots__ = (
         "__calc",
         "__bus",
+        "__busAsync",
+        "__busBlocking",
+        "__busBatch",
         "__resetPending",
         "__cal_dig_T1",
         "__cal_dig_T2",
@@ -326,8 +766,24 @@ class BME280:
         "__cal_dig_H4",
         "__cal_dig_H5",
         "__cal_dig_H6",
+        "__cal_raw",
         "__cache_config",
         "__cache_ctrl_hum",
+        "__sampleHook",
+        "__rawFilter",
+        "__deadband",
+        "__deadbandLimits",
+        "__deadbandRaw",
+        "__deadbandValues",
+        "__stats",
+        "__health",
+        "__retries",
+        "__backoff",
+        "__maxBackoff",
+        "__escalateAfter",
+        "__failures",
+        "__last_ctrl_meas",
+        "__syncRun",
     )
 
     def __init__(self,
@@ -336,31 +792,79 @@ class BME280:
                  spiBus=None,
                  spiCS=None,
                  busFreq=100,
-                 calc=(CALC_INT32 if isMicropython else CALC_FLOAT)):
+                 calc=(CALC_INT32 if isMicropython else CALC_FLOAT),
+                 calibration=None,
+                 transport=None,
+                 busLock=False):
         """Create BME280 driver instance.
         'i2cBus': I2C hardware bus index to use for communication with the device.
                   Or dict { "scl": 1, "sda": 2 } of pin numbers for software I2C.
                   Or dict { "index": 0, "scl": 1, "sda": 2 } for hardware I2C-0 with different pinning.
-                  Or a fully initialized Micropython I2C/SoftI2C object.
+                  Or a fully initialized Micropython I2C/SoftI2C object
+                  or Linux SMBus object (or any object with the same interface).
                   Pin numbers may either be integers or Micropython Pin objects.
+                  For a device behind a TCA9548A I2C multiplexer add the
+                  multiplexer address and channel to the dict, e.g.
+                  { "index": 1, "mux": 0x70, "channel": 3 }.
+                  The multiplexer is only switched, if the channel changes.
         'i2cAddr': I2C address of the device. May be 0x76 or 0x77.
         'spiBus': SPI hardware bus index to use for communication with the device.
                   Or dict { "sck": 1, "mosi": 2, "miso": 3 } of pin numbers for software SPI.
                   Or dict { "index": 0, "sck": 1, "mosi": 2, "miso": 3 } for hardware SPI-0 with different pinning.
-                  Or a fully initialized Micropython SPI/SoftSPI object.
+                  Or a fully initialized Micropython SPI/SoftSPI object
+                  or Linux SpiDev object (or any object with the same interface).
                   Pin numbers may either be integers or Micropython Pin objects.
         'spiCS': SPI chip select identifier number or pin number or Micropython Pin object.
         'busFreq': I2C/SPI bus clock frequency, in kHz.
         'calc': Calculation mode for compensation functions. One of CALC_...
+        'calibration': Raw calibration data, as returned by getCalibration().
+                       If no bus is configured, the instance is an offline
+                       compensator that only supports compensate().
+        'transport': Custom bus transport object to use instead of i2cBus/spiBus.
+                     See BME280Transport for the required interface.
+        'busLock': Serialize the transactions of the devices on the same I2C/SPI bus
+                   with a lock. Only the devices that are constructed with
+                   busLock=True take the lock, so pass it to all devices on the bus.
+                   Required, if the devices are used from multiple threads.
+        All devices that are constructed with the same bus index, pin set or bus object
+        share one bus object. It is closed, when the last of these devices is closed.
         """
         self.__calc = calc
         self.__resetPending = True
-        if i2cBus is not None:
-            self.__bus = BME280I2C(i2cBus, i2cAddr, busFreq)
+        self.__syncRun = False
+        self.__sampleHook = None
+        self.__rawFilter = None
+        self.__deadband = None
+        self.__deadbandRaw = None
+        self.__stats = None
+        self.__health = None
+        self.__retries = 0
+        self.__backoff = 0.0
+        self.__maxBackoff = 0.0
+        self.__escalateAfter = 0
+        self.__failures = 0
+        self.__last_ctrl_meas = None
+        if transport is not None:
+            self.__bus = transport
+        elif i2cBus is not None:
+            self.__bus = BME280I2C(i2cBus, i2cAddr, busFreq, busLock)
         elif spiBus is not None:
-            self.__bus = BME280SPI(spiBus, spiCS, busFreq)
+            self.__bus = BME280SPI(spiBus, spiCS, busFreq, busLock)
+        elif calibration is not None:
+            self.__bus = None
         else:
             raise BME280Error("BME280: No bus configured.")
+        # Optional transport capabilities.
+        self.__busAsync = hasattr(self.__bus, "readAsync")
+        self.__busBlocking = not self.__busAsync or getattr(self.__bus, "blocking", False)
+        if self.__busAsync and hasattr(self.__bus, "transferAsync"):
+            self.__busBatch = _BATCH_ASYNC
+        elif hasattr(self.__bus, "transfer"):
+            self.__busBatch = _BATCH_SYNC
+        else:
+            self.__busBatch = _BATCH_NONE
+        if calibration is not None:
+            self.__setCal(calibration)
 
     async def closeAsync(self):
         """Shutdown communication to the device.
@@ -378,7 +882,7 @@ class BME280:
     def close(self):
         """Shutdown communication to the device.
         """
-        asyncio.run(self.closeAsync())
+        self.__run(self.closeAsync())
 
     def __enter__(self):
         return self
@@ -392,11 +896,54 @@ class BME280:
     async def __aexit__(self, exc_type, exc_value, traceback):
         await self.closeAsync()
 
-    def __readCal(self):
+    def __run(self, coroutine):
+        """Run 'coroutine' to completion and return its result.
+        With a synchronous bus the driver coroutines only suspend for sleeping.
+        They are run without an event loop then and asyncio is not imported.
+        """
+        if not self.__busBlocking:
+            return _asyncio().run(coroutine)
+        self.__syncRun = True
+        try:
+            coroutine.send(None)
+        except StopIteration as e:
+            return e.value
+        finally:
+            self.__syncRun = False
+        coroutine.close()
+        raise BME280Error("BME280: Synchronous call suspended unexpectedly.")
+
+    async def __sleepAsync(self, seconds):
+        """Sleep for 'seconds'. Blocking, if called from a synchronous call.
+        """
+        if self.__syncRun:
+            _sleep(seconds)
+        else:
+            await _asyncio().sleep(seconds)
+
+    async def __readCalAsync(self):
         """Read the calibration data from the device.
         """
-        data = bytes(self.__readBurst(_REG_dig_T1, _REG_dig_H1))
-        data += bytes(self.__readBurst(_REG_dig_H2, _REG_dig_H6))
+        stats = self.__stats
+        if stats:
+            begin = stats.begin()
+        cal1, cal2 = await self.__transferAsync((
+            (_REG_dig_T1, _REG_dig_H1 - _REG_dig_T1 + 1),
+            (_REG_dig_H2, _REG_dig_H6 - _REG_dig_H2 + 1),
+        ))
+        self.__setCal(bytes(cal1) + bytes(cal2))
+        if stats:
+            stats.end("calibration", begin)
+
+    def __setCal(self, data):
+        """Decode the raw calibration data.
+        'data': Registers _REG_dig_T1.._REG_dig_H1 followed by _REG_dig_H2.._REG_dig_H6.
+        """
+        data = bytes(data)
+        if len(data) != (_REG_dig_H1 - _REG_dig_T1 + 1) + (_REG_dig_H6 - _REG_dig_H2 + 1):
+            raise BME280Error("BME280: Invalid calibration data length.")
+        self.__cal_raw = data
+        self.__deadbandRaw = None
 
         def twos(value, bits):
             """Convert a raw value represented in two's complement to signed Python int.
@@ -450,51 +997,147 @@ class BME280:
         self.__cal_dig_H5 = cal(getS12LE(_REG_dig_H5))
         self.__cal_dig_H6 = cal(getS8(_REG_dig_H6))
 
+    @property
+    def muxChannel(self):
+        """The (multiplexer address, channel) of the device
+        or None, if the device is not behind an I2C multiplexer.
+        """
+        return getattr(self.__bus, "muxChannel", None)
+
+    def getCalibration(self):
+        """Get the raw calibration data of the device as bytes.
+        The data can be passed to the 'calibration' argument of the constructor
+        to create an offline compensator for raw values of this device.
+        """
+        try:
+            return self.__cal_raw
+        except AttributeError:
+            raise BME280Error("BME280: Calibration data not read, yet.")
+
+    async def snapshotAsync(self):
+        """Read the complete register space of the device in as few
+        burst transfers as the transport allows and decode it.
+        This also updates the calibration data of this instance.
+        Returns a dict with the keys:
+        "id": Chip ID register.
+        "im_update", "measuring": Status register bits.
+        "ctrl_hum", "ctrl_meas", "config": Raw control registers.
+        "mode", "osrs_t", "osrs_p", "osrs_h", "t_sb", "filter": Decoded control registers.
+        "calibration": Raw calibration data, as returned by getCalibration().
+        "raw": Raw (ut, uh, up), as returned by readRawAsync().
+        "values": Compensated (t, h, p), as returned by readAsync().
+        This is a coroutine.
+        """
+        if not self.__bus:
+            raise BME280Error("BME280: Device not opened.")
+
+        # Read the register space _REG_dig_T1.._REG_hum_lsb.
+        # If the transport limits the burst length, skip the reserved gaps.
+        maxBurst = getattr(self.__bus, "maxBurst", None)
+        if maxBurst is None or maxBurst > _REG_hum_lsb - _REG_dig_T1:
+            ranges = ((_REG_dig_T1, _REG_hum_lsb), )
+        else:
+            ranges = ((_REG_dig_T1, _REG_dig_H1),
+                      (_REG_id, _REG_id),
+                      (_REG_dig_H2, _REG_hum_lsb))
+        ops = []
+        for startReg, endReg in ranges:
+            while startReg <= endReg:
+                length = endReg - startReg + 1
+                if maxBurst is not None:
+                    length = min(length, maxBurst)
+                ops.append((startReg, length))
+                startReg += length
+        space = bytearray(_REG_hum_lsb - _REG_dig_T1 + 1)
+        for (startReg, length), data in zip(ops, await self.__transferAsync(ops)):
+            space[startReg - _REG_dig_T1 : startReg - _REG_dig_T1 + length] = data
+        def get(reg):
+            return space[reg - _REG_dig_T1]
+
+        if get(_REG_id) != 0x60:
+            raise BME280Error("BME280: ID register response incorrect.")
+        self.__setCal(space[ : _REG_dig_H1 - _REG_dig_T1 + 1] +
+                      space[_REG_dig_H2 - _REG_dig_T1 : _REG_dig_H6 - _REG_dig_T1 + 1])
+        raw = self.__decodeRaw(space[_REG_press_msb - _REG_dig_T1 : ])
+        ctrl_hum = get(_REG_ctrl_hum)
+        ctrl_meas = get(_REG_ctrl_meas)
+        config = get(_REG_config)
+        status = get(_REG_status)
+        return {
+            "id"            : get(_REG_id),
+            "im_update"     : bool(status & (1 << 0)),
+            "measuring"     : bool(status & (1 << 3)),
+            "ctrl_hum"      : ctrl_hum,
+            "ctrl_meas"     : ctrl_meas,
+            "config"        : config,
+            "mode"          : ctrl_meas & 3,
+            "osrs_t"        : (ctrl_meas >> 5) & 7,
+            "osrs_p"        : (ctrl_meas >> 2) & 7,
+            "osrs_h"        : ctrl_hum & 7,
+            "t_sb"          : (config >> 5) & 7,
+            "filter"        : (config >> 2) & 7,
+            "calibration"   : self.__cal_raw,
+            "raw"           : raw,
+            "values"        : self.compensate(*raw),
+        }
+
+    def snapshot(self):
+        """Synchronously call the coroutine snapshotAsync().
+        See snapshotAsync() for documentation about behaviour, arguments and return value.
+        """
+        return self.__run(self.snapshotAsync())
+
     async def resetAsync(self):
         """Reset the device.
         This is a coroutine.
         """
         if not self.__bus:
             raise BME280Error("BME280: Device not opened.")
+        stats = self.__stats
+        if stats:
+            begin = stats.begin()
         self.__cache_config = None
         self.__cache_ctrl_hum = None
+        self.__last_ctrl_meas = None
 
         # Reset the chip.
-        self.__write8(_REG_reset, 0xB6)
+        await self.__write8Async(_REG_reset, 0xB6)
 
         # Wait for the chip to come alive again.
-        await asyncio.sleep(0.05)
+        await self.__sleepAsync(0.05)
         for _ in range(5):
-            if self.__readU8(_REG_id) == 0x60:
+            if await self.__readU8Async(_REG_id) == 0x60:
                 break
-            await asyncio.sleep(0.01)
+            await self.__sleepAsync(0.01)
         else:
             raise BME280Error("BME280: ID register response incorrect (1).")
         for _ in range(5):
-            im_update, measuring = self.__read_status()
+            im_update, measuring = await self.__readStatusAsync()
             if not im_update and not measuring:
                 break
-            await asyncio.sleep(0.01)
+            await self.__sleepAsync(0.01)
         else:
             raise BME280Error("BME280: status register response incorrect.")
 
         # Read the ID register a couple of times to test if
         # the bus communication is stable.
         # If this fails, then there probably is a bus problem.
-        for _ in range(10):
-            if self.__readU8(_REG_id) != 0x60:
+        for data in await self.__transferAsync(((_REG_id, 1), ) * 10):
+            if data[0] != 0x60:
                 raise BME280Error("BME280: ID register response incorrect (2).")
 
         # Read calibration data.
-        self.__readCal()
+        await self.__readCalAsync()
 
         self.__resetPending = False
+        if stats:
+            stats.end("reset", begin)
 
     def reset(self):
         """Synchronously call the coroutine resetAsync().
         See resetAsync() for documentation about behaviour, arguments and return value.
         """
-        asyncio.run(self.resetAsync())
+        self.__run(self.resetAsync())
 
     async def startAsync(self,
                          mode,
@@ -516,19 +1159,32 @@ class BME280:
             raise BME280Error("BME280: Device not opened.")
         if self.__resetPending:
             await self.resetAsync()
-        self.__write_config(t_sb=standbyTime,
-                            filter=filter,
-                            spi3w_en=False)
-        self.__write_ctrl_hum(osrs_h=humidityOversampling)
-        self.__write_ctrl_meas(osrs_t=tempOversampling,
-                               osrs_p=pressureOversampling,
-                               mode=mode)
+        stats = self.__stats
+        if stats:
+            begin = stats.begin()
+        ops = []
+        config = self.__write_config(ops,
+                                     t_sb=standbyTime,
+                                     filter=filter,
+                                     spi3w_en=False)
+        ctrl_hum = self.__write_ctrl_hum(ops,
+                                         osrs_h=humidityOversampling)
+        ctrl_meas = self.__write_ctrl_meas(ops,
+                                           osrs_t=tempOversampling,
+                                           osrs_p=pressureOversampling,
+                                           mode=mode)
+        await self.__transferAsync(ops)
+        self.__cache_config = config
+        self.__cache_ctrl_hum = ctrl_hum
+        self.__last_ctrl_meas = ctrl_meas
+        if stats:
+            stats.end("trigger", begin)
 
     def start(self, *args, **kwargs):
         """Synchronously call the coroutine startAsync().
         See startAsync() for documentation about behaviour, arguments and return value.
         """
-        asyncio.run(self.startAsync(*args, **kwargs))
+        self.__run(self.startAsync(*args, **kwargs))
 
     async def readForcedAsync(self, *, pollSleep=0.05, **kwargs):
         """Trigger a MODE_FORCED conversion,
@@ -538,15 +1194,45 @@ class BME280:
         if not self.__bus:
             raise BME280Error("BME280: Device not opened.")
         await self.startAsync(**kwargs, mode=MODE_FORCED)
+        if self.__busBatch:
+            # Poll the status and read the data in one batch.
+            # This saves one round trip per conversion.
+            stats = self.__stats
+            health = self.__health
+            while True:
+                if stats:
+                    begin = stats.begin()
+                if health:
+                    healthBegin = ticks_us()
+                status, data = await self.__transferAsync((
+                    (_REG_status, 1),
+                    (_REG_press_msb, _REG_hum_lsb - _REG_press_msb + 1),
+                ))
+                # Account the combined transfer as a single operation:
+                # A status poll while measuring, a data read otherwise.
+                if not (status[0] & (1 << 3)):
+                    if stats:
+                        stats.end("data", begin)
+                    raw = self.__decodeRaw(data)
+                    if health:
+                        action = health.check(raw, ticks_diff(ticks_us(), healthBegin))
+                        if action:
+                            await self.__recoverAsync(action)
+                    if self.__retries:
+                        raw = await self.__checkRawAsync(raw)
+                    return self.__sample(raw)
+                if stats:
+                    stats.end("status", begin)
+                await self.__sleepAsync(pollSleep)
         while await self.isMeasuringAsync():
-            await asyncio.sleep(pollSleep)
+            await self.__sleepAsync(pollSleep)
         return await self.readAsync()
 
     def readForced(self, *args, **kwargs):
         """Synchronously call the coroutine readForcedAsync().
         See readForcedAsync() for documentation about behaviour, arguments and return value.
         """
-        return asyncio.run(self.readForcedAsync(*args, **kwargs))
+        return self.__run(self.readForcedAsync(*args, **kwargs))
 
     async def isMeasuringAsync(self):
         """Returns True, if the device is currently running the measurement cycle.
@@ -554,27 +1240,47 @@ class BME280:
         """
         if not self.__bus:
             raise BME280Error("BME280: Device not opened.")
-        im_update, measuring = self.__read_status()
+        im_update, measuring = await self.__readStatusAsync()
         return measuring
 
     def isMeasuring(self):
         """Synchronously call the coroutine isMeasuringAsync().
         See isMeasuringAsync() for documentation about behaviour, arguments and return value.
         """
-        return asyncio.run(self.isMeasuringAsync())
+        return self.__run(self.isMeasuringAsync())
 
-    async def readAsync(self):
-        """Read the temperature, humidity and pressure from the device.
-        Returns a tuple (temperature, humidity, pressure).
-        temparature in degree Celsius.
-        humitidy as value between 0 and 1. 0.0 = 0% -> 1.0 = 100%.
-        pressure in Pascal.
+    async def readRawAsync(self):
+        """Read the uncompensated temperature, humidity and pressure from the device.
+        Returns a tuple of the raw ADC values (ut, uh, up).
+        Use compensate() to convert them.
+        This is a coroutine.
         """
         if not self.__bus:
             raise BME280Error("BME280: Device not opened.")
 
         # Read the raw registers.
-        data = self.__readBurst(_REG_press_msb, _REG_hum_lsb)
+        stats = self.__stats
+        if stats:
+            begin = stats.begin()
+        health = self.__health
+        if health:
+            healthBegin = ticks_us()
+        data = await self.__readBurstAsync(_REG_press_msb, _REG_hum_lsb)
+        if stats:
+            stats.end("data", begin)
+        raw = self.__decodeRaw(data)
+        if health:
+            action = health.check(raw, ticks_diff(ticks_us(), healthBegin))
+            if action:
+                await self.__recoverAsync(action)
+        if self.__retries:
+            raw = await self.__checkRawAsync(raw)
+        return raw
+
+    @staticmethod
+    def __decodeRaw(data):
+        """Extract (ut, uh, up) from the _REG_press_msb.._REG_hum_lsb registers.
+        """
         def get(reg):
             return data[reg - _REG_press_msb]
 
@@ -592,18 +1298,164 @@ class BME280:
         uh = ((get(_REG_hum_msb) << 8) |
               get(_REG_hum_lsb))
 
-        # Run compensations.
+        return ut, uh, up
+
+    def readRaw(self):
+        """Synchronously call the coroutine readRawAsync().
+        See readRawAsync() for documentation about behaviour, arguments and return value.
+        """
+        return self.__run(self.readRawAsync())
+
+    def compensate(self, ut, uh, up):
+        """Convert the raw ADC values as returned by readRawAsync()
+        into the same tuple as returned by read().
+        """
+        stats = self.__stats
+        if stats:
+            begin = stats.begin()
         t_fine, t = self.__compT(ut)
         h = self.__compH(t_fine, uh)
         p = self.__compP(t_fine, up)
-
+        if stats:
+            stats.end("compensation", begin)
         return t, h, p
 
+    def setRetry(self, retries=3, backoff=0.001, maxBackoff=0.02, escalateAfter=3):
+        """Configure the recovery from transient bus errors.
+        'retries': Number of retries of a failed bus transaction.
+                   0 disables retries and the measurement data check.
+        'backoff': Delay before the first retry, in seconds.
+                   The delay doubles with each further retry.
+        'maxBackoff': Maximum delay between retries, in seconds.
+        'escalateAfter': Number of consecutive failed attempts after which
+                         the chip ID and the calibration are validated again
+                         and a lost configuration is restored.
+                         0 disables the escalation.
+        With retries enabled, measurement data that matches the reset value
+        or an all-0xFF bus failure pattern is read again as well.
+        """
+        self.__retries = retries
+        self.__backoff = backoff
+        self.__maxBackoff = maxBackoff
+        self.__escalateAfter = escalateAfter
+        self.__failures = 0
+
+    def setStats(self, stats):
+        """Install a BME280Stats instance to collect bus and
+        operation statistics. None disables the instrumentation.
+        """
+        self.__stats = stats
+
+    def setHealth(self, monitor):
+        """Install a bme280.health.HealthMonitor instance that checks
+        each raw data burst and requests recoveries from failures.
+        None removes the monitor.
+        """
+        self.__health = monitor
+
+    def setSampleHook(self, hook):
+        """Set a callable hook(raw, values) that is called by readAsync()
+        for each new sample. 'raw' is the tuple returned by readRawAsync()
+        and 'values' is the tuple returned by readAsync().
+        With a raw filter installed, 'raw' is the filtered tuple.
+        None removes the hook.
+        """
+        self.__sampleHook = hook
+
+    def setRawFilter(self, rawFilter):
+        """Set a callable rawFilter(raw) that filters the raw (ut, uh, up)
+        tuple of each new sample in readAsync() before compensation
+        and returns the filtered tuple.
+        The filtered values must be integers for CALC_INT32 and CALC_INT64.
+        See bme280.filter.SampleFilter.
+        None removes the filter.
+        """
+        self.__rawFilter = rawFilter
+
+    def setDeadband(self, t=None, h=None, p=None):
+        """Enable the change detection in readAsync().
+        't': Reporting threshold for the temperature, in degree Celsius.
+        'h': Reporting threshold for the humidity, 0.0 - 1.0.
+        'p': Reporting threshold for the pressure, in Pascal.
+        None ignores the channel. Without any threshold the change detection is disabled.
+        A new sample is only compensated and passed to the sample hook, if the
+        raw ADC value of at least one channel moved by its threshold away from
+        the last reported sample. Otherwise readAsync() returns the values of
+        the last reported sample. The thresholds are converted into raw ADC deltas
+        with the calibration slopes at the last reported sample.
+        """
+        if t is None and h is None and p is None:
+            self.__deadband = None
+        else:
+            self.__deadband = (t, h, p)
+        self.__deadbandRaw = None
+
+    async def readAsync(self):
+        """Read the temperature, humidity and pressure from the device.
+        Returns a tuple (temperature, humidity, pressure).
+        temparature in degree Celsius.
+        humitidy as value between 0 and 1. 0.0 = 0% -> 1.0 = 100%.
+        pressure in Pascal.
+        """
+        return self.__sample(await self.readRawAsync())
+
+    def __sample(self, raw):
+        """Filter and compensate a new raw sample and pass it to the sample hook.
+        """
+        if self.__rawFilter:
+            raw = self.__rawFilter(raw)
+        deadband = self.__deadband
+        if deadband:
+            lastRaw = self.__deadbandRaw
+            if lastRaw is not None:
+                limits = self.__deadbandLimits
+                for i in range(3):
+                    if limits[i] and abs(raw[i] - lastRaw[i]) >= limits[i]:
+                        break
+                else:
+                    if self.__stats:
+                        self.__stats.suppressed += 1
+                    return self.__deadbandValues
+        values = self.compensate(*raw)
+        if self.__health:
+            self.__health.checkValues(values)
+        if deadband:
+            self.__deadbandLimits = self.__rawLimits(raw, deadband)
+            self.__deadbandRaw = raw
+            self.__deadbandValues = values
+        if self.__sampleHook:
+            self.__sampleHook(raw, values)
+        return values
+
+    def __rawLimits(self, raw, thresholds):
+        """Convert the (t, h, p) reporting 'thresholds' into raw ADC deltas
+        at the operating point 'raw'. Returns a tuple of raw deltas. 0 = ignore channel.
+        """
+        step = 256
+        ut, uh, up = raw
+        t_fine, t = self.__compT_float(ut)
+        slopes = (
+            abs(self.__compT_float(ut + step)[1] - t),
+            abs(self.__compH_float(t_fine, uh + step) -
+                self.__compH_float(t_fine, uh)) * 1e-2,
+            abs(self.__compP_float(t_fine, up + step) -
+                self.__compP_float(t_fine, up)),
+        )
+        limits = []
+        for threshold, slope in zip(thresholds, slopes):
+            if threshold is None:
+                limits.append(0)
+            elif slope:
+                limits.append(max(int(threshold * step / slope), 1))
+            else:
+                limits.append(1)
+        return tuple(limits)
+
     def read(self):
         """Synchronously call the coroutine readAsync().
         See readAsync() for documentation about behaviour, arguments and return value.
         """
-        return asyncio.run(self.readAsync())
+        return self.__run(self.readAsync())
 
     def __compT(self, ut):
         """Convert the uncompensated temperature 'ut'
@@ -767,51 +1619,267 @@ class BME280:
         a -= ((((a >> 15) * (a >> 15)) >> 7) * H1) >> 4
         return a >> 12
 
-    def __read_status(self):
+    async def __readStatusAsync(self):
         """Read 'status' register.
         """
-        status = self.__readU8(_REG_status)
+        stats = self.__stats
+        if stats:
+            begin = stats.begin()
+        status = await self.__readU8Async(_REG_status)
+        if stats:
+            stats.end("status", begin)
         im_update = bool(status & (1 << 0))
         measuring = bool(status & (1 << 3))
         return im_update, measuring
 
-    def __write_config(self, t_sb, filter, spi3w_en):
-        """Write the 'config' register.
+    def __write_config(self, ops, t_sb, filter, spi3w_en):
+        """Queue a write of the 'config' register to 'ops',
+        if the cached register value differs.
+        Returns the new register value.
         """
         data = ((t_sb & 7) << 5) | ((filter & 7) << 2) | (spi3w_en & 1)
         if data != self.__cache_config:
-            self.__write8(_REG_config, data)
-            self.__cache_config = data
+            ops.append((_REG_config, data.to_bytes(1, "little")))
+        return data
 
-    def __write_ctrl_meas(self, osrs_t, osrs_p, mode):
-        """Write the 'ctrl_meas' register.
+    def __write_ctrl_meas(self, ops, osrs_t, osrs_p, mode):
+        """Queue a write of the 'ctrl_meas' register to 'ops'.
+        Returns the new register value.
         """
         data = ((osrs_t & 7) << 5) | ((osrs_p & 7) <<  2) | (mode & 3)
-        self.__write8(_REG_ctrl_meas, data)
+        ops.append((_REG_ctrl_meas, data.to_bytes(1, "little")))
+        return data
 
-    def __write_ctrl_hum(self, osrs_h):
-        """Write the 'ctrl_hum' register.
+    def __write_ctrl_hum(self, ops, osrs_h):
+        """Queue a write of the 'ctrl_hum' register to 'ops',
+        if the cached register value differs.
+        Returns the new register value.
         """
         data = osrs_h & 7
         if data != self.__cache_ctrl_hum:
-            self.__write8(_REG_ctrl_hum, data)
-            self.__cache_ctrl_hum = data
+            ops.append((_REG_ctrl_hum, data.to_bytes(1, "little")))
+        return data
 
-    def __readU8(self, reg):
+    async def __readAsync(self, reg, length):
+        """Burst read 'length' registers starting at 'reg'.
+        """
+        if self.__retries:
+            return await self.__retryAsync(self.__readOnceAsync, reg, length)
+        return await self.__readOnceAsync(reg, length)
+
+    async def __readOnceAsync(self, reg, length):
+        bus = self.__bus
+        stats = self.__stats
+        if not self.__busAsync or self.__syncRun:
+            if stats:
+                return stats.busRead(bus, reg, length)
+            return bus.read(reg, length)
+        if stats:
+            begin = stats.begin()
+            try:
+                data = await bus.readAsync(reg, length)
+            except BME280Error:
+                stats.busFailed(1)
+                raise
+            stats.busDone("read", begin, 1, bytesRead=length)
+            return data
+        return await bus.readAsync(reg, length)
+
+    async def __writeAsync(self, reg, data):
+        """Burst write 'data' starting at register 'reg'.
+        """
+        if self.__retries:
+            await self.__retryAsync(self.__writeOnceAsync, reg, data)
+        else:
+            await self.__writeOnceAsync(reg, data)
+
+    async def __writeOnceAsync(self, reg, data):
+        bus = self.__bus
+        stats = self.__stats
+        if not self.__busAsync or self.__syncRun:
+            if stats:
+                stats.busWrite(bus, reg, data)
+            else:
+                bus.write(reg, data)
+        elif stats:
+            begin = stats.begin()
+            try:
+                await bus.writeAsync(reg, data)
+            except BME280Error:
+                stats.busFailed(1)
+                raise
+            stats.busDone("write", begin, 1, bytesWritten=len(data))
+        else:
+            await bus.writeAsync(reg, data)
+
+    async def __transferAsync(self, ops):
+        """Run the transactions 'ops' as described by BME280Transport.transfer().
+        They are submitted as one batch, if the transport supports that.
+        Otherwise they are run one by one.
+        """
+        batch = self.__busBatch
+        if batch == _BATCH_NONE:
+            results = []
+            for reg, arg in ops:
+                if isinstance(arg, int):
+                    results.append(await self.__readAsync(reg, arg))
+                else:
+                    await self.__writeAsync(reg, arg)
+                    results.append(None)
+            return results
+        if not ops:
+            return []
+        if self.__retries:
+            return await self.__retryAsync(self.__transferOnceAsync, ops)
+        return await self.__transferOnceAsync(ops)
+
+    async def __transferOnceAsync(self, ops):
+        """Submit 'ops' as one batch.
+        """
+        batch = self.__busBatch
+        stats = self.__stats
+        if stats:
+            begin = stats.begin()
+        try:
+            if batch == _BATCH_ASYNC and not self.__syncRun:
+                results = await self.__bus.transferAsync(ops)
+            else:
+                results = self.__bus.transfer(ops)
+        except BME280Error:
+            if stats:
+                stats.busFailed(len(ops))
+            raise
+        if stats:
+            bytesRead = bytesWritten = 0
+            for reg, arg in ops:
+                if isinstance(arg, int):
+                    bytesRead += arg
+                else:
+                    bytesWritten += len(arg)
+            stats.busDone("transfer", begin, len(ops), bytesRead, bytesWritten)
+        return results
+
+    async def __retryAsync(self, func, *args):
+        """Run the bus operation coroutine function 'func'
+        with bounded retries and back-off.
+        """
+        attempt = 0
+        while True:
+            try:
+                result = await func(*args)
+            except BME280Error:
+                attempt += 1
+                if attempt > self.__retries:
+                    raise
+                await self.__failedAsync(attempt)
+                continue
+            self.__failures = 0
+            return result
+
+    async def __failedAsync(self, attempt):
+        """Account the failed attempt 'attempt' of an operation,
+        escalate on repeated failures and back off.
+        """
+        if self.__stats:
+            self.__stats.retries += 1
+        self.__failures += 1
+        if self.__escalateAfter and self.__failures >= self.__escalateAfter:
+            self.__failures = 0
+            await self.__revalidateAsync()
+        await self.__sleepAsync(min(self.__backoff * (1 << (attempt - 1)), self.__maxBackoff))
+
+    async def __revalidateAsync(self):
+        """Validate the chip ID and the calibration again
+        and restore the configuration, if the device lost it.
+        This does not reset the device. Errors are ignored.
+        """
+        try:
+            if (await self.__readOnceAsync(_REG_id, 1))[0] != 0x60:
+                return
+            cal = bytes(await self.__readOnceAsync(_REG_dig_T1, _REG_dig_H1 - _REG_dig_T1 + 1))
+            cal += bytes(await self.__readOnceAsync(_REG_dig_H2, _REG_dig_H6 - _REG_dig_H2 + 1))
+            try:
+                calValid = (cal == self.__cal_raw)
+            except AttributeError:
+                calValid = False
+            if not calValid:
+                self.__setCal(cal)
+            ctrl_hum, status, ctrl_meas, config = await self.__readOnceAsync(
+                    _REG_ctrl_hum, _REG_config - _REG_ctrl_hum + 1)
+            if ((self.__cache_ctrl_hum is not None and ctrl_hum != self.__cache_ctrl_hum) or
+                (self.__cache_config is not None and config != self.__cache_config)):
+                # The device has been reset, e.g. by a brown-out.
+                # Restore the configuration and a running normal mode.
+                if self.__cache_config is not None:
+                    await self.__writeOnceAsync(_REG_config, self.__cache_config.to_bytes(1, "little"))
+                if self.__cache_ctrl_hum is not None:
+                    await self.__writeOnceAsync(_REG_ctrl_hum, self.__cache_ctrl_hum.to_bytes(1, "little"))
+            # Restore a running normal mode.
+            last = self.__last_ctrl_meas
+            if last is not None and (last & 3) == MODE_NORMAL and ctrl_meas != last:
+                await self.__writeOnceAsync(_REG_ctrl_meas, last.to_bytes(1, "little"))
+        except BME280Error:
+            pass
+
+    async def __recoverAsync(self, action):
+        """Run the recovery 'action' requested by the health monitor.
+        _RECOVER_RESET resets the device and restores the configuration.
+        Errors are ignored.
+        """
+        if action != _RECOVER_RESET:
+            await self.__revalidateAsync()
+            return
+        config = self.__cache_config
+        ctrl_hum = self.__cache_ctrl_hum
+        last = self.__last_ctrl_meas
+        try:
+            await self.resetAsync()
+            ops = []
+            if config is not None:
+                ops.append((_REG_config, config.to_bytes(1, "little")))
+            if ctrl_hum is not None:
+                ops.append((_REG_ctrl_hum, ctrl_hum.to_bytes(1, "little")))
+            if last is not None and (last & 3) == MODE_NORMAL:
+                ops.append((_REG_ctrl_meas, last.to_bytes(1, "little")))
+            await self.__transferAsync(ops)
+            self.__cache_config = config
+            self.__cache_ctrl_hum = ctrl_hum
+            self.__last_ctrl_meas = last
+        except BME280Error:
+            pass
+
+    async def __checkRawAsync(self, raw):
+        """Check the raw measurement 'raw' for the reset value
+        and bus failure patterns and read it again, if it matches.
+        """
+        attempt = 0
+        while raw in _INVALID_RAW:
+            attempt += 1
+            if attempt > self.__retries:
+                raise BME280Error("BME280: Invalid measurement data.")
+            await self.__failedAsync(attempt)
+            # A successful read does not end the sequence of failures.
+            failures = self.__failures
+            raw = self.__decodeRaw(await self.__readBurstAsync(_REG_press_msb, _REG_hum_lsb))
+            self.__failures = failures
+        if attempt:
+            self.__failures = 0
+        return raw
+
+    async def __readU8Async(self, reg):
         """Read a register and interpret the value as unsigned 8-bit.
         """
-        return self.__bus.read(reg, 1)[0]
+        return (await self.__readAsync(reg, 1))[0]
 
-    def __readBurst(self, startReg, endReg):
+    async def __readBurstAsync(self, startReg, endReg):
         """Read multiple registers with a burst transfer.
         """
         assert endReg >= startReg
-        length = (endReg - startReg) + 1
-        return self.__bus.read(startReg, length)
+        return await self.__readAsync(startReg, (endReg - startReg) + 1)
 
-    def __write8(self, reg, value):
+    async def __write8Async(self, reg, value):
         """Write an 8-bit register.
         """
-        self.__bus.write(reg, (value & 0xFF).to_bytes(1, "little"))
+        await self.__writeAsync(reg, (value & 0xFF).to_bytes(1, "little"))
 
 # vim: ts=4 sw=4 expandtab
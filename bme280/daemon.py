@@ -0,0 +1,383 @@
+#
+# BME280 device driver - Multi client sensor daemon
+# Copyright (c) 2020-2023 Michael Büsch <m@bues.ch>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Protocol:
+#   Each request is a REQUEST struct (opcode, sensor index).
+#   Each answer is a REPLY struct (status, timestamp, t, h, p).
+#   OP_LATEST returns the most recent sample without bus access.
+#   OP_FORCED triggers a forced conversion. Concurrent OP_FORCED requests
+#   for the same sensor share one conversion.
+#   OP_SUBSCRIBE turns the connection into a stream of REPLYs,
+#   one for each new sample of the sensor. A subscriber that does not
+#   keep up with reading is disconnected.
+#
+
+__all__ = [
+    "SensorDaemon",
+    "SensorClient",
+]
+
+import asyncio
+import os
+import socket
+import struct
+import time
+
+from .bme280 import BME280Error
+
+OP_LATEST       = 1
+OP_FORCED       = 2
+OP_SUBSCRIBE    = 3
+
+STATUS_OK       = 0
+STATUS_NODATA   = 1
+STATUS_ERROR    = 2
+STATUS_INVALID  = 3
+
+REQUEST = struct.Struct("<BB")
+REPLY = struct.Struct("<Bdddd")
+
+class _SharedSensor:
+    """One physical sensor owned by the daemon.
+    """
+    __slots__ = (
+        "bme",
+        "readKwargs",
+        "maxBacklog",
+        "latest",
+        "inflight",
+        "subscribers",
+    )
+
+    def __init__(self, bme, readKwargs, maxBacklog):
+        self.bme = bme
+        self.readKwargs = readKwargs
+        self.maxBacklog = maxBacklog
+        self.latest = None
+        self.inflight = None
+        self.subscribers = set()
+
+    async def sample(self):
+        """Run a forced conversion or join the one that is already running.
+        """
+        if self.inflight is None:
+            self.inflight = asyncio.ensure_future(self.__sample())
+        return await asyncio.shield(self.inflight)
+
+    async def __sample(self):
+        try:
+            t, h, p = await self.bme.readForcedAsync(**self.readKwargs)
+            self.latest = (time.time(), t, h, p)
+        finally:
+            self.inflight = None
+        reply = REPLY.pack(STATUS_OK, *self.latest)
+        for writer in tuple(self.subscribers):
+            if writer.is_closing():
+                self.subscribers.discard(writer)
+            elif writer.transport.get_write_buffer_size() > self.maxBacklog:
+                # The subscriber stopped reading. Drop it instead of
+                # buffering an unlimited amount of samples.
+                self.subscribers.discard(writer)
+                writer.transport.abort()
+            else:
+                writer.write(reply)
+        return self.latest
+
+class SensorDaemon:
+    """Daemon that owns BME280 sensors and shares them with any number of
+    local clients over a Unix domain socket.
+    """
+    __slots__ = (
+        "__path",
+        "__sensors",
+        "__interval",
+        "__server",
+        "__tasks",
+        "__clients",
+    )
+
+    def __init__(self, path, sensors, interval=None, maxBacklog=64 * 1024, **readKwargs):
+        """'path': Unix domain socket path.
+        'sensors': List of BME280 instances. Clients address them by list index.
+        'interval': If not None, sample all sensors periodically with this
+                    interval, in seconds. Otherwise sensors are only sampled
+                    on OP_FORCED requests.
+        'maxBacklog': Maximum number of bytes buffered for a subscriber
+                      that are not sent, yet. A subscriber that falls further
+                      behind is disconnected.
+        Further keyword arguments are passed to BME280.readForcedAsync().
+        """
+        self.__path = path
+        self.__sensors = [ _SharedSensor(bme, readKwargs, maxBacklog) for bme in sensors ]
+        self.__interval = interval
+        self.__server = None
+        self.__tasks = []
+        # Client handler task -> StreamWriter
+        self.__clients = {}
+
+    async def __sampler(self, sensor):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            try:
+                await sensor.sample()
+            except BME280Error:
+                pass
+            deadline = max(deadline + self.__interval, loop.time())
+            await asyncio.sleep(deadline - loop.time())
+
+    async def __handle(self, reader, writer):
+        """Handle one client connection.
+        """
+        task = asyncio.current_task()
+        self.__clients[task] = writer
+        try:
+            while True:
+                try:
+                    op, index = REQUEST.unpack(await reader.readexactly(REQUEST.size))
+                except asyncio.IncompleteReadError:
+                    break
+                if index >= len(self.__sensors):
+                    writer.write(REPLY.pack(STATUS_INVALID, 0.0, 0.0, 0.0, 0.0))
+                    continue
+                sensor = self.__sensors[index]
+                if op == OP_LATEST:
+                    if sensor.latest is None:
+                        writer.write(REPLY.pack(STATUS_NODATA, 0.0, 0.0, 0.0, 0.0))
+                    else:
+                        writer.write(REPLY.pack(STATUS_OK, *sensor.latest))
+                elif op == OP_FORCED:
+                    try:
+                        writer.write(REPLY.pack(STATUS_OK, *(await sensor.sample())))
+                    except BME280Error:
+                        writer.write(REPLY.pack(STATUS_ERROR, 0.0, 0.0, 0.0, 0.0))
+                elif op == OP_SUBSCRIBE:
+                    sensor.subscribers.add(writer)
+                    try:
+                        # Wait for the client to disconnect.
+                        while await reader.read(64):
+                            pass
+                    finally:
+                        sensor.subscribers.discard(writer)
+                    break
+                else:
+                    writer.write(REPLY.pack(STATUS_INVALID, 0.0, 0.0, 0.0, 0.0))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            # Cancelled by stopAsync().
+            # Return normally, because the stream callback can't handle cancellation.
+            pass
+        finally:
+            self.__clients.pop(task, None)
+            writer.close()
+
+    async def startAsync(self):
+        """Start listening on the socket.
+        This is a coroutine.
+        """
+        try:
+            os.unlink(self.__path)
+        except FileNotFoundError:
+            pass
+        self.__server = await asyncio.start_unix_server(self.__handle, self.__path)
+        if self.__interval is not None:
+            self.__tasks = [ asyncio.create_task(self.__sampler(s)) for s in self.__sensors ]
+
+    async def stopAsync(self):
+        """Stop listening, disconnect all clients and remove the socket.
+        This is a coroutine.
+        """
+        for task in self.__tasks:
+            task.cancel()
+        for task in self.__tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.__tasks = []
+        if self.__server:
+            self.__server.close()
+            # Disconnect the clients.
+            clients = list(self.__clients.items())
+            for task, writer in clients:
+                writer.close()
+                task.cancel()
+            await asyncio.gather(*(task for task, _ in clients), return_exceptions=True)
+            self.__clients.clear()
+            await self.__server.wait_closed()
+            self.__server = None
+            try:
+                os.unlink(self.__path)
+            except FileNotFoundError:
+                pass
+
+    async def runAsync(self):
+        """Run the daemon until cancelled.
+        This is a coroutine.
+        """
+        await self.startAsync()
+        try:
+            await self.__server.serve_forever()
+        finally:
+            await self.stopAsync()
+
+    def run(self):
+        """Synchronously call the coroutine runAsync().
+        """
+        asyncio.run(self.runAsync())
+
+def _unpackReply(data):
+    status, timestamp, t, h, p = REPLY.unpack(data)
+    if status == STATUS_OK:
+        return timestamp, (t, h, p)
+    if status == STATUS_NODATA:
+        raise BME280Error("BME280: Daemon has no sample, yet.")
+    if status == STATUS_ERROR:
+        raise BME280Error("BME280: Daemon failed to read the sensor.")
+    raise BME280Error("BME280: Invalid daemon request.")
+
+class SensorClient:
+    """Client for a sensor shared by SensorDaemon.
+    The read methods mirror the BME280 read API.
+    """
+    __slots__ = (
+        "__path",
+        "__sensor",
+        "__sock",
+        "__streams",
+        "timestamp",
+    )
+
+    def __init__(self, path, sensor=0):
+        """'path': Unix domain socket path of the daemon.
+        'sensor': Sensor index in the daemon.
+        """
+        self.__path = path
+        self.__sensor = sensor
+        self.__sock = None
+        self.__streams = None
+        self.timestamp = None
+
+    def close(self):
+        """Close the connections to the daemon.
+        """
+        if self.__sock:
+            self.__sock.close()
+            self.__sock = None
+        if self.__streams:
+            self.__streams[1].close()
+            self.__streams = None
+
+    async def closeAsync(self):
+        """Close the connections to the daemon.
+        This is a coroutine.
+        """
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.closeAsync()
+
+    def __request(self, op):
+        try:
+            if not self.__sock:
+                self.__sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.__sock.connect(self.__path)
+            self.__sock.sendall(REQUEST.pack(op, self.__sensor))
+            data = b""
+            while len(data) < REPLY.size:
+                chunk = self.__sock.recv(REPLY.size - len(data))
+                if not chunk:
+                    raise ConnectionError("Connection closed.")
+                data += chunk
+        except OSError as e:
+            self.close()
+            raise BME280Error("BME280: Daemon connection error: %s" % str(e))
+        self.timestamp, values = _unpackReply(data)
+        return values
+
+    async def __requestAsync(self, op):
+        try:
+            if not self.__streams:
+                self.__streams = await asyncio.open_unix_connection(self.__path)
+            reader, writer = self.__streams
+            writer.write(REQUEST.pack(op, self.__sensor))
+            await writer.drain()
+            data = await reader.readexactly(REPLY.size)
+        except (OSError, asyncio.IncompleteReadError) as e:
+            self.close()
+            raise BME280Error("BME280: Daemon connection error: %s" % str(e))
+        self.timestamp, values = _unpackReply(data)
+        return values
+
+    async def readAsync(self):
+        """Get the latest sample of the daemon without triggering a conversion.
+        Returns a tuple (temperature, humidity, pressure), like BME280.readAsync().
+        The Unix time of the sample is stored in the 'timestamp' attribute.
+        This is a coroutine.
+        """
+        return await self.__requestAsync(OP_LATEST)
+
+    def read(self):
+        """Synchronous variant of readAsync().
+        """
+        return self.__request(OP_LATEST)
+
+    async def readForcedAsync(self):
+        """Get a fresh sample from a forced conversion.
+        Concurrent requests of multiple clients share one conversion.
+        This is a coroutine.
+        """
+        return await self.__requestAsync(OP_FORCED)
+
+    def readForced(self):
+        """Synchronous variant of readForcedAsync().
+        """
+        return self.__request(OP_FORCED)
+
+    async def subscribeAsync(self):
+        """Asynchronous generator yielding (timestamp, (t, h, p))
+        for each new sample of the sensor.
+        """
+        try:
+            reader, writer = await asyncio.open_unix_connection(self.__path)
+        except OSError as e:
+            raise BME280Error("BME280: Daemon connection error: %s" % str(e))
+        try:
+            writer.write(REQUEST.pack(OP_SUBSCRIBE, self.__sensor))
+            await writer.drain()
+            while True:
+                try:
+                    data = await reader.readexactly(REPLY.size)
+                except (OSError, asyncio.IncompleteReadError) as e:
+                    raise BME280Error("BME280: Daemon connection error: %s" % str(e))
+                yield _unpackReply(data)
+        finally:
+            writer.close()
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,296 @@
+#
+# BME280 device driver - Derived quantities
+# Copyright (c) 2020-2023 Michael Büsch <m@bues.ch>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# All functions take the values as returned by BME280.read():
+# temperature in degree Celsius, humidity 0.0 - 1.0 and pressure in Pascal.
+# They accept single values or sequences of values.
+# Sequences are evaluated element-wise and returned as list.
+# numpy arrays are evaluated vectorized and returned as numpy array.
+#
+# With fast=True the exp/log/pow math is replaced by linear interpolation
+# in precomputed tables. That is much cheaper on Micropython ports
+# without floating point hardware. Maximum errors within the given
+# input ranges, compared to the exact formulas:
+#   altitude()              0.05 m          pressure 0.25 - 1.15 * p0
+#   seaLevelPressure()      0.5 Pa          altitude -500 - 9000 m, p <= 110 kPa
+#   dewPoint()              0.001 degC      humidity 0.05 - 1.0
+#                           0.02 degC       humidity 0.01 - 0.05
+#   absoluteHumidity()      0.005 g/m^3     temperature -40 - 85 degC
+# Outside of these ranges the tables are extrapolated linearly.
+#
+
+__all__ = [
+    "SEA_LEVEL_PRESSURE",
+    "altitude",
+    "seaLevelPressure",
+    "dewPoint",
+    "absoluteHumidity",
+    "Altimeter",
+]
+
+import math
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Standard atmosphere sea level pressure, in Pascal.
+SEA_LEVEL_PRESSURE = 101325.0
+
+# Barometric formula constants.
+_ALT_SCALE  = 44330.0
+_ALT_EXP    = 1.0 / 5.255
+
+# Magnus formula constants (Sonntag 1990).
+_MAGNUS_B   = 17.62
+_MAGNUS_C   = 243.12
+
+class _Table:
+    """Linear interpolation table of func(x) for x in [lo, hi].
+    """
+    __slots__ = (
+        "__lo",
+        "__scale",
+        "__last",
+        "__values",
+        "__vector",
+    )
+
+    def __init__(self, func, lo, hi, size):
+        step = (hi - lo) / (size - 1)
+        self.__lo = lo
+        self.__scale = 1.0 / step
+        self.__last = size - 2
+        self.__values = array("f", (func(lo + i * step) for i in range(size)))
+        self.__vector = None
+
+    def __call__(self, x):
+        pos = (x - self.__lo) * self.__scale
+        i = int(pos)
+        if i < 0:
+            i = 0
+        elif i > self.__last:
+            i = self.__last
+        values = self.__values
+        a = values[i]
+        return a + (values[i + 1] - a) * (pos - i)
+
+    def vector(self, x):
+        """Vectorized __call__() for numpy arrays.
+        """
+        values = self.__vector
+        if values is None:
+            values = self.__vector = numpy.array(self.__values, dtype=numpy.float64)
+        pos = (x - self.__lo) * self.__scale
+        i = numpy.clip(numpy.trunc(pos), 0, self.__last).astype(numpy.intp)
+        a = values[i]
+        return a + (values[i + 1] - a) * (pos - i)
+
+_tables = {}
+
+def _table(name):
+    """Get the interpolation table 'name'. It is built on first use.
+    """
+    table = _tables.get(name)
+    if table is None:
+        if name == "pow":
+            table = _Table(lambda x: x ** _ALT_EXP, 0.25, 1.15, 513)
+        elif name == "slp":
+            table = _Table(lambda a: (1.0 - a / _ALT_SCALE) ** -5.255, -500.0, 9000.0, 513)
+        elif name == "log":
+            table = _Table(math.log, 0.01, 1.0, 1025)
+        else: # "svp"
+            table = _Table(_saturationVaporPressure, -40.0, 85.0, 501)
+        _tables[name] = table
+    return table
+
+def _lookup(m, name, x):
+    """Interpolate x in the table 'name'. 'm' is math or numpy.
+    """
+    table = _table(name)
+    return table(x) if m is math else table.vector(x)
+
+def _elementwise(func, *args):
+    """Evaluate func(*args) for single values or element-wise for sequences.
+    """
+    if numpy is not None:
+        for arg in args:
+            if isinstance(arg, numpy.ndarray):
+                return func(numpy, *args)
+    for arg in args:
+        if not isinstance(arg, (int, float)):
+            break
+    else:
+        return func(math, *args)
+    n = max(len(arg) for arg in args if not isinstance(arg, (int, float)))
+    args = [ ([ arg ] * n if isinstance(arg, (int, float)) else arg)
+             for arg in args ]
+    return [ func(math, *values) for values in zip(*args) ]
+
+def _saturationVaporPressure(t):
+    """Saturation vapor pressure over water in hPa (Magnus).
+    """
+    return 6.112 * math.exp(_MAGNUS_B * t / (_MAGNUS_C + t))
+
+def _altitude(m, p, p0):
+    return _ALT_SCALE * (1.0 - (p / p0) ** _ALT_EXP)
+
+def _altitudeFast(m, p, p0):
+    return _ALT_SCALE * (1.0 - _lookup(m, "pow", p / p0))
+
+def altitude(p, p0=SEA_LEVEL_PRESSURE, fast=False):
+    """Altitude in meters at the pressure 'p' (Pascal),
+    for the sea level reference pressure 'p0' (Pascal).
+    """
+    if fast:
+        return _elementwise(_altitudeFast, p, p0)
+    return _elementwise(_altitude, p, p0)
+
+def _seaLevelPressure(m, p, alt):
+    return p * (1.0 - alt / _ALT_SCALE) ** -5.255
+
+def _seaLevelPressureFast(m, p, alt):
+    return p * _lookup(m, "slp", alt)
+
+def seaLevelPressure(p, altitude, fast=False):
+    """Sea level pressure in Pascal for the pressure 'p' (Pascal)
+    measured at 'altitude' (meters).
+    """
+    if fast:
+        return _elementwise(_seaLevelPressureFast, p, altitude)
+    return _elementwise(_seaLevelPressure, p, altitude)
+
+def _dewPoint(m, t, h):
+    if m is math:
+        if h <= 0.0:
+            return -273.15
+        gamma = math.log(h) + _MAGNUS_B * t / (_MAGNUS_C + t)
+        return _MAGNUS_C * gamma / (_MAGNUS_B - gamma)
+    gamma = m.log(m.where(h > 0.0, h, 1.0)) + _MAGNUS_B * t / (_MAGNUS_C + t)
+    return m.where(h > 0.0, _MAGNUS_C * gamma / (_MAGNUS_B - gamma), -273.15)
+
+def _dewPointFast(m, t, h):
+    if m is math:
+        if h <= 0.0:
+            return -273.15
+        gamma = _lookup(m, "log", h) + _MAGNUS_B * t / (_MAGNUS_C + t)
+        return _MAGNUS_C * gamma / (_MAGNUS_B - gamma)
+    gamma = _lookup(m, "log", m.where(h > 0.0, h, 1.0)) + _MAGNUS_B * t / (_MAGNUS_C + t)
+    return m.where(h > 0.0, _MAGNUS_C * gamma / (_MAGNUS_B - gamma), -273.15)
+
+def dewPoint(t, h, fast=False):
+    """Dew point in degree Celsius for the temperature 't' (degree Celsius)
+    and the relative humidity 'h' (0.0 - 1.0).
+    """
+    if fast:
+        return _elementwise(_dewPointFast, t, h)
+    return _elementwise(_dewPoint, t, h)
+
+def _absoluteHumidity(m, t, h):
+    return (6.112 * m.exp(_MAGNUS_B * t / (_MAGNUS_C + t)) *
+            h * 216.74 / (273.15 + t))
+
+def _absoluteHumidityFast(m, t, h):
+    return _lookup(m, "svp", t) * h * 216.74 / (273.15 + t)
+
+def absoluteHumidity(t, h, fast=False):
+    """Absolute humidity in g/m^3 for the temperature 't' (degree Celsius)
+    and the relative humidity 'h' (0.0 - 1.0).
+    """
+    if fast:
+        return _elementwise(_absoluteHumidityFast, t, h)
+    return _elementwise(_absoluteHumidity, t, h)
+
+class Altimeter:
+    """Altitude calculation with a cached reference pressure.
+    The reciprocal of the reference pressure and the sea level
+    pressure factor of the last altitude are cached.
+    """
+    __slots__ = (
+        "__p0",
+        "__p0Inv",
+        "__fast",
+        "__slpAltitude",
+        "__slpFactor",
+    )
+
+    def __init__(self, p0=SEA_LEVEL_PRESSURE, fast=False):
+        """'p0': Sea level reference pressure (QNH), in Pascal.
+        'fast': Use the interpolation tables.
+        """
+        self.__fast = fast
+        self.__slpAltitude = None
+        self.__slpFactor = 1.0
+        self.reference = p0
+
+    @property
+    def reference(self):
+        """The sea level reference pressure, in Pascal.
+        """
+        return self.__p0
+
+    @reference.setter
+    def reference(self, p0):
+        self.__p0 = float(p0)
+        self.__p0Inv = 1.0 / self.__p0
+
+    def calibrate(self, p, altitude):
+        """Set the reference pressure from the pressure 'p' (Pascal)
+        measured at the known 'altitude' (meters).
+        """
+        self.reference = seaLevelPressure(p, altitude)
+
+    def altitude(self, p):
+        """Altitude in meters at the pressure 'p' (Pascal).
+        'p' may be a single value or a sequence.
+        """
+        p0Inv = self.__p0Inv
+        if self.__fast:
+            power = _table("pow")
+            if isinstance(p, (int, float)):
+                return _ALT_SCALE * (1.0 - power(p * p0Inv))
+            if numpy is not None and isinstance(p, numpy.ndarray):
+                return _ALT_SCALE * (1.0 - power.vector(p * p0Inv))
+            return [ _ALT_SCALE * (1.0 - power(x * p0Inv)) for x in p ]
+        if isinstance(p, (int, float)):
+            return _ALT_SCALE * (1.0 - (p * p0Inv) ** _ALT_EXP)
+        if numpy is not None and isinstance(p, numpy.ndarray):
+            return _ALT_SCALE * (1.0 - (p * p0Inv) ** _ALT_EXP)
+        return [ _ALT_SCALE * (1.0 - (x * p0Inv) ** _ALT_EXP) for x in p ]
+
+    def seaLevelPressure(self, p, altitude):
+        """Sea level pressure in Pascal for the pressure 'p' (Pascal)
+        measured at the fixed station 'altitude' (meters).
+        'p' may be a single value or a sequence.
+        """
+        if altitude != self.__slpAltitude:
+            if self.__fast:
+                self.__slpFactor = _table("slp")(altitude)
+            else:
+                self.__slpFactor = (1.0 - altitude / _ALT_SCALE) ** -5.255
+            self.__slpAltitude = altitude
+        factor = self.__slpFactor
+        if isinstance(p, (int, float)):
+            return p * factor
+        if numpy is not None and isinstance(p, numpy.ndarray):
+            return p * factor
+        return [ x * factor for x in p ]
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,165 @@
+#
+# BME280 device driver - Bus scan and sensor discovery
+# Copyright (c) 2020-2023 Michael Büsch <m@bues.ch>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+__all__ = [
+    "i2cBuses",
+    "discoverAsync",
+    "discover",
+]
+
+import sys
+
+from . import bme280 as _driver
+from .bme280 import BME280, BME280Error
+
+if sys.implementation.name == "micropython":
+    import uasyncio as asyncio
+else:
+    import asyncio
+
+# Possible I2C addresses of the BME280.
+ADDRESSES = (0x76, 0x77)
+
+_REG_id     = 0xD0
+_CHIP_ID    = 0x60
+
+def i2cBuses():
+    """Get the sorted list of Linux I2C bus indices (/dev/i2c-N).
+    """
+    import os
+    buses = []
+    try:
+        names = os.listdir("/dev")
+    except OSError:
+        return buses
+    for name in names:
+        if name.startswith("i2c-"):
+            try:
+                buses.append(int(name[4:]))
+            except ValueError:
+                pass
+    return sorted(buses)
+
+def _probe(bus, addrs, micropython, busFreq):
+    """Read the chip ID register of each address in 'addrs' on one bus.
+    On CPython this runs in a worker thread.
+    Returns (bus, list of addresses that responded with the BME280 ID).
+    """
+    found = []
+    if micropython:
+        if not hasattr(bus, "readfrom_mem"):
+            from machine import I2C
+            try:
+                bus = I2C(bus, freq=busFreq * 1000)
+            except Exception:
+                return bus, found
+        # A scan is cheaper than a failing register read.
+        try:
+            present = bus.scan() if hasattr(bus, "scan") else addrs
+        except Exception:
+            return bus, found
+        for addr in addrs:
+            if addr not in present:
+                continue
+            try:
+                if bus.readfrom_mem(addr, _REG_id, 1)[0] == _CHIP_ID:
+                    found.append(addr)
+            except Exception:
+                pass
+        return bus, found
+
+    if hasattr(bus, "read_i2c_block_data"):
+        smbus = bus
+    else:
+        try:
+            from smbus import SMBus
+            smbus = SMBus(bus)
+        except Exception:
+            return bus, found
+    try:
+        for addr in addrs:
+            try:
+                if smbus.read_i2c_block_data(addr, _REG_id, 1)[0] == _CHIP_ID:
+                    found.append(addr)
+            except Exception:
+                pass
+    finally:
+        if smbus is not bus:
+            smbus.close()
+    return bus, found
+
+async def discoverAsync(buses=None, addrs=ADDRESSES, reset=True, busFreq=100, **kwargs):
+    """Find all BME280 devices on the I2C buses 'buses'.
+    'buses': List of bus indices or Micropython I2C / Linux SMBus objects.
+             Defaults to all /dev/i2c-N buses on Linux.
+    'addrs': The I2C addresses to probe.
+    'reset': If True, the found devices are reset concurrently.
+             Otherwise only their calibration is read with snapshotAsync()
+             and the reset is done on the first start.
+    'busFreq': Bus clock frequency, in kHz.
+    Further keyword arguments are passed to the BME280 constructor.
+    Probing only reads the ID register. On CPython all buses are probed
+    concurrently in worker threads.
+    Returns a list of (bus, address, BME280 instance).
+    Sensors that fail to initialize are not returned.
+    This is a coroutine.
+    """
+    micropython = _driver.isMicropython
+    if buses is None:
+        if micropython:
+            raise BME280Error("BME280: No I2C buses specified.")
+        buses = i2cBuses()
+    if micropython:
+        results = [ _probe(bus, addrs, True, busFreq) for bus in buses ]
+    else:
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(None, _probe, bus, addrs, False, busFreq)
+            for bus in buses
+        ))
+
+    sensors = []
+    for bus, found in results:
+        for addr in found:
+            try:
+                sensors.append((bus, addr, BME280(i2cBus=bus, i2cAddr=addr,
+                                                  busFreq=busFreq, **kwargs)))
+            except BME280Error:
+                pass
+
+    async def init(bme):
+        try:
+            if reset:
+                await bme.resetAsync()
+            else:
+                await bme.snapshotAsync()
+        except BME280Error:
+            await bme.closeAsync()
+            return False
+        return True
+    ok = await asyncio.gather(*(init(bme) for bus, addr, bme in sensors))
+    return [ sensor for sensor, good in zip(sensors, ok) if good ]
+
+def discover(*args, **kwargs):
+    """Synchronously call the coroutine discoverAsync().
+    See discoverAsync() for documentation about behaviour, arguments and return value.
+    """
+    return asyncio.run(discoverAsync(*args, **kwargs))
+
+# vim: ts=4 sw=4 expandtab
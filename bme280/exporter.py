@@ -0,0 +1,237 @@
+#
+# BME280 device driver - Prometheus/OpenMetrics exporter
+# Copyright (c) 2020-2023 Michael Büsch <m@bues.ch>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+__all__ = [
+    "MetricsExporter",
+]
+
+import asyncio
+import time
+
+from .bme280 import BME280Error
+
+# Read latency histogram bucket bounds, in seconds.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+def _escapeLabel(value):
+    """Escape a label value for the OpenMetrics text format.
+    """
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+class _SensorState:
+    """Cached sample and counters of one sensor.
+    """
+    __slots__ = (
+        "name",
+        "label",
+        "bme",
+        "values",
+        "timestamp",
+        "samples",
+        "errors",
+        "latencySum",
+        "latencyBuckets",
+    )
+
+    def __init__(self, name, bme):
+        self.name = name
+        self.label = _escapeLabel(name)
+        self.bme = bme
+        self.values = None
+        self.timestamp = None
+        self.samples = 0
+        self.errors = 0
+        self.latencySum = 0.0
+        self.latencyBuckets = [ 0 ] * (len(LATENCY_BUCKETS) + 1)
+
+    def addLatency(self, latency):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                break
+        else:
+            i = len(LATENCY_BUCKETS)
+        self.latencyBuckets[i] += 1
+        self.latencySum += latency
+
+class MetricsExporter:
+    """HTTP exporter serving BME280 samples in OpenMetrics text format.
+    Each sensor is sampled on its own schedule in the background.
+    Scrapes are served from the cached latest samples and never touch the bus.
+    """
+    __slots__ = (
+        "__sensors",
+        "__interval",
+        "__host",
+        "__port",
+        "__readKwargs",
+        "__server",
+        "__tasks",
+    )
+
+    def __init__(self, sensors, interval=10.0, host="127.0.0.1", port=9280, **readKwargs):
+        """'sensors': dict of { "name": BME280 instance }.
+        'interval': Sampling interval, in seconds.
+        'host', 'port': HTTP listen address. Port 0 picks a free port.
+        Further keyword arguments are passed to BME280.readForcedAsync().
+        """
+        self.__sensors = [ _SensorState(name, bme) for name, bme in sensors.items() ]
+        self.__interval = interval
+        self.__host = host
+        self.__port = port
+        self.__readKwargs = readKwargs
+        self.__server = None
+        self.__tasks = []
+
+    @property
+    def port(self):
+        """The port the HTTP server listens on.
+        """
+        if self.__server:
+            return self.__server.sockets[0].getsockname()[1]
+        return self.__port
+
+    async def __sampler(self, state):
+        """Periodically sample one sensor.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            begin = time.monotonic()
+            try:
+                state.values = await state.bme.readForcedAsync(**self.__readKwargs)
+                state.timestamp = time.time()
+                state.samples += 1
+            except BME280Error:
+                state.errors += 1
+            state.addLatency(time.monotonic() - begin)
+            deadline = max(deadline + self.__interval, loop.time())
+            await asyncio.sleep(deadline - loop.time())
+
+    def render(self):
+        """Render all metrics as OpenMetrics text.
+        """
+        now = time.time()
+        lines = []
+        def family(name, type_, help_, unit=None):
+            lines.append("# TYPE %s %s" % (name, type_))
+            if unit:
+                lines.append("# UNIT %s %s" % (name, unit))
+            lines.append("# HELP %s %s" % (name, help_))
+
+        def gauge(name, help_, unit, index):
+            family(name, "gauge", help_, unit)
+            for s in self.__sensors:
+                if s.values is not None:
+                    lines.append('%s{sensor="%s"} %r' % (name, s.label, s.values[index]))
+
+        gauge("bme280_temperature_celsius", "Temperature.", "celsius", 0)
+        gauge("bme280_humidity_ratio", "Relative humidity.", "ratio", 1)
+        gauge("bme280_pressure_pascals", "Pressure.", "pascals", 2)
+        family("bme280_sample_age_seconds", "gauge", "Age of the latest sample.", "seconds")
+        for s in self.__sensors:
+            if s.timestamp is not None:
+                lines.append('bme280_sample_age_seconds{sensor="%s"} %r' % (
+                             s.label, max(now - s.timestamp, 0.0)))
+        family("bme280_samples", "counter", "Successful samples.")
+        for s in self.__sensors:
+            lines.append('bme280_samples_total{sensor="%s"} %d' % (s.label, s.samples))
+        family("bme280_bus_errors", "counter", "Failed samples.")
+        for s in self.__sensors:
+            lines.append('bme280_bus_errors_total{sensor="%s"} %d' % (s.label, s.errors))
+        family("bme280_read_latency_seconds", "histogram",
+               "Latency of a forced mode sample.", "seconds")
+        for s in self.__sensors:
+            count = 0
+            for bound, n in zip(LATENCY_BUCKETS + ("+Inf", ), s.latencyBuckets):
+                count += n
+                lines.append('bme280_read_latency_seconds_bucket{sensor="%s",le="%s"} %d' % (
+                             s.label, bound, count))
+            lines.append('bme280_read_latency_seconds_count{sensor="%s"} %d' % (s.label, count))
+            lines.append('bme280_read_latency_seconds_sum{sensor="%s"} %r' % (s.label, s.latencySum))
+        lines.append("# EOF\n")
+        return "\n".join(lines).encode("UTF-8")
+
+    async def __handle(self, reader, writer):
+        """Handle one HTTP connection.
+        """
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            method, _, rest = request.decode("latin-1").partition(" ")
+            path = rest.partition(" ")[0].partition("?")[0]
+            if method != "GET":
+                status, body, ctype = "405 Method Not Allowed", b"", "text/plain"
+            elif path in ("/metrics", "/"):
+                status, body, ctype = "200 OK", self.render(), CONTENT_TYPE
+            else:
+                status, body, ctype = "404 Not Found", b"", "text/plain"
+            writer.write(("HTTP/1.1 %s\r\n"
+                          "Content-Type: %s\r\n"
+                          "Content-Length: %d\r\n"
+                          "Connection: close\r\n"
+                          "\r\n" % (status, ctype, len(body))).encode("latin-1") + body)
+            await writer.drain()
+        except (ConnectionError, UnicodeError):
+            pass
+        finally:
+            writer.close()
+
+    async def startAsync(self):
+        """Start the samplers and the HTTP server.
+        This is a coroutine.
+        """
+        self.__tasks = [ asyncio.create_task(self.__sampler(s)) for s in self.__sensors ]
+        self.__server = await asyncio.start_server(self.__handle, self.__host, self.__port)
+
+    async def stopAsync(self):
+        """Stop the HTTP server and the samplers.
+        This is a coroutine.
+        """
+        if self.__server:
+            self.__server.close()
+            await self.__server.wait_closed()
+            self.__server = None
+        for task in self.__tasks:
+            task.cancel()
+        for task in self.__tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.__tasks = []
+
+    async def runAsync(self):
+        """Run the exporter until cancelled.
+        This is a coroutine.
+        """
+        await self.startAsync()
+        try:
+            await self.__server.serve_forever()
+        finally:
+            await self.stopAsync()
+
+    def run(self):
+        """Synchronously call the coroutine runAsync().
+        """
+        asyncio.run(self.runAsync())
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,356 @@
+#
+# BME280 device driver - Streaming software post-filters
+# Copyright (c) 2020-2023 Michael Büsch <m@bues.ch>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Each filter stage processes one value per update() call with constant
+# cost and fixed-size state that is allocated on construction.
+# SampleFilter applies stages to the channels of (t, h, p) tuples.
+# Install it with BME280.setRawFilter() to filter the raw ADC values
+# before compensation.
+#
+
+__all__ = [
+    "MedianFilter",
+    "IIRFilter",
+    "KalmanFilter",
+    "FilterChain",
+    "SampleFilter",
+]
+
+from array import array
+
+class MedianFilter:
+    """Running median of the last 'window' values.
+    Each update is O(log window). The window is kept in an indexable
+    double heap: A max-heap of the lower half and a min-heap of the upper
+    half meet at the median. The oldest value is replaced in place.
+    """
+    __slots__ = (
+        "__size",
+        "__data",
+        "__pos",
+        "__heap",
+        "__offs",
+        "__idx",
+        "__count",
+    )
+
+    def __init__(self, window):
+        """'window': Number of values in the window.
+        """
+        if window < 1:
+            raise ValueError("Invalid median window.")
+        self.__size = window
+        self.__data = [ 0 ] * window
+        # Heap slot of each data index and data index of each heap slot.
+        # Heap slots run from -(window // 2) (max-heap) to (window - 1) // 2 (min-heap).
+        self.__pos = array("i", [ 0 ] * window)
+        self.__heap = array("i", [ 0 ] * window)
+        self.__offs = window // 2
+        self.reset()
+
+    def reset(self):
+        """Discard all values.
+        """
+        self.__idx = 0
+        self.__count = 0
+        for i in range(self.__size):
+            slot = ((i + 1) // 2) * (-1 if (i & 1) else 1)
+            self.__pos[i] = slot
+            self.__heap[slot + self.__offs] = i
+
+    @property
+    def count(self):
+        """Number of values in the window.
+        """
+        return self.__count
+
+    def __less(self, i, j):
+        offs = self.__offs
+        data = self.__data
+        return data[self.__heap[i + offs]] < data[self.__heap[j + offs]]
+
+    def __exchange(self, i, j):
+        offs = self.__offs
+        heap = self.__heap
+        a = heap[i + offs]
+        b = heap[j + offs]
+        heap[i + offs] = b
+        heap[j + offs] = a
+        self.__pos[b] = i
+        self.__pos[a] = j
+
+    def __cmpExchange(self, i, j):
+        if self.__less(i, j):
+            self.__exchange(i, j)
+            return True
+        return False
+
+    def __minSortDown(self, i):
+        """Restore the min-heap from slot 'i' downwards.
+        """
+        minCount = (self.__count - 1) // 2
+        while i <= minCount:
+            if i > 1 and i < minCount and self.__less(i + 1, i):
+                i += 1
+            if not self.__cmpExchange(i, i // 2):
+                break
+            i *= 2
+
+    def __maxSortDown(self, i):
+        """Restore the max-heap from slot 'i' downwards.
+        """
+        maxCount = self.__count // 2
+        while i >= -maxCount:
+            if i < -1 and i > -maxCount and self.__less(i, i - 1):
+                i -= 1
+            if not self.__cmpExchange(-((-i) // 2), i):
+                break
+            i *= 2
+
+    def __minSortUp(self, i):
+        while i > 0 and self.__cmpExchange(i, i // 2):
+            i //= 2
+        return i == 0
+
+    def __maxSortUp(self, i):
+        while i < 0 and self.__cmpExchange(-((-i) // 2), i):
+            i = -((-i) // 2)
+        return i == 0
+
+    def update(self, value):
+        """Add 'value' to the window, replacing the oldest one.
+        Returns the new median.
+        """
+        idx = self.__idx
+        isNew = self.__count < self.__size
+        p = self.__pos[idx]
+        old = self.__data[idx]
+        self.__data[idx] = value
+        idx += 1
+        self.__idx = 0 if idx >= self.__size else idx
+        if isNew:
+            self.__count += 1
+        if p > 0:
+            # The value is in the min-heap.
+            if not isNew and old < value:
+                self.__minSortDown(p * 2)
+            elif self.__minSortUp(p):
+                self.__maxSortDown(-1)
+        elif p < 0:
+            # The value is in the max-heap.
+            if not isNew and value < old:
+                self.__maxSortDown(p * 2)
+            elif self.__maxSortUp(p):
+                self.__minSortDown(1)
+        else:
+            # The value is at the median.
+            if self.__count // 2:
+                self.__maxSortDown(-1)
+            if (self.__count - 1) // 2:
+                self.__minSortDown(1)
+        return self.median
+
+    @property
+    def median(self):
+        """The current median. For an even number of values
+        it is the mean of the two center values.
+        """
+        data = self.__data
+        offs = self.__offs
+        value = data[self.__heap[offs]]
+        if not (self.__count & 1):
+            other = data[self.__heap[offs - 1]]
+            if isinstance(value, int) and isinstance(other, int):
+                return (value + other) >> 1
+            return (value + other) * 0.5
+        return value
+
+    __call__ = update
+
+class IIRFilter:
+    """Single-pole IIR low pass filter on integers:
+    y += (x - y) / 2**shift
+    The state keeps 'shift' fractional bits, so small steps
+    are not lost to truncation. Use it on raw ADC values or
+    on values scaled to fixed-point integers.
+    The first value initializes the state.
+    """
+    __slots__ = (
+        "__shift",
+        "__acc",
+    )
+
+    def __init__(self, shift):
+        """'shift': Filter coefficient. The time constant is 2**shift samples.
+        """
+        if shift < 0:
+            raise ValueError("Invalid IIR shift.")
+        self.__shift = shift
+        self.reset()
+
+    def reset(self):
+        """Discard the filter state.
+        """
+        self.__acc = None
+
+    def update(self, value):
+        """Filter the integer 'value'. Returns the filtered integer.
+        """
+        shift = self.__shift
+        acc = self.__acc
+        if acc is None:
+            acc = value << shift
+        else:
+            acc += value - (acc >> shift)
+        self.__acc = acc
+        if shift:
+            return (acc + (1 << (shift - 1))) >> shift
+        return acc
+
+    __call__ = update
+
+class KalmanFilter:
+    """Scalar Kalman filter for a slowly varying value,
+    such as pressure or altitude (random walk process model).
+    Integer values, such as raw ADC values, are filtered in fixed point
+    and the estimate is returned as integer. The state then keeps
+    'fracBits' fractional bits, like IIRFilter.
+    The first value initializes the state and selects the mode.
+    """
+    __slots__ = (
+        "__q",
+        "__r",
+        "__fracBits",
+        "__x",
+        "__p",
+    )
+
+    def __init__(self, processNoise, measurementNoise, fracBits=8):
+        """'processNoise': Variance of the change of the true value per sample.
+        'measurementNoise': Variance of the measurement noise.
+        Both in squared units of the filtered values.
+        'fracBits': Number of fractional state bits for integer values.
+        """
+        if fracBits < 0:
+            raise ValueError("Invalid Kalman fractional bits.")
+        self.__q = float(processNoise)
+        self.__r = float(measurementNoise)
+        self.__fracBits = fracBits
+        self.reset()
+
+    def reset(self):
+        """Discard the filter state.
+        """
+        self.__x = None
+        self.__p = 0.0
+
+    @property
+    def variance(self):
+        """The current estimate error variance.
+        """
+        return self.__p
+
+    def update(self, value):
+        """Filter 'value'. Returns the current estimate.
+        """
+        x = self.__x
+        fracBits = self.__fracBits
+        if x is None:
+            self.__p = self.__r
+            if isinstance(value, int):
+                self.__x = value << fracBits
+                return value
+            self.__x = float(value)
+            return self.__x
+        # The error variance does not depend on the values.
+        p = self.__p + self.__q
+        k = p / (p + self.__r)
+        self.__p = (1.0 - k) * p
+        if isinstance(x, int):
+            # Apply the gain with 16 fractional bits.
+            kFix = int(k * 65536.0 + 0.5)
+            x += (kFix * ((value << fracBits) - x) + 32768) >> 16
+            self.__x = x
+            if fracBits:
+                return (x + (1 << (fracBits - 1))) >> fracBits
+            return x
+        x += k * (value - x)
+        self.__x = x
+        return x
+
+    __call__ = update
+
+class FilterChain:
+    """Run a value through multiple filter stages in order.
+    """
+    __slots__ = (
+        "__stages",
+    )
+
+    def __init__(self, *stages):
+        self.__stages = stages
+
+    def reset(self):
+        for stage in self.__stages:
+            stage.reset()
+
+    def update(self, value):
+        for stage in self.__stages:
+            value = stage.update(value)
+        return value
+
+    __call__ = update
+
+class SampleFilter:
+    """Apply filter stages to the channels of (t, h, p) tuples
+    or raw (ut, uh, up) tuples.
+    Channels without a stage pass through unchanged.
+    """
+    __slots__ = (
+        "__t",
+        "__h",
+        "__p",
+    )
+
+    def __init__(self, t=None, h=None, p=None):
+        """'t', 'h', 'p': Filter stage for each channel, or None.
+        """
+        self.__t = t
+        self.__h = h
+        self.__p = p
+
+    def reset(self):
+        for stage in (self.__t, self.__h, self.__p):
+            if stage is not None:
+                stage.reset()
+
+    def update(self, sample):
+        """Filter the tuple 'sample'. Returns the filtered tuple.
+        """
+        t, h, p = sample
+        if self.__t is not None:
+            t = self.__t.update(t)
+        if self.__h is not None:
+            h = self.__h.update(h)
+        if self.__p is not None:
+            p = self.__p.update(p)
+        return t, h, p
+
+    __call__ = update
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,254 @@
+#
+# BME280 device driver - Sensor health monitor
+# Copyright (c) 2020-2023 Michael Büsch <m@bues.ch>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# The monitor checks each raw data burst that the driver reads:
+#   HEALTH_INVALID  The temperature reads the reset value 0x80000 or the
+#                   floating bus pattern 0xFFFFF. Or humidity/pressure read
+#                   their skip value after having delivered real values.
+#                   That is what a device looks like after a brown-out.
+#   HEALTH_STUCK    The same raw burst was read 'stuckAfter' times in a row.
+#                   The device stopped converting.
+#   HEALTH_RANGE    The temperature or pressure is at the compensation clamp
+#                   limits. The humidity is not checked, because 0% and 100%
+#                   are physical values.
+#   HEALTH_LATENCY  The smoothed latency of the data burst exceeds the
+#                   baseline of the first 'warmup' reads by 'latencyRatio'.
+# Invalid, stuck and out of range data request a recovery from the driver.
+# The driver validates the chip ID and the calibration again and restores
+# a lost configuration. After 'resetAfter' recoveries without a healthy
+# sample in between the driver resets the device and restores its configuration.
+#
+
+__all__ = [
+    "HEALTH_OK",
+    "HEALTH_INVALID",
+    "HEALTH_STUCK",
+    "HEALTH_RANGE",
+    "HEALTH_LATENCY",
+    "RECOVER_NONE",
+    "RECOVER_REVALIDATE",
+    "RECOVER_RESET",
+    "HealthMonitor",
+]
+
+HEALTH_OK           = 0
+HEALTH_INVALID      = 1 << 0
+HEALTH_STUCK        = 1 << 1
+HEALTH_RANGE        = 1 << 2
+HEALTH_LATENCY      = 1 << 3
+
+# Recovery actions returned by HealthMonitor.check().
+RECOVER_NONE        = 0
+RECOVER_REVALIDATE  = 1
+RECOVER_RESET       = 2
+
+class HealthMonitor:
+    """Sensor health monitor.
+    Install an instance with BME280.setHealth().
+    """
+    __slots__ = (
+        "__stuckAfter",
+        "__resetAfter",
+        "__warmup",
+        "__latencyRatio",
+        "__latencyShift",
+        "__hook",
+        "__state",
+        "__lastRaw",
+        "__same",
+        "__seen",
+        "__recoveries",
+        "__pending",
+        "__samples",
+        "__latencyAcc",
+        "__latencyBaseline",
+        "__latencyLimit",
+        "revalidations",
+        "resets",
+    )
+
+    def __init__(self,
+                 stuckAfter=16,
+                 resetAfter=3,
+                 warmup=32,
+                 latencyRatio=2.0,
+                 latencyShift=5,
+                 hook=None):
+        """'stuckAfter': Number of identical raw bursts in a row that mark the
+                      device as stuck. Each read must be at least one conversion
+                      apart, which is always true in MODE_FORCED.
+                      0 disables the check.
+        'resetAfter': Number of recoveries without a healthy sample in between
+                      after which the device is reset.
+        'warmup': Number of reads that form the latency baseline.
+        'latencyRatio': Smoothed latency to baseline ratio above which
+                        the latency is anomalous. 0 disables the check.
+        'latencyShift': Smoothing of the latency. The time constant is
+                        2**latencyShift reads.
+        'hook': Optional callable hook(state) that is called on each state change.
+        """
+        self.__stuckAfter = stuckAfter
+        self.__resetAfter = max(resetAfter, 1)
+        self.__warmup = max(warmup, 1)
+        self.__latencyRatio = latencyRatio
+        self.__latencyShift = latencyShift
+        self.__hook = hook
+        self.revalidations = 0
+        self.resets = 0
+        self.clear()
+
+    def clear(self):
+        """Forget the state, the history and the latency baseline.
+        Call this after intentionally disabling the humidity or pressure measurement.
+        """
+        self.__state = HEALTH_OK
+        self.__lastRaw = None
+        self.__same = 0
+        self.__seen = 0
+        self.__recoveries = 0
+        self.__pending = RECOVER_NONE
+        self.rebaseline()
+
+    def rebaseline(self):
+        """Form a new latency baseline from the next 'warmup' reads.
+        """
+        self.__samples = 0
+        self.__latencyAcc = 0
+        self.__latencyBaseline = None
+        self.__latencyLimit = None
+        self.__setState(self.__state & ~HEALTH_LATENCY)
+
+    @property
+    def state(self):
+        """The current health state. HEALTH_OK or a combination of HEALTH_... flags.
+        """
+        return self.__state
+
+    @property
+    def healthy(self):
+        """True, if the state is HEALTH_OK.
+        """
+        return self.__state == HEALTH_OK
+
+    @property
+    def latencyBaseline(self):
+        """The latency baseline in microseconds or None during warmup.
+        """
+        return self.__latencyBaseline
+
+    @property
+    def latency(self):
+        """The smoothed latency in microseconds or None during warmup.
+        """
+        if self.__latencyBaseline is None:
+            return None
+        return self.__latencyAcc >> self.__latencyShift
+
+    def __setState(self, state):
+        if state != self.__state:
+            self.__state = state
+            if self.__hook:
+                self.__hook(state)
+
+    def __recover(self):
+        """Count a recovery request. Returns the recovery action.
+        """
+        self.__recoveries += 1
+        if self.__recoveries >= self.__resetAfter:
+            self.__recoveries = 0
+            self.resets += 1
+            return RECOVER_RESET
+        self.revalidations += 1
+        return RECOVER_REVALIDATE
+
+    def check(self, raw, latency):
+        """Check the raw data burst 'raw' (ut, uh, up) that was
+        read in 'latency' microseconds. This is called by the driver.
+        Returns one of RECOVER_...
+        """
+        state = self.__state
+        action = self.__pending
+        self.__pending = RECOVER_NONE
+        ut, uh, up = raw
+
+        # Reset value and floating bus pattern.
+        seen = self.__seen
+        if (ut == 0x80000 or ut == 0xFFFFF or
+            (uh == 0x8000 and seen & 1) or
+            (up == 0x80000 and seen & 2)):
+            state |= HEALTH_INVALID
+            action = self.__recover()
+        else:
+            state &= ~HEALTH_INVALID
+            if uh != 0x8000:
+                seen |= 1
+            if up != 0x80000:
+                seen |= 2
+            self.__seen = seen
+
+            # Frozen data.
+            if raw == self.__lastRaw:
+                self.__same += 1
+                stuckAfter = self.__stuckAfter
+                if stuckAfter and self.__same >= stuckAfter:
+                    state |= HEALTH_STUCK
+                    if self.__same % stuckAfter == 0:
+                        action = self.__recover()
+            else:
+                self.__same = 1
+                self.__lastRaw = raw
+                state &= ~HEALTH_STUCK
+                if not state & (HEALTH_RANGE | HEALTH_INVALID):
+                    self.__recoveries = 0
+
+        # Bus latency.
+        if self.__latencyRatio:
+            shift = self.__latencyShift
+            if self.__latencyBaseline is None:
+                self.__latencyAcc += latency
+                self.__samples += 1
+                if self.__samples >= self.__warmup:
+                    baseline = self.__latencyAcc // self.__samples
+                    self.__latencyBaseline = baseline
+                    self.__latencyLimit = int(baseline * self.__latencyRatio)
+                    self.__latencyAcc = baseline << shift
+            else:
+                acc = self.__latencyAcc + latency - (self.__latencyAcc >> shift)
+                self.__latencyAcc = acc
+                if (acc >> shift) > self.__latencyLimit:
+                    state |= HEALTH_LATENCY
+                else:
+                    state &= ~HEALTH_LATENCY
+
+        self.__setState(state)
+        return action
+
+    def checkValues(self, values):
+        """Check the compensated (t, h, p) 'values' against the clamp limits.
+        This is called by the driver. A requested recovery runs with the next read.
+        """
+        t, h, p = values
+        if (t <= -40.0 or t >= 85.0 or
+            ((p <= 30000.0 or p >= 110000.0) and self.__seen & 2)):
+            if not self.__state & HEALTH_RANGE:
+                self.__pending = self.__recover()
+                self.__setState(self.__state | HEALTH_RANGE)
+        elif self.__state & HEALTH_RANGE:
+            self.__setState(self.__state & ~HEALTH_RANGE)
+
+# vim: ts=4 sw=4 expandtab
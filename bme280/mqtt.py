@@ -0,0 +1,391 @@
+#
+# BME280 device driver - Batched MQTT publisher
+# Copyright (c) 2020-2023 Michael Büsch <m@bues.ch>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Batch payload format:
+#   u8      format version (1)
+#   varint  number of samples
+#   varint  base timestamp, in milliseconds
+#   For each sample the zigzag varint encoded differences to the
+#   previous sample (the first sample is relative to (base, 0, 0, 0)) of:
+#     timestamp     milliseconds
+#     temperature   1/100 degree Celsius
+#     humidity      1/100 % relative humidity
+#     pressure      1/10 Pascal
+#
+
+__all__ = [
+    "BatchPublisher",
+    "MQTTClient",
+    "encodeBatch",
+    "decodeBatch",
+]
+
+import socket
+import sys
+import time
+
+from .bme280 import BME280Error
+
+isMicropython = sys.implementation.name == "micropython"
+
+FORMAT_VERSION = 1
+
+# Fixed-point scaling of the encoded values.
+_SCALE_T    = 100
+_SCALE_H    = 10000
+_SCALE_P    = 10
+
+if isMicropython:
+    def _ticks():
+        return time.ticks_ms()
+    def _ticksDiff(a, b):
+        return time.ticks_diff(a, b)
+else:
+    def _ticks():
+        return int(time.monotonic() * 1000.0)
+    def _ticksDiff(a, b):
+        return a - b
+
+def _putVarint(buf, value):
+    while value >= 0x80:
+        buf.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+def _putZigzag(buf, value):
+    _putVarint(buf, (value << 1) if value >= 0 else (((-value) << 1) - 1))
+
+def _getVarint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not (byte & 0x80):
+            return value, offset
+        shift += 7
+
+def _getZigzag(data, offset):
+    value, offset = _getVarint(data, offset)
+    return ((value >> 1) if not (value & 1) else -((value + 1) >> 1)), offset
+
+def encodeBatch(samples):
+    """Encode a list of samples (timestamp_ms, t, h, p)
+    into the compact delta encoded batch payload.
+    The values are fixed-point integers, as stored by BatchPublisher.
+    """
+    buf = bytearray()
+    buf.append(FORMAT_VERSION)
+    _putVarint(buf, len(samples))
+    base = samples[0][0] if samples else 0
+    _putVarint(buf, base)
+    prevTs, prevT, prevH, prevP = base, 0, 0, 0
+    for ts, t, h, p in samples:
+        _putZigzag(buf, ts - prevTs)
+        _putZigzag(buf, t - prevT)
+        _putZigzag(buf, h - prevH)
+        _putZigzag(buf, p - prevP)
+        prevTs, prevT, prevH, prevP = ts, t, h, p
+    return bytes(buf)
+
+def decodeBatch(payload):
+    """Decode a batch payload.
+    Returns a list of (timestamp, t, h, p)
+    with timestamp in seconds and t, h, p as returned by BME280.read().
+    """
+    try:
+        if payload[0] != FORMAT_VERSION:
+            raise BME280Error("BME280: Unknown MQTT batch format %d." % payload[0])
+        count, offset = _getVarint(payload, 1)
+        ts, offset = _getVarint(payload, offset)
+        t = h = p = 0
+        samples = []
+        for _ in range(count):
+            d, offset = _getZigzag(payload, offset)
+            ts += d
+            d, offset = _getZigzag(payload, offset)
+            t += d
+            d, offset = _getZigzag(payload, offset)
+            h += d
+            d, offset = _getZigzag(payload, offset)
+            p += d
+            samples.append((ts / 1000.0, t / _SCALE_T, h / _SCALE_H, p / _SCALE_P))
+    except IndexError:
+        raise BME280Error("BME280: Truncated MQTT batch.")
+    return samples
+
+class MQTTClient:
+    """Minimal MQTT 3.1.1 QoS 0 publish client for CPython and Micropython.
+    It implements the subset of the umqtt.simple.MQTTClient interface
+    that is used by BatchPublisher. Any umqtt style client may be used instead.
+    """
+    __slots__ = (
+        "__clientId",
+        "__server",
+        "__port",
+        "__user",
+        "__password",
+        "__keepalive",
+        "__timeout",
+        "__sock",
+    )
+
+    def __init__(self, clientId, server, port=1883, user=None, password=None,
+                 keepalive=0, timeout=5.0):
+        self.__clientId = clientId
+        self.__server = server
+        self.__port = port
+        self.__user = user
+        self.__password = password
+        self.__keepalive = keepalive
+        self.__timeout = timeout
+        self.__sock = None
+
+    @staticmethod
+    def __string(data):
+        if isinstance(data, str):
+            data = data.encode("UTF-8")
+        return len(data).to_bytes(2, "big") + data
+
+    def __send(self, packetType, body):
+        header = bytearray()
+        header.append(packetType)
+        _putVarint(header, len(body))
+        data = bytes(header) + body
+        if hasattr(self.__sock, "sendall"):
+            self.__sock.sendall(data)
+        else:
+            self.__sock.write(data)
+
+    def __recv(self, length):
+        data = b""
+        while len(data) < length:
+            chunk = self.__sock.recv(length - len(data))
+            if not chunk:
+                raise OSError("MQTT connection closed.")
+            data += chunk
+        return data
+
+    def connect(self, clean_session=True):
+        self.disconnect()
+        addr = socket.getaddrinfo(self.__server, self.__port)[0][-1]
+        self.__sock = socket.socket()
+        try:
+            self.__sock.settimeout(self.__timeout)
+            self.__sock.connect(addr)
+            flags = 0x02 if clean_session else 0x00
+            payload = self.__string(self.__clientId)
+            if self.__user is not None:
+                flags |= 0x80
+                payload += self.__string(self.__user)
+                if self.__password is not None:
+                    flags |= 0x40
+                    payload += self.__string(self.__password)
+            self.__send(0x10, (self.__string(b"MQTT") +
+                               bytes((4, flags)) +
+                               self.__keepalive.to_bytes(2, "big") +
+                               payload))
+            ack = self.__recv(4)
+            if ack[0] != 0x20 or ack[3] != 0:
+                raise OSError("MQTT connection refused (%d)." % ack[3])
+        except Exception:
+            self.disconnect()
+            raise
+        return False
+
+    def disconnect(self):
+        if self.__sock:
+            try:
+                self.__send(0xE0, b"")
+            except OSError:
+                pass
+            self.__sock.close()
+            self.__sock = None
+
+    def ping(self):
+        if not self.__sock:
+            raise OSError("MQTT not connected.")
+        self.__send(0xC0, b"")
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        if not self.__sock:
+            raise OSError("MQTT not connected.")
+        assert qos == 0
+        try:
+            self.__send(0x30 | (1 if retain else 0), self.__string(topic) + msg)
+        except Exception:
+            self.disconnect()
+            raise
+
+class BatchPublisher:
+    """Collect samples per topic and publish them as compact batches.
+    A batch is published, if it holds 'maxSamples' samples or
+    if its oldest sample is 'maxAge' seconds old.
+    Encoded batches wait in a bounded queue while the client is disconnected.
+    """
+    __slots__ = (
+        "__client",
+        "__maxSamples",
+        "__maxAge",
+        "__maxQueue",
+        "__reconnectInterval",
+        "__batches",
+        "__queue",
+        "__connected",
+        "__lastConnect",
+        "published",
+        "rejected",
+    )
+
+    def __init__(self, client, maxSamples=64, maxAge=10.0, maxQueue=16,
+                 reconnectInterval=5.0):
+        """'client': umqtt style client (connect(), publish(), disconnect()).
+        'maxSamples': Maximum number of samples per batch.
+        'maxAge': Maximum age of a batch, in seconds.
+        'maxQueue': Maximum number of queued batches.
+        'reconnectInterval': Minimum time between reconnect attempts, in seconds.
+        """
+        self.__client = client
+        self.__maxSamples = maxSamples
+        self.__maxAge = int(maxAge * 1000)
+        self.__maxQueue = maxQueue
+        self.__reconnectInterval = int(reconnectInterval * 1000)
+        self.__batches = {}
+        self.__queue = []
+        self.__connected = False
+        self.__lastConnect = None
+        self.published = 0
+        self.rejected = 0
+
+    @property
+    def queued(self):
+        """Number of encoded batches waiting to be published.
+        """
+        return len(self.__queue)
+
+    @property
+    def full(self):
+        """True, if the queue of encoded batches is full.
+        """
+        return len(self.__queue) >= self.__maxQueue
+
+    def add(self, topic, t, h, p, timestamp=None):
+        """Add one sample as returned by BME280.read() to the batch of 'topic'.
+        'timestamp': Unix time in seconds. Defaults to now.
+        Returns False, if the sample was rejected, because the batch
+        is complete and the queue is full.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        batch = self.__batches.get(topic)
+        if batch is not None and len(batch[1]) >= self.__maxSamples:
+            self.poll()
+            batch = self.__batches.get(topic)
+            if batch is not None:
+                self.rejected += 1
+                return False
+        if batch is None:
+            batch = self.__batches[topic] = (_ticks(), [])
+        batch[1].append((int(timestamp * 1000),
+                         round(t * _SCALE_T),
+                         round(h * _SCALE_H),
+                         round(p * _SCALE_P)))
+        self.poll()
+        return True
+
+    async def sampleAsync(self, topic, bme):
+        """Read a sample from the BME280 instance 'bme' and add it.
+        The device is not read, if the queue is full.
+        Returns the sample or None, if it was rejected.
+        This is a coroutine.
+        """
+        if self.full:
+            self.poll()
+            if self.full:
+                self.rejected += 1
+                return None
+        t, h, p = await bme.readAsync()
+        self.add(topic, t, h, p)
+        return t, h, p
+
+    def __enqueue(self, topic):
+        _, samples = self.__batches.pop(topic)
+        self.__queue.append((topic, encodeBatch(samples)))
+
+    def poll(self):
+        """Enqueue complete and aged batches and publish queued batches.
+        Call this periodically, if samples are added rarely.
+        """
+        self.__publishQueue()
+        now = _ticks()
+        for topic, (begin, samples) in list(self.__batches.items()):
+            if len(self.__queue) >= self.__maxQueue:
+                break
+            if (len(samples) >= self.__maxSamples or
+                _ticksDiff(now, begin) >= self.__maxAge):
+                self.__enqueue(topic)
+        self.__publishQueue()
+
+    def flush(self):
+        """Enqueue all batches, as far as the queue has space,
+        and publish all queued batches.
+        Returns True, if everything was published.
+        """
+        self.__publishQueue()
+        for topic in list(self.__batches.keys()):
+            if len(self.__queue) >= self.__maxQueue:
+                break
+            self.__enqueue(topic)
+        self.__publishQueue()
+        return not self.__queue and not self.__batches
+
+    def __publishQueue(self):
+        while self.__queue:
+            if not self.__connected:
+                now = _ticks()
+                if (self.__lastConnect is not None and
+                    _ticksDiff(now, self.__lastConnect) < self.__reconnectInterval):
+                    return
+                self.__lastConnect = now
+                try:
+                    self.__client.connect()
+                except Exception:
+                    return
+                self.__connected = True
+            topic, payload = self.__queue[0]
+            try:
+                self.__client.publish(topic, payload)
+            except Exception:
+                self.__connected = False
+                return
+            self.__queue.pop(0)
+            self.published += 1
+
+    def close(self):
+        """Publish what is possible and disconnect.
+        """
+        self.flush()
+        if self.__connected:
+            try:
+                self.__client.disconnect()
+            except Exception:
+                pass
+            self.__connected = False
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,270 @@
+#
+# BME280 device driver - Configuration planner
+# Copyright (c) 2020-2023 Michael Büsch <m@bues.ch>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# The tables are taken from the datasheet:
+#   Measurement time        section 9.1
+#   Standby time            table 27
+#   Supply currents         table 1
+#   Pressure noise          section 3.5 (oversampling vs. IIR filter)
+#   IIR step response       table 6 (samples to reach 75%)
+# The supply current is estimated from the typical currents of the
+# individual measurements and their typical duration. Temperature and
+# humidity noise are modelled as white noise that is reduced by the
+# oversampling and (temperature only) by the IIR filter.
+#
+
+__all__ = [
+    "Plan",
+    "measurementTime",
+    "outputDataRate",
+    "evaluate",
+    "plan",
+]
+
+from .bme280 import (
+    BME280Error,
+    MODE_FORCED, MODE_NORMAL,
+    OVSMPL_SKIP, OVSMPL_1, OVSMPL_2, OVSMPL_4, OVSMPL_8, OVSMPL_16,
+    T_SB_p5ms, T_SB_10ms, T_SB_20ms, T_SB_62p5ms,
+    T_SB_125ms, T_SB_250ms, T_SB_500ms, T_SB_1000ms,
+    FILTER_OFF, FILTER_2, FILTER_4, FILTER_8, FILTER_16,
+)
+
+# Oversampling setting -> number of samples.
+_OVSMPL_FACTOR = (0, 1, 2, 4, 8, 16, 16, 16)
+
+# Standby time setting -> seconds.
+_T_SB = (0.0005, 0.0625, 0.125, 0.25, 0.5, 1.0, 0.010, 0.020)
+
+# Filter setting -> number of samples to reach 75% of a step.
+_FILTER_STEP = (1, 2, 5, 11, 22, 22, 22, 22)
+
+# Pressure RMS noise in Pascal.
+# Rows: OVSMPL_1 - OVSMPL_16. Columns: FILTER_OFF - FILTER_16.
+_NOISE_P = (
+    (3.3, 1.9, 1.2, 0.9, 0.4),
+    (2.6, 1.5, 1.0, 0.6, 0.4),
+    (2.1, 1.2, 0.8, 0.5, 0.3),
+    (1.6, 1.0, 0.6, 0.4, 0.2),
+    (1.3, 0.8, 0.5, 0.4, 0.2),
+)
+
+# RMS noise of one single temperature (degree Celsius)
+# and humidity (0.0 - 1.0) sample.
+_NOISE_T = 0.005
+_NOISE_H = 0.0002
+
+# Typical supply currents in micro Ampere.
+_I_T    = 350.0     # Temperature measurement
+_I_P    = 714.0     # Pressure measurement
+_I_H    = 340.0     # Humidity measurement
+_I_SB   = 0.2       # Standby (normal mode)
+_I_SL   = 0.1       # Sleep (forced mode)
+
+_OVSMPL = (OVSMPL_1, OVSMPL_2, OVSMPL_4, OVSMPL_8, OVSMPL_16)
+_FILTERS = (FILTER_OFF, FILTER_2, FILTER_4, FILTER_8, FILTER_16)
+_STANDBY = (T_SB_p5ms, T_SB_10ms, T_SB_20ms, T_SB_62p5ms,
+            T_SB_125ms, T_SB_250ms, T_SB_500ms, T_SB_1000ms)
+
+def measurementTime(osrs_t, osrs_p, osrs_h, maximum=False):
+    """Measurement time in seconds for the oversampling settings.
+    'maximum': Return the maximum instead of the typical time.
+    """
+    t, p, h = (_OVSMPL_FACTOR[osrs_t],
+               _OVSMPL_FACTOR[osrs_p],
+               _OVSMPL_FACTOR[osrs_h])
+    if maximum:
+        return (1.25 +
+                2.3 * t +
+                ((2.3 * p + 0.575) if p else 0.0) +
+                ((2.3 * h + 0.575) if h else 0.0)) * 1e-3
+    return (1.0 +
+            2.0 * t +
+            ((2.0 * p + 0.5) if p else 0.0) +
+            ((2.0 * h + 0.5) if h else 0.0)) * 1e-3
+
+def outputDataRate(osrs_t, osrs_p, osrs_h, standbyTime):
+    """Typical normal mode output data rate in Hz.
+    """
+    return 1.0 / (measurementTime(osrs_t, osrs_p, osrs_h) + _T_SB[standbyTime])
+
+def _charge(osrs_t, osrs_p, osrs_h):
+    """Typical charge of one measurement, in micro Ampere seconds.
+    """
+    t, p, h = (_OVSMPL_FACTOR[osrs_t],
+               _OVSMPL_FACTOR[osrs_p],
+               _OVSMPL_FACTOR[osrs_h])
+    q = _I_T * (1.0 + 2.0 * t)
+    if p:
+        q += _I_P * (2.0 * p + 0.5)
+    if h:
+        q += _I_H * (2.0 * h + 0.5)
+    return q * 1e-3
+
+class Plan:
+    """Device settings and their expected properties.
+    """
+    __slots__ = (
+        "mode",
+        "standbyTime",
+        "filter",
+        "tempOversampling",
+        "humidityOversampling",
+        "pressureOversampling",
+        "rate",
+        "measurementTime",
+        "forcedWait",
+        "current",
+        "temperatureNoise",
+        "humidityNoise",
+        "pressureNoise",
+        "responseTime",
+        "config",
+        "ctrl_hum",
+        "ctrl_meas",
+    )
+
+    @property
+    def kwargs(self):
+        """The settings as keyword arguments for BME280.startAsync()
+        and BME280.readForcedAsync(). The mode is not included.
+        """
+        return {
+            "standbyTime"           : self.standbyTime,
+            "filter"                : self.filter,
+            "tempOversampling"      : self.tempOversampling,
+            "humidityOversampling"  : self.humidityOversampling,
+            "pressureOversampling"  : self.pressureOversampling,
+        }
+
+    def __repr__(self):
+        return ("Plan(mode=%d, standbyTime=%d, filter=%d, osrs_t=%d, osrs_h=%d, osrs_p=%d, "
+                "rate=%.3f Hz, current=%.2f uA, pressureNoise=%.2f Pa, responseTime=%.3f s)" % (
+                self.mode, self.standbyTime, self.filter,
+                self.tempOversampling, self.humidityOversampling, self.pressureOversampling,
+                self.rate, self.current, self.pressureNoise, self.responseTime))
+
+def evaluate(mode=MODE_NORMAL,
+             standbyTime=T_SB_125ms,
+             filter=FILTER_OFF,
+             tempOversampling=OVSMPL_1,
+             humidityOversampling=OVSMPL_1,
+             pressureOversampling=OVSMPL_1,
+             rate=None):
+    """Calculate the properties of a configuration.
+    The arguments are the same as for BME280.startAsync().
+    'rate': Trigger rate in Hz in MODE_FORCED. Ignored in MODE_NORMAL.
+    Returns a Plan.
+    """
+    osrs_t = tempOversampling
+    osrs_h = humidityOversampling
+    osrs_p = pressureOversampling
+    if not osrs_t:
+        raise BME280Error("BME280: The temperature measurement is required for compensation.")
+    result = Plan()
+    result.mode = mode
+    result.standbyTime = standbyTime
+    result.filter = filter
+    result.tempOversampling = osrs_t
+    result.humidityOversampling = osrs_h
+    result.pressureOversampling = osrs_p
+    result.measurementTime = measurementTime(osrs_t, osrs_p, osrs_h)
+    result.forcedWait = measurementTime(osrs_t, osrs_p, osrs_h, maximum=True)
+    if mode == MODE_NORMAL:
+        result.rate = outputDataRate(osrs_t, osrs_p, osrs_h, standbyTime)
+        idle = _I_SB
+    elif mode == MODE_FORCED:
+        if not rate:
+            raise BME280Error("BME280: MODE_FORCED requires a trigger rate.")
+        result.rate = rate
+        idle = _I_SL
+    else:
+        result.rate = 0.0
+        idle = _I_SL
+    busy = min(result.measurementTime * result.rate, 1.0)
+    result.current = _charge(osrs_t, osrs_p, osrs_h) * result.rate + idle * (1.0 - busy)
+
+    attenuation = (2 * (1 << filter) - 1) ** -0.5 if filter else 1.0
+    result.temperatureNoise = _NOISE_T * _OVSMPL_FACTOR[osrs_t] ** -0.5 * attenuation
+    result.humidityNoise = (_NOISE_H * _OVSMPL_FACTOR[osrs_h] ** -0.5) if osrs_h else 0.0
+    result.pressureNoise = _NOISE_P[min(osrs_p, OVSMPL_16) - 1][min(filter, FILTER_16)] if osrs_p else 0.0
+    result.responseTime = (_FILTER_STEP[filter] / result.rate) if result.rate else 0.0
+
+    result.config = ((standbyTime & 7) << 5) | ((filter & 7) << 2)
+    result.ctrl_hum = osrs_h & 7
+    result.ctrl_meas = ((osrs_t & 7) << 5) | ((osrs_p & 7) << 2) | (mode & 3)
+    return result
+
+def plan(rate,
+         pressureNoise=None,
+         temperatureNoise=None,
+         humidityNoise=None,
+         responseTime=None,
+         humidity=True,
+         pressure=True,
+         mode=None):
+    """Find the configuration with the lowest supply current
+    that meets the requirements. Among equal currents the shortest
+    response time and then the lowest noise wins.
+    'rate': Required sample rate in Hz.
+    'pressureNoise': Maximum pressure RMS noise in Pascal.
+    'temperatureNoise': Maximum temperature RMS noise in degree Celsius.
+    'humidityNoise': Maximum humidity RMS noise (0.0 - 1.0).
+    'responseTime': Maximum time to reach 75% of a step, in seconds.
+    'humidity', 'pressure': Measure the humidity/pressure.
+    'mode': MODE_NORMAL or MODE_FORCED. None selects the better one.
+    Returns a Plan. Raises BME280Error, if no configuration meets the requirements.
+    """
+    if rate <= 0.0:
+        raise BME280Error("BME280: Invalid sample rate.")
+    modes = (MODE_NORMAL, MODE_FORCED) if mode is None else (mode, )
+    best = None
+    bestKey = None
+    for osrs_t in _OVSMPL:
+        for osrs_p in (_OVSMPL if pressure else (OVSMPL_SKIP, )):
+            for osrs_h in (_OVSMPL if humidity else (OVSMPL_SKIP, )):
+                tMax = measurementTime(osrs_t, osrs_p, osrs_h, maximum=True)
+                for filter in _FILTERS:
+                    for m in modes:
+                        if m == MODE_FORCED:
+                            if tMax > 1.0 / rate:
+                                continue
+                            candidates = (T_SB_125ms, )
+                        else:
+                            candidates = _STANDBY
+                        for standbyTime in candidates:
+                            p = evaluate(m, standbyTime, filter,
+                                         osrs_t, osrs_h, osrs_p,
+                                         rate=rate)
+                            if p.rate < rate:
+                                continue
+                            if ((pressureNoise is not None and p.pressureNoise > pressureNoise) or
+                                (temperatureNoise is not None and p.temperatureNoise > temperatureNoise) or
+                                (humidityNoise is not None and p.humidityNoise > humidityNoise) or
+                                (responseTime is not None and p.responseTime > responseTime)):
+                                continue
+                            key = (round(p.current, 3), p.responseTime,
+                                   p.pressureNoise, p.temperatureNoise, p.humidityNoise)
+                            if bestKey is None or key < bestKey:
+                                best = p
+                                bestKey = key
+    if best is None:
+        raise BME280Error("BME280: No configuration meets the requirements.")
+    return best
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,340 @@
+#
+# BME280 device driver - Raw capture recording and replay
+# Copyright (c) 2020-2023 Michael Büsch <m@bues.ch>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# A capture file consists of:
+#   offset 0:   HEADER   (magic, format version, calibration data)
+#   offset 48:  RECORD   (timestamp, raw data burst) repeated
+# The calibration data is registers 0x88..0xA1 followed by 0xE1..0xE7,
+# as returned by BME280.getCalibration(). The raw data burst is
+# registers 0xF7..0xFE. The timestamps are in seconds and ascending.
+# All records have the same size, so a capture can be split
+# into ranges without parsing it.
+#
+
+__all__ = [
+    "Capture",
+    "Recorder",
+    "ReplayTransport",
+]
+
+import struct
+import time
+
+from .bme280 import BME280Error, BME280Transport, _asyncio
+
+MAGIC = 0x43324542 # "BE2C"
+VERSION = 1
+
+HEADER = struct.Struct("<II33s7s")
+RECORD = struct.Struct("<d8s")
+
+CAL_SIZE = 33
+BURST_SIZE = 8
+
+_REG_cal1 = 0x88
+_REG_cal1_end = 0xA2
+_REG_cal2 = 0xE1
+_REG_cal2_end = 0xE8
+_REG_status = 0xF3
+_REG_data = 0xF7
+_REG_data_end = 0xFF
+
+class Capture:
+    """Calibration data and timestamped raw data bursts of one device.
+    The records are kept in the file format, so loading and
+    saving does not convert them.
+    """
+    __slots__ = (
+        "calibration",
+        "__records",
+    )
+
+    def __init__(self, calibration=None):
+        """'calibration': Raw calibration data, as returned by BME280.getCalibration().
+        """
+        self.calibration = None if calibration is None else bytes(calibration)
+        self.__records = bytearray()
+
+    def __len__(self):
+        return len(self.__records) // RECORD.size
+
+    def __getitem__(self, index):
+        """Get the record 'index' as tuple (timestamp, burst).
+        """
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("Capture index out of range.")
+        return RECORD.unpack_from(self.__records, index * RECORD.size)
+
+    def append(self, timestamp, burst):
+        """Append a record.
+        'timestamp': Time of the read, in seconds.
+        'burst': The 8 bytes of the registers 0xF7..0xFE.
+        """
+        if len(burst) != BURST_SIZE:
+            raise BME280Error("BME280: Invalid raw data burst length.")
+        self.__records.extend(RECORD.pack(timestamp, bytes(burst)))
+
+    def save(self, path):
+        """Write the capture to the file 'path'.
+        """
+        if self.calibration is None or len(self.calibration) != CAL_SIZE:
+            raise BME280Error("BME280: The capture has no calibration data.")
+        try:
+            with open(path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION, self.calibration, b""))
+                f.write(self.__records)
+        except OSError as e:
+            raise BME280Error("BME280: Failed to write capture: %s" % str(e))
+
+    @classmethod
+    def load(cls, path):
+        """Read a capture file. Returns a new Capture.
+        """
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            raise BME280Error("BME280: Failed to read capture: %s" % str(e))
+        if len(data) < HEADER.size:
+            raise BME280Error("BME280: Capture file is truncated.")
+        magic, version, calibration, _ = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise BME280Error("BME280: Unknown capture file format.")
+        if (len(data) - HEADER.size) % RECORD.size:
+            raise BME280Error("BME280: Capture file is truncated.")
+        capture = cls(calibration)
+        capture.__records = bytearray(memoryview(data)[HEADER.size:])
+        return capture
+
+class Recorder(BME280Transport):
+    """Transport wrapper that records the calibration data
+    and each raw data burst read through it into a Capture.
+    """
+    __slots__ = (
+        "__transport",
+        "__capture",
+        "__clock",
+        "__cal1",
+        "__cal2",
+    )
+
+    def __init__(self, transport, capture=None, clock=time.time):
+        """'transport': The recorded transport, e.g. a bme280.bme280.BME280I2C instance.
+        'capture': Capture to append to. By default a new one is created.
+        'clock': Time source of the record timestamps, in seconds.
+        """
+        self.__transport = transport
+        self.__capture = Capture() if capture is None else capture
+        self.__clock = clock
+        self.__cal1 = None
+        self.__cal2 = None
+
+    @property
+    def capture(self):
+        """The recorded Capture.
+        """
+        return self.__capture
+
+    @property
+    def maxBurst(self):
+        return getattr(self.__transport, "maxBurst", None)
+
+    def __observe(self, reg, data):
+        end = reg + len(data)
+        if reg <= _REG_cal1 and end >= _REG_cal1_end:
+            self.__cal1 = bytes(data[_REG_cal1 - reg : _REG_cal1_end - reg])
+        if reg <= _REG_cal2 and end >= _REG_cal2_end:
+            self.__cal2 = bytes(data[_REG_cal2 - reg : _REG_cal2_end - reg])
+            if self.__cal1 is not None:
+                self.__capture.calibration = self.__cal1 + self.__cal2
+        if reg <= _REG_data and end >= _REG_data_end:
+            self.__capture.append(self.__clock(),
+                                  data[_REG_data - reg : _REG_data_end - reg])
+
+    def close(self):
+        self.__transport.close()
+
+    def read(self, reg, length):
+        data = self.__transport.read(reg, length)
+        self.__observe(reg, data)
+        return data
+
+    def write(self, reg, data):
+        self.__transport.write(reg, data)
+
+    def transfer(self, ops):
+        transport = self.__transport
+        if hasattr(transport, "transfer"):
+            results = transport.transfer(ops)
+        else:
+            results = []
+            for reg, arg in ops:
+                if isinstance(arg, int):
+                    results.append(transport.read(reg, arg))
+                else:
+                    transport.write(reg, arg)
+                    results.append(None)
+        # Data polled together with the status of a running
+        # conversion is not recorded.
+        for (reg, arg), data in zip(ops, results):
+            if data is not None:
+                if reg == _REG_status and data[0] & (1 << 3):
+                    break
+                self.__observe(reg, data)
+        return results
+
+class ReplayTransport(BME280Transport):
+    """Transport that replays a Capture through the BME280 API.
+    Reset, ID, status and control registers behave like an idle device.
+    Conversions complete immediately. Each read that includes the
+    first data register returns the next recorded raw data burst.
+    Synchronous calls wait for realtime replay with the blocking 'sleep'.
+    Coroutines await asyncio.sleep() instead.
+    """
+    __slots__ = (
+        "__capture",
+        "__realtime",
+        "__speed",
+        "__loop",
+        "__clock",
+        "__sleep",
+        "__regs",
+        "__index",
+        "__start",
+        "__timestamp",
+    )
+
+    # The blocking methods are used by synchronous calls.
+    blocking = True
+
+    def __init__(self, capture,
+                 realtime=False,
+                 speed=1.0,
+                 loop=False,
+                 clock=time.monotonic,
+                 sleep=time.sleep):
+        """'capture': Capture or path of a capture file.
+        'realtime': Delay each burst to the recorded time distance from the first one.
+                    Otherwise the bursts are replayed as fast as they are read.
+        'speed': Time scale factor of the realtime replay.
+        'loop': Start from the beginning at the end of the capture.
+                Otherwise reading beyond the end raises BME280Error.
+        'clock', 'sleep': Time source and blocking sleep of the realtime replay.
+                          Coroutines await asyncio.sleep() instead of 'sleep'.
+        """
+        if not isinstance(capture, Capture):
+            capture = Capture.load(capture)
+        if capture.calibration is None:
+            raise BME280Error("BME280: The capture has no calibration data.")
+        if speed <= 0.0:
+            raise BME280Error("BME280: Invalid replay speed.")
+        self.__capture = capture
+        self.__realtime = realtime
+        self.__speed = speed
+        self.__loop = loop
+        self.__clock = clock
+        self.__sleep = sleep
+        regs = self.__regs = bytearray(0x100)
+        cal = capture.calibration
+        regs[_REG_cal1 : _REG_cal1_end] = cal[ : _REG_cal1_end - _REG_cal1]
+        regs[_REG_cal2 : _REG_cal2_end] = cal[_REG_cal1_end - _REG_cal1 : ]
+        regs[0xD0] = 0x60
+        regs[_REG_data : _REG_data_end] = b"\x80\x00\x00\x80\x00\x00\x80\x00"
+        self.rewind()
+
+    def rewind(self):
+        """Restart the replay at the first record.
+        """
+        self.__index = 0
+        self.__start = None
+        self.__timestamp = None
+
+    @property
+    def position(self):
+        """The index of the next record.
+        """
+        return self.__index
+
+    @property
+    def remaining(self):
+        """The number of records until the end of the capture.
+        """
+        return len(self.__capture) - self.__index
+
+    @property
+    def timestamp(self):
+        """The recorded timestamp of the last replayed burst or None.
+        """
+        return self.__timestamp
+
+    def __next(self):
+        """Load the next burst into the data registers.
+        Returns the time to wait for realtime replay, in seconds.
+        """
+        capture = self.__capture
+        if self.__index >= len(capture):
+            if not self.__loop or not len(capture):
+                raise BME280Error("BME280: End of capture.")
+            self.__index = 0
+            self.__start = None
+        timestamp, burst = capture[self.__index]
+        self.__index += 1
+        delay = 0.0
+        if self.__realtime:
+            if self.__start is None:
+                self.__start = (self.__clock(), timestamp)
+            else:
+                begin, first = self.__start
+                delay = begin + (timestamp - first) / self.__speed - self.__clock()
+        self.__regs[_REG_data : _REG_data_end] = burst
+        self.__timestamp = timestamp
+        return delay
+
+    def read(self, reg, length):
+        if reg <= _REG_data < reg + length:
+            delay = self.__next()
+            if delay > 0.0:
+                self.__sleep(delay)
+        return bytes(self.__regs[reg : reg + length])
+
+    async def readAsync(self, reg, length):
+        if reg <= _REG_data < reg + length:
+            delay = self.__next()
+            if delay > 0.0:
+                await _asyncio().sleep(delay)
+        return bytes(self.__regs[reg : reg + length])
+
+    async def writeAsync(self, reg, data):
+        self.write(reg, data)
+
+    def write(self, reg, data):
+        regs = self.__regs
+        for i, value in enumerate(data):
+            r = reg + i
+            if r == 0xF4:
+                # The forced conversion is complete immediately.
+                if value & 3 != 3:
+                    value &= ~3
+                regs[r] = value
+            elif r in (0xF2, 0xF5):
+                regs[r] = value
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,173 @@
+#
+# BME280 device driver - Shared memory sample publication
+# Copyright (c) 2020-2023 Michael Büsch <m@bues.ch>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# The shared memory file holds one seqlock protected record:
+#   offset 0:   HEADER   (magic, layout version)
+#   offset 8:   SEQ      (sequence counter, odd while the writer updates the record)
+#   offset 16:  RECORD   (sample count, timestamp, t, h, p, ut, uh, up)
+# A reader copies the record and retries, if SEQ was odd or changed meanwhile.
+#
+
+__all__ = [
+    "SharedSampleWriter",
+    "SharedSampleReader",
+]
+
+import mmap
+import os
+import struct
+import time
+
+from .bme280 import BME280Error
+
+MAGIC = 0x42453238 # "BE28"
+LAYOUT = 1
+
+HEADER = struct.Struct("<II")
+SEQ = struct.Struct("<I")
+RECORD = struct.Struct("<QddddIII")
+
+OFFS_SEQ = 8
+OFFS_RECORD = 16
+SIZE = OFFS_RECORD + RECORD.size
+
+class SharedSampleWriter:
+    """Publish samples into a memory mapped file.
+    Install it on a BME280 instance with bme.setSampleHook(writer).
+    """
+    __slots__ = (
+        "__fd",
+        "__mm",
+        "__seq",
+        "__count",
+    )
+
+    def __init__(self, path):
+        """'path': The shared memory file, e.g. in /dev/shm.
+        """
+        try:
+            self.__fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            os.ftruncate(self.__fd, SIZE)
+            self.__mm = mmap.mmap(self.__fd, SIZE, mmap.MAP_SHARED,
+                                  mmap.PROT_READ | mmap.PROT_WRITE)
+        except OSError as e:
+            raise BME280Error("BME280: Shared memory error: %s" % str(e))
+        self.__seq = 0
+        self.__count = 0
+        SEQ.pack_into(self.__mm, OFFS_SEQ, 0)
+        RECORD.pack_into(self.__mm, OFFS_RECORD, 0, 0.0, 0.0, 0.0, 0.0, 0, 0, 0)
+        HEADER.pack_into(self.__mm, 0, MAGIC, LAYOUT)
+
+    def close(self):
+        if self.__mm:
+            self.__mm.close()
+            self.__mm = None
+            os.close(self.__fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def publish(self, raw, values, timestamp=None):
+        """Publish a sample.
+        'raw': The tuple returned by BME280.readRawAsync().
+        'values': The tuple returned by BME280.readAsync().
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        mm = self.__mm
+        self.__count += 1
+        self.__seq = (self.__seq + 1) & 0xFFFFFFFF
+        SEQ.pack_into(mm, OFFS_SEQ, self.__seq)
+        RECORD.pack_into(mm, OFFS_RECORD, self.__count, timestamp, *values, *raw)
+        self.__seq = (self.__seq + 1) & 0xFFFFFFFF
+        SEQ.pack_into(mm, OFFS_SEQ, self.__seq)
+
+    __call__ = publish
+
+class SharedSampleReader:
+    """Read the latest sample published by SharedSampleWriter.
+    Reads are plain memory accesses. They do not cause syscalls or bus traffic.
+    """
+    __slots__ = (
+        "__fd",
+        "__mm",
+        "__retries",
+    )
+
+    def __init__(self, path, retries=10000):
+        """'path': The shared memory file.
+        'retries': Number of retries on concurrent updates before giving up.
+        """
+        try:
+            self.__fd = os.open(path, os.O_RDONLY)
+            self.__mm = mmap.mmap(self.__fd, SIZE, mmap.MAP_SHARED, mmap.PROT_READ)
+        except (OSError, ValueError) as e:
+            raise BME280Error("BME280: Shared memory error: %s" % str(e))
+        self.__retries = retries
+        if HEADER.unpack_from(self.__mm, 0) != (MAGIC, LAYOUT):
+            self.close()
+            raise BME280Error("BME280: Shared memory file has an invalid format.")
+
+    def close(self):
+        if self.__mm:
+            self.__mm.close()
+            self.__mm = None
+            os.close(self.__fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def readSample(self):
+        """Returns the latest sample as tuple
+        (count, timestamp, (t, h, p), (ut, uh, up)).
+        'count' increments with each published sample.
+        """
+        mm = self.__mm
+        for _ in range(self.__retries):
+            seq, = SEQ.unpack_from(mm, OFFS_SEQ)
+            if seq & 1:
+                continue
+            record = RECORD.unpack_from(mm, OFFS_RECORD)
+            if SEQ.unpack_from(mm, OFFS_SEQ)[0] == seq:
+                break
+        else:
+            raise BME280Error("BME280: Shared memory record is not stable.")
+        count, timestamp, t, h, p, ut, uh, up = record
+        if not count:
+            raise BME280Error("BME280: No sample published, yet.")
+        return count, timestamp, (t, h, p), (ut, uh, up)
+
+    def read(self):
+        """Returns the latest (temperature, humidity, pressure),
+        like BME280.read().
+        """
+        return self.readSample()[2]
+
+    def readRaw(self):
+        """Returns the latest raw (ut, uh, up),
+        like BME280.readRaw().
+        """
+        return self.readSample()[3]
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,448 @@
+#
+# BME280 device driver - Register level device simulator
+# Copyright (c) 2020-2023 Michael Büsch <m@bues.ch>
+#
+# The reference and base for this software is the public document
+#   BME280 - Data sheet
+#   Document revision         1.6
+#   Document release date     September 2018
+#   Technical reference code  0 273 141 185
+#   Document number           BST-BME280-DS002-15
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+__all__ = [
+    "BME280Simulator",
+    "SimulatedSMBus",
+    "SimulatedSpiDev",
+    "SimulatedI2C",
+    "SimulatedSPI",
+    "sine",
+]
+
+import binascii
+import math
+import random
+import time
+
+from .bme280 import BME280, CALC_FLOAT
+
+# Calibration data of a real device.
+DEFAULT_CALIBRATION = binascii.unhexlify("04719f673200198a4dd6d00bc419fafff9ff0c3020d18813004b"
+                                         "5a01001626031e")
+
+# Oversampling setting -> number of samples.
+_OVSMPL_FACTOR = (0, 1, 2, 4, 8, 16, 16, 16)
+
+# Standby time setting -> seconds.
+_T_SB = (0.0005, 0.0625, 0.125, 0.25, 0.5, 1.0, 0.010, 0.020)
+
+# Filter setting -> filter coefficient.
+_FILTER_COEFF = (1, 2, 4, 8, 16, 16, 16, 16)
+
+# Typical RMS noise of one single sample (datasheet tables 3, 4 and 14).
+_NOISE_T = 0.005        # degree Celsius
+_NOISE_H = 0.0002       # relative humidity
+_NOISE_P = 3.3          # Pascal
+
+# NVM copy time after reset.
+_T_STARTUP = 0.002
+
+def sine(mean, amplitude, period, phase=0.0):
+    """Waveform helper: Returns a function of time (seconds)
+    that oscillates around 'mean'.
+    """
+    def wave(t):
+        return mean + amplitude * math.sin(2.0 * math.pi * t / period + phase)
+    return wave
+
+def measurementTime(osrs_t, osrs_p, osrs_h):
+    """Typical measurement time in seconds (datasheet section 9.1).
+    """
+    t = 1.0
+    if osrs_t:
+        t += 2.0 * _OVSMPL_FACTOR[osrs_t]
+    if osrs_p:
+        t += 2.0 * _OVSMPL_FACTOR[osrs_p] + 0.5
+    if osrs_h:
+        t += 2.0 * _OVSMPL_FACTOR[osrs_h] + 0.5
+    return t * 1e-3
+
+class BME280Simulator:
+    """Register level BME280 device simulation.
+    The simulated device responds to reset, ID, calibration, status,
+    ctrl and config registers and produces raw ADC values that compensate
+    to the configured temperature, humidity and pressure waveforms.
+    Conversion timing, normal mode cadence and the IIR filter are modelled.
+    """
+    __slots__ = (
+        "temperature",
+        "humidity",
+        "pressure",
+        "noise",
+        "clock",
+        "conversions",
+        "__calibration",
+        "__comp",
+        "__random",
+        "__rawCache",
+        "__regs",
+        "__osrs_h",
+        "__startupEnd",
+        "__convStart",
+        "__convEnd",
+        "__cycle",
+        "__filterState",
+    )
+
+    def __init__(self,
+                 temperature=20.0,
+                 humidity=0.5,
+                 pressure=101325.0,
+                 calibration=DEFAULT_CALIBRATION,
+                 noise=False,
+                 clock=time.monotonic,
+                 seed=None):
+        """'temperature': Degree Celsius. Constant or function of time in seconds.
+        'humidity': Relative humidity 0.0 - 1.0. Constant or function of time.
+        'pressure': Pascal. Constant or function of time.
+        'calibration': Raw calibration data, as returned by BME280.getCalibration().
+        'noise': Add datasheet typical noise to the samples.
+        'clock': Time source in seconds. Replace it for accelerated simulations.
+        'seed': Noise random seed.
+        """
+        self.temperature = temperature
+        self.humidity = humidity
+        self.pressure = pressure
+        self.noise = noise
+        self.clock = clock
+        self.__calibration = bytes(calibration)
+        self.__comp = BME280(calibration=self.__calibration, calc=CALC_FLOAT)
+        self.__random = random.Random(seed)
+        self.__rawCache = {}
+        self.conversions = 0
+        self.reset()
+
+    def reset(self):
+        """Power-on / soft reset.
+        """
+        now = self.clock()
+        regs = self.__regs = bytearray(0x100)
+        regs[0x88:0xA2] = self.__calibration[:26]
+        regs[0xE1:0xE8] = self.__calibration[26:]
+        regs[0xD0] = 0x60
+        self.__setData(0x80000, 0x8000, 0x80000)
+        self.__osrs_h = 0
+        self.__startupEnd = now + _T_STARTUP
+        self.__convStart = None
+        self.__convEnd = None
+        self.__cycle = 0
+        self.__filterState = None
+
+    @staticmethod
+    def __value(source, t):
+        return source(t) if callable(source) else source
+
+    def __setData(self, ut, uh, up):
+        regs = self.__regs
+        regs[0xF7] = (up >> 12) & 0xFF
+        regs[0xF8] = (up >> 4) & 0xFF
+        regs[0xF9] = (up << 4) & 0xF0
+        regs[0xFA] = (ut >> 12) & 0xFF
+        regs[0xFB] = (ut >> 4) & 0xFF
+        regs[0xFC] = (ut << 4) & 0xF0
+        regs[0xFD] = (uh >> 8) & 0xFF
+        regs[0xFE] = uh & 0xFF
+
+    def __bisect(self, index, target, lo, hi, rising, fixed):
+        """Find the raw value that compensates closest to 'target'.
+        """
+        key = (index, target, fixed)
+        raw = self.__rawCache.get(key)
+        if raw is not None:
+            return raw
+        comp = self.__comp.compensate
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            args = list(fixed)
+            args[index] = mid
+            value = comp(*args)[index]
+            if (value < target) == rising:
+                lo = mid
+            else:
+                hi = mid
+        if len(self.__rawCache) > 4096:
+            self.__rawCache.clear()
+        self.__rawCache[key] = lo
+        return lo
+
+    def rawFor(self, t, h, p):
+        """Get the raw ADC values (ut, uh, up) that compensate to (t, h, p).
+        """
+        ut = self.__bisect(0, t, 0, 0xFFFFF, True, (0, 0, 0))
+        uh = self.__bisect(1, h, 0, 0xFFFF, True, (ut, 0, 0))
+        up = self.__bisect(2, p, 0, 0xFFFFF, False, (ut, 0, 0))
+        return ut, uh, up
+
+    @property
+    def measurementTime(self):
+        """Measurement time of the current configuration, in seconds.
+        """
+        regs = self.__regs
+        return measurementTime(regs[0xF4] >> 5, (regs[0xF4] >> 2) & 7, self.__osrs_h)
+
+    def __convert(self, when):
+        """Run one conversion that finished at time 'when'.
+        """
+        regs = self.__regs
+        osrs_t = regs[0xF4] >> 5
+        osrs_p = (regs[0xF4] >> 2) & 7
+        osrs_h = self.__osrs_h
+        filterCoeff = _FILTER_COEFF[(regs[0xF5] >> 2) & 7]
+
+        t = self.__value(self.temperature, when)
+        h = self.__value(self.humidity, when)
+        p = self.__value(self.pressure, when)
+        if self.noise:
+            gauss = self.__random.gauss
+            if osrs_t:
+                t += gauss(0.0, _NOISE_T / math.sqrt(_OVSMPL_FACTOR[osrs_t]))
+            if osrs_h:
+                h += gauss(0.0, _NOISE_H / math.sqrt(_OVSMPL_FACTOR[osrs_h]))
+            if osrs_p:
+                p += gauss(0.0, _NOISE_P / math.sqrt(_OVSMPL_FACTOR[osrs_p]))
+        ut, uh, up = self.rawFor(round(t, 4), round(h, 6), round(p, 2))
+
+        # IIR filter on temperature and pressure.
+        if filterCoeff > 1 and self.__filterState is not None:
+            ft, fp = self.__filterState
+            ft = (ft * (filterCoeff - 1) + ut) / filterCoeff
+            fp = (fp * (filterCoeff - 1) + up) / filterCoeff
+        else:
+            ft, fp = float(ut), float(up)
+        self.__filterState = (ft, fp)
+
+        # Output resolution: 20 bit with filter, 16 + (osrs - 1) bit without.
+        def resolution(value, osrs):
+            value = int(round(value))
+            if filterCoeff == 1:
+                bits = 16 + min(osrs, 5) - 1
+                value &= ~((1 << (20 - bits)) - 1)
+            return value & 0xFFFFF
+
+        self.__setData(resolution(ft, osrs_t) if osrs_t else 0x80000,
+                       uh if osrs_h else 0x8000,
+                       resolution(fp, osrs_p) if osrs_p else 0x80000)
+        self.conversions += 1
+
+    def __advance(self):
+        """Advance the simulation to the current time.
+        """
+        now = self.clock()
+        regs = self.__regs
+        mode = regs[0xF4] & 3
+        if self.__convStart is None:
+            return now
+        tMeas = self.__convEnd - self.__convStart
+        if mode == 0b01: # forced
+            if now >= self.__convEnd:
+                self.__convert(self.__convEnd)
+                self.__convStart = self.__convEnd = None
+                regs[0xF4] &= ~3 # Back to sleep mode.
+        elif mode == 0b11: # normal
+            period = tMeas + _T_SB[regs[0xF5] >> 5]
+            done = int((now - self.__convEnd) / period) + 1 if now >= self.__convEnd else 0
+            # Skip older cycles, if the simulation was not accessed for a long time.
+            # The filter is assumed to be settled at the first simulated cycle.
+            if done - 64 > self.__cycle:
+                self.__cycle = done - 64
+                self.__filterState = None
+            while self.__cycle < done:
+                self.__convert(self.__convEnd + self.__cycle * period)
+                self.__cycle += 1
+        return now
+
+    def status(self):
+        """Get the current value of the status register.
+        """
+        now = self.__advance()
+        status = 0
+        if now < self.__startupEnd:
+            status |= 1 << 0 # im_update
+        if self.__convStart is not None:
+            mode = self.__regs[0xF4] & 3
+            if mode == 0b01:
+                status |= 1 << 3 # measuring
+            elif mode == 0b11:
+                tMeas = self.__convEnd - self.__convStart
+                period = tMeas + _T_SB[self.__regs[0xF5] >> 5]
+                if (now - self.__convStart) % period < tMeas:
+                    status |= 1 << 3 # measuring
+        return status
+
+    def readRegisters(self, reg, length):
+        """Read 'length' registers starting at 'reg'.
+        """
+        self.__advance()
+        data = bytearray(length)
+        for i in range(length):
+            r = (reg + i) & 0xFF
+            data[i] = self.status() if r == 0xF3 else self.__regs[r]
+        return bytes(data)
+
+    def writeRegister(self, reg, value):
+        """Write one register.
+        """
+        now = self.__advance()
+        value &= 0xFF
+        if reg == 0xE0:
+            if value == 0xB6:
+                self.reset()
+        elif reg == 0xF2:
+            self.__regs[0xF2] = value & 7
+        elif reg == 0xF5:
+            self.__regs[0xF5] = value & 0xFD
+        elif reg == 0xF4:
+            self.__regs[0xF4] = value
+            # ctrl_hum takes effect with the ctrl_meas write.
+            self.__osrs_h = self.__regs[0xF2] & 7
+            mode = value & 3
+            if mode == 0b00:
+                self.__convStart = self.__convEnd = None
+            else:
+                if mode == 0b10:
+                    self.__regs[0xF4] = (value & ~3) | 0b01
+                self.__convStart = now
+                self.__convEnd = now + self.measurementTime
+                self.__cycle = 0
+
+    def writeRegisters(self, reg, data):
+        """I2C multi-byte write. There is no auto-increment for writes:
+        'data' is the value for 'reg', followed by (register, value) pairs.
+        An incomplete trailing pair is ignored.
+        """
+        data = bytes(data)
+        if not data:
+            return
+        self.writeRegister(reg, data[0])
+        for i in range(1, len(data) - 1, 2):
+            self.writeRegister(data[i], data[i + 1])
+
+class SimulatedSMBus:
+    """Linux smbus.SMBus compatible bus with simulated devices.
+    """
+    __slots__ = (
+        "devices",
+        "latency",
+        "transactions",
+    )
+
+    def __init__(self, devices, latency=0.0):
+        """'devices': dict of { I2C address: BME280Simulator }.
+        'latency': Simulated time per transaction, in seconds.
+        """
+        self.devices = devices
+        self.latency = latency
+        self.transactions = 0
+
+    def _device(self, addr):
+        self.transactions += 1
+        if self.latency:
+            time.sleep(self.latency)
+        try:
+            return self.devices[addr]
+        except KeyError:
+            raise OSError(121, "Remote I/O error")
+
+    def close(self):
+        pass
+
+    def write_i2c_block_data(self, addr, reg, data):
+        self._device(addr).writeRegisters(reg, data)
+
+    def read_i2c_block_data(self, addr, reg, length):
+        if length > 32:
+            raise OverflowError("Length must be less than or equal to 32")
+        return list(self._device(addr).readRegisters(reg, length))
+
+class SimulatedI2C(SimulatedSMBus):
+    """Micropython machine.I2C compatible bus with simulated devices.
+    """
+    __slots__ = ()
+
+    def deinit(self):
+        pass
+
+    def scan(self):
+        return sorted(self.devices.keys())
+
+    def writeto_mem(self, addr, reg, data):
+        self.write_i2c_block_data(addr, reg, data)
+
+    def readfrom_mem(self, addr, reg, length):
+        return self._device(addr).readRegisters(reg, length)
+
+class SimulatedSpiDev:
+    """Linux spidev.SpiDev compatible bus with one simulated device.
+    """
+    __slots__ = (
+        "device",
+        "latency",
+        "transactions",
+    )
+
+    def __init__(self, device, latency=0.0):
+        """'device': BME280Simulator.
+        'latency': Simulated time per transaction, in seconds.
+        """
+        self.device = device
+        self.latency = latency
+        self.transactions = 0
+
+    def close(self):
+        pass
+
+    def xfer2(self, data):
+        self.transactions += 1
+        if self.latency:
+            time.sleep(self.latency)
+        data = bytes(data)
+        if not data:
+            return []
+        if data[0] & 0x80:
+            # Read: control byte followed by auto-incremented register data.
+            return [ 0 ] + list(self.device.readRegisters(data[0], len(data) - 1))
+        # Write: pairs of control byte and data byte.
+        for i in range(0, len(data) - 1, 2):
+            self.device.writeRegister(data[i] | 0x80, data[i + 1])
+        return [ 0 ] * len(data)
+
+class SimulatedSPI(SimulatedSpiDev):
+    """Micropython machine.SPI compatible bus with one simulated device.
+    The chip select pin is not simulated.
+    """
+    __slots__ = ()
+
+    def deinit(self):
+        pass
+
+    def write(self, data):
+        self.xfer2(data)
+
+    def read(self, nbytes, write=0):
+        return bytes(self.xfer2(bytes((write, )) * nbytes))
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,256 @@
+#
+# BME280 device driver - SQLite time series storage
+# Copyright (c) 2020-2023 Michael Büsch <m@bues.ch>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+__all__ = [
+    "SQLiteSink",
+    "ROLLUP_MINUTE",
+    "ROLLUP_HOUR",
+]
+
+import sqlite3
+import time
+
+from .bme280 import BME280Error
+
+# Rollup resolutions, in milliseconds.
+ROLLUP_MINUTE   = 60 * 1000
+ROLLUP_HOUR     = 60 * 60 * 1000
+
+_ROLLUPS = (
+    ("rollup_minute", ROLLUP_MINUTE),
+    ("rollup_hour", ROLLUP_HOUR),
+)
+
+# Fixed-point scaling of the stored values.
+_SCALE_T        = 100       # 1/100 degree Celsius
+_SCALE_H        = 10000     # 1/100 % relative humidity
+_SCALE_P        = 10        # 1/10 Pascal
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sensors (
+        id      INTEGER PRIMARY KEY,
+        name    TEXT NOT NULL UNIQUE
+    );
+    CREATE TABLE IF NOT EXISTS samples (
+        ts      INTEGER NOT NULL,
+        sensor  INTEGER NOT NULL,
+        t       INTEGER NOT NULL,
+        h       INTEGER NOT NULL,
+        p       INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS samples_sensor_ts ON samples (sensor, ts);
+"""
+
+_SCHEMA_ROLLUP = """
+    CREATE TABLE IF NOT EXISTS %s (
+        sensor  INTEGER NOT NULL,
+        bucket  INTEGER NOT NULL,
+        n       INTEGER NOT NULL,
+        t_sum   INTEGER NOT NULL, t_min INTEGER NOT NULL, t_max INTEGER NOT NULL,
+        h_sum   INTEGER NOT NULL, h_min INTEGER NOT NULL, h_max INTEGER NOT NULL,
+        p_sum   INTEGER NOT NULL, p_min INTEGER NOT NULL, p_max INTEGER NOT NULL,
+        PRIMARY KEY (sensor, bucket)
+    ) WITHOUT ROWID;
+"""
+
+_UPSERT_ROLLUP = """
+    INSERT INTO %s VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (sensor, bucket) DO UPDATE SET
+        n = n + excluded.n,
+        t_sum = t_sum + excluded.t_sum,
+        t_min = min(t_min, excluded.t_min),
+        t_max = max(t_max, excluded.t_max),
+        h_sum = h_sum + excluded.h_sum,
+        h_min = min(h_min, excluded.h_min),
+        h_max = max(h_max, excluded.h_max),
+        p_sum = p_sum + excluded.p_sum,
+        p_min = min(p_min, excluded.p_min),
+        p_max = max(p_max, excluded.p_max)
+"""
+
+class SQLiteSink:
+    """Batched SQLite time series storage for BME280 samples.
+    Samples are stored as fixed-point integers with a millisecond timestamp.
+    The minute and hour rollup tables are updated incrementally
+    with each committed batch.
+    """
+    __slots__ = (
+        "__db",
+        "__batchSize",
+        "__batchAge",
+        "__batch",
+        "__batchStart",
+        "__sensorIds",
+    )
+
+    def __init__(self, path, batchSize=1000, batchAge=5.0):
+        """Open (or create) the database.
+        'path': Database file name. May be ":memory:".
+        'batchSize': Commit a batch after this many samples.
+        'batchAge': Commit a batch after its oldest sample is this many seconds old.
+        """
+        self.__batchSize = batchSize
+        self.__batchAge = batchAge
+        self.__batch = []
+        self.__batchStart = None
+        self.__sensorIds = {}
+        try:
+            self.__db = sqlite3.connect(path)
+            self.__db.execute("PRAGMA journal_mode=WAL")
+            self.__db.execute("PRAGMA synchronous=NORMAL")
+            with self.__db:
+                self.__db.executescript(_SCHEMA)
+                for table, _ in _ROLLUPS:
+                    self.__db.executescript(_SCHEMA_ROLLUP % table)
+        except sqlite3.Error as e:
+            raise BME280Error("BME280: SQLite error: %s" % str(e))
+
+    def close(self):
+        """Commit pending samples and close the database.
+        """
+        if self.__db:
+            self.flush()
+            self.__db.close()
+            self.__db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def sensorId(self, name):
+        """Get the integer id of the sensor 'name'.
+        The sensor is created, if it does not exist.
+        """
+        sensorId = self.__sensorIds.get(name)
+        if sensorId is None:
+            try:
+                with self.__db:
+                    self.__db.execute("INSERT OR IGNORE INTO sensors (name) VALUES (?)", (name, ))
+                    sensorId = self.__db.execute("SELECT id FROM sensors WHERE name = ?",
+                                                 (name, )).fetchone()[0]
+            except sqlite3.Error as e:
+                raise BME280Error("BME280: SQLite error: %s" % str(e))
+            self.__sensorIds[name] = sensorId
+        return sensorId
+
+    def add(self, name, t, h, p, timestamp=None):
+        """Add one sample as returned by BME280.read() for the sensor 'name'.
+        'timestamp': Unix time in seconds. Defaults to now.
+        """
+        now = time.time()
+        if timestamp is None:
+            timestamp = now
+        self.__batch.append((int(timestamp * 1000.0),
+                             self.sensorId(name),
+                             round(t * _SCALE_T),
+                             round(h * _SCALE_H),
+                             round(p * _SCALE_P)))
+        if self.__batchStart is None:
+            self.__batchStart = now
+        if (len(self.__batch) >= self.__batchSize or
+            now - self.__batchStart >= self.__batchAge):
+            self.flush()
+
+    async def sampleAsync(self, name, bme):
+        """Read a sample from the BME280 instance 'bme' and add it.
+        Returns the sample.
+        This is a coroutine.
+        """
+        t, h, p = await bme.readAsync()
+        self.add(name, t, h, p)
+        return t, h, p
+
+    def flush(self):
+        """Commit all pending samples and update the rollups.
+        If the commit fails, the samples stay pending for the next flush.
+        """
+        batch = self.__batch
+        if not batch:
+            return
+        try:
+            with self.__db:
+                self.__db.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?)", batch)
+                for table, resolution in _ROLLUPS:
+                    self.__db.executemany(_UPSERT_ROLLUP % table,
+                                          self.__aggregate(batch, resolution))
+        except sqlite3.Error as e:
+            raise BME280Error("BME280: SQLite error: %s" % str(e))
+        self.__batch = []
+        self.__batchStart = None
+
+    @staticmethod
+    def __aggregate(batch, resolution):
+        """Aggregate a batch into rollup rows.
+        """
+        buckets = {}
+        for ts, sensor, t, h, p in batch:
+            key = (sensor, ts - (ts % resolution))
+            row = buckets.get(key)
+            if row is None:
+                buckets[key] = [ 1, t, t, t, h, h, h, p, p, p ]
+            else:
+                row[0] += 1
+                row[1] += t
+                row[2] = min(row[2], t)
+                row[3] = max(row[3], t)
+                row[4] += h
+                row[5] = min(row[5], h)
+                row[6] = max(row[6], h)
+                row[7] += p
+                row[8] = min(row[8], p)
+                row[9] = max(row[9], p)
+        return [ key + tuple(row) for key, row in buckets.items() ]
+
+    def query(self, name, start, end, resolution=None):
+        """Query samples of sensor 'name' between the Unix times 'start' and 'end'.
+        'resolution': None for raw samples, or ROLLUP_MINUTE or ROLLUP_HOUR.
+        Raw samples are returned as list of (timestamp, t, h, p).
+        Rollups are returned as list of
+        (timestamp, count, (t_avg, t_min, t_max), (h_avg, h_min, h_max), (p_avg, p_min, p_max)).
+        Pending samples are committed first.
+        """
+        self.flush()
+        sensorId = self.sensorId(name)
+        start = int(start * 1000.0)
+        end = int(end * 1000.0)
+        try:
+            if resolution is None:
+                rows = self.__db.execute(
+                    "SELECT ts, t, h, p FROM samples "
+                    "WHERE sensor = ? AND ts >= ? AND ts < ? ORDER BY ts",
+                    (sensorId, start, end)).fetchall()
+                return [ (ts / 1000.0, t / _SCALE_T, h / _SCALE_H, p / _SCALE_P)
+                         for ts, t, h, p in rows ]
+            table = dict((r, t) for t, r in _ROLLUPS)[resolution]
+            rows = self.__db.execute(
+                "SELECT bucket, n, t_sum, t_min, t_max, h_sum, h_min, h_max, "
+                "p_sum, p_min, p_max FROM %s "
+                "WHERE sensor = ? AND bucket >= ? AND bucket < ? ORDER BY bucket" % table,
+                (sensorId, start - (start % resolution), end)).fetchall()
+        except sqlite3.Error as e:
+            raise BME280Error("BME280: SQLite error: %s" % str(e))
+        return [ (bucket / 1000.0, n,
+                  (t_sum / n / _SCALE_T, t_min / _SCALE_T, t_max / _SCALE_T),
+                  (h_sum / n / _SCALE_H, h_min / _SCALE_H, h_max / _SCALE_H),
+                  (p_sum / n / _SCALE_P, p_min / _SCALE_P, p_max / _SCALE_P))
+                 for bucket, n, t_sum, t_min, t_max, h_sum, h_min, h_max, p_sum, p_min, p_max in rows ]
+
+# vim: ts=4 sw=4 expandtab
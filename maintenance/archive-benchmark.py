@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+#
+# BME280 parallel archive decoder benchmark.
+#
+# Generates a synthetic dataset of capture files (one per sensor, one
+# sample per second) and decodes it with bme280.archive.decode() for each
+# requested number of worker processes. Reports the records per second,
+# the speedup and the parallel efficiency relative to one worker.
+# The decoded values of all runs are checked for equality.
+# The end-to-end command line path (python -m bme280.archive), including
+# the CSV formatting, is timed as well. Its output goes to /dev/null.
+# An existing dataset with the same parameters is reused.
+#
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import bme280
+import bme280.archive
+from bme280.archive import decode
+from bme280.replay import HEADER, RECORD, MAGIC, VERSION
+from bme280.simulator import DEFAULT_CALIBRATION
+
+CHUNK = 1 << 16
+
+def parseSize(text):
+    text = text.strip().upper()
+    factor = 1
+    for suffix, f in (("K", 1 << 10), ("M", 1 << 20), ("G", 1 << 30), ("T", 1 << 40)):
+        if text.endswith(suffix):
+            factor = f
+            text = text[:-1]
+            break
+    return int(float(text) * factor)
+
+def burst(ut, uh, up):
+    return bytes(((up >> 12) & 0xFF, (up >> 4) & 0xFF, (up << 4) & 0xF0,
+                  (ut >> 12) & 0xFF, (ut >> 4) & 0xFF, (ut << 4) & 0xF0,
+                  (uh >> 8) & 0xFF, uh & 0xFF))
+
+def template(sensor):
+    """One chunk of records with raw values that drift like a real sensor.
+    The timestamps are set per chunk.
+    """
+    data = bytearray()
+    for i in range(CHUNK):
+        x = 2.0 * math.pi * i / CHUNK
+        ut = 0x85EFC + int(4000 * math.sin(x + sensor)) + (i * 7919) % 17
+        uh = 0x7BD2 + int(800 * math.cos(x + sensor)) + (i * 104729) % 5
+        up = 0x5E962 + int(2000 * math.sin(2.0 * x + sensor)) + (i * 1299709) % 23
+        data += RECORD.pack(0.0, burst(ut, uh, up))
+    return array("d", bytes(data))
+
+def generate(path, sensor, records, t0):
+    """Write a capture file with 'records' records.
+    """
+    chunk = template(sensor)
+    with open(path + ".tmp", "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, DEFAULT_CALIBRATION, b""))
+        first = 0
+        while first < records:
+            count = min(CHUNK, records - first)
+            chunk[0 : 2 * count : 2] = array("d", (t0 + first + i for i in range(count)))
+            f.write(memoryview(chunk)[: 2 * count].cast("B"))
+            first += count
+    os.replace(path + ".tmp", path)
+
+def dataset(directory, size, sensors):
+    """Create the dataset, unless it exists. Returns the list of files and the number of records.
+    """
+    records = max(size // sensors // RECORD.size, 1)
+    fileSize = HEADER.size + records * RECORD.size
+    paths = []
+    for sensor in range(sensors):
+        path = os.path.join(directory, "sensor-%03d.bme280cap" % sensor)
+        if not os.path.exists(path) or os.path.getsize(path) != fileSize:
+            print("Generating %s (%d MiB) ..." % (path, fileSize >> 20), file=sys.stderr)
+            generate(path, sensor, records, 1.6e9)
+        paths.append(path)
+    return paths, records * sensors
+
+def run(paths, workers, calc, shardSize):
+    """Decode all files. Returns (seconds, records, checksum).
+    """
+    begin = time.perf_counter()
+    records = 0
+    checksum = 0.0
+    for shard, values in decode(paths, workers=workers, calc=calc, shardSize=shardSize):
+        records += len(values) // 4
+        checksum += sum(values[1::4]) + sum(values[3::4]) * 1e-3
+    return time.perf_counter() - begin, records, checksum
+
+def runCli(paths, workers, calc, shardSize):
+    """Run the command line tool. Returns the seconds.
+    """
+    begin = time.perf_counter()
+    ret = bme280.archive.main([ "-j", str(workers), "-c", calc,
+                                "-S", str(shardSize), "-o", os.devnull ] + paths)
+    if ret:
+        raise bme280.BME280Error("BME280: Command line tool failed.")
+    return time.perf_counter() - begin
+
+def compare(results, oldResults):
+    """Print the relative change against a previous result file.
+    """
+    old = { r["workers"] : r for r in oldResults["results"] }
+    print("\nComparison against previous results (records/s):")
+    for r in results["results"]:
+        o = old.get(r["workers"])
+        if o is None:
+            continue
+        for key, name in (("records_per_s", "decode"), ("cli_records_per_s", "cli")):
+            if key not in o or key not in r:
+                continue
+            print("  %3d workers %-6s  %12.0f -> %12.0f  (%+.1f%%)" % (
+                  r["workers"], name, o[key], r[key],
+                  100.0 * (r[key] / o[key] - 1.0)))
+
+def main():
+    cpus = os.cpu_count() or 1
+    defaultWorkers = sorted(set([ 1 << i for i in range(cpus.bit_length()) ] + [ cpus ]))
+    p = argparse.ArgumentParser(description="BME280 parallel archive decoder benchmark.")
+    p.add_argument("-d", "--dir", default=os.path.join(tempfile.gettempdir(), "bme280-archive-benchmark"),
+                   help="Dataset directory. Default: bme280-archive-benchmark in the temp directory")
+    p.add_argument("-s", "--size", default="2G",
+                   help="Total dataset size with K/M/G suffix. Default: 2G")
+    p.add_argument("-n", "--sensors", type=int, default=16,
+                   help="Number of sensors (capture files). Default: 16")
+    p.add_argument("-j", "--workers", type=int, action="append",
+                   help="Number of worker processes. May be given multiple times. "
+                        "Default: %s" % ",".join(str(w) for w in defaultWorkers))
+    p.add_argument("-c", "--calc", choices=("float", "int32", "int64"), default="float",
+                   help="Compensation calculation mode. Default: float")
+    p.add_argument("-S", "--shard-size", type=int, default=1 << 16,
+                   help="Number of records per shard. Default: 65536")
+    p.add_argument("-o", "--output", default=None,
+                   help="Write the results as JSON to this file.")
+    p.add_argument("-C", "--compare", default=None,
+                   help="Compare against a previous JSON result file.")
+    p.add_argument("--no-cli", action="store_true",
+                   help="Do not time the command line tool.")
+    args = p.parse_args()
+    if args.workers and min(args.workers) < 1:
+        p.error("The number of workers must be at least 1.")
+
+    calc = { "float" : bme280.CALC_FLOAT,
+             "int32" : bme280.CALC_INT32,
+             "int64" : bme280.CALC_INT64 }[args.calc]
+    os.makedirs(args.dir, exist_ok=True)
+    paths, total = dataset(args.dir, parseSize(args.size), args.sensors)
+
+    results = {
+        "time"          : time.time(),
+        "python"        : sys.version,
+        "platform"      : platform.platform(),
+        "cpus"          : cpus,
+        "records"       : total,
+        "bytes"         : sum(os.path.getsize(p) for p in paths),
+        "calc"          : args.calc,
+        "results"       : [],
+    }
+    print("%d records in %d files, %d MiB, %d CPUs" % (
+          total, len(paths), results["bytes"] >> 20, cpus))
+    print("%8s %10s %14s %9s %11s %14s %9s" % (
+          "workers", "seconds", "records/s", "speedup", "efficiency",
+          "cli records/s", "speedup"))
+    base = None
+    cliBase = None
+    reference = None
+    failed = False
+    for workers in (args.workers or defaultWorkers):
+        seconds, records, checksum = run(paths, workers, calc, args.shard_size)
+        rate = records / seconds
+        if base is None:
+            base = rate
+            reference = checksum
+        speedup = rate / base
+        result = {
+            "workers"       : workers,
+            "seconds"       : seconds,
+            "records_per_s" : rate,
+            "speedup"       : speedup,
+        }
+        line = "%8d %10.2f %14.0f %8.2fx %10.0f%%" % (
+               workers, seconds, rate, speedup, 100.0 * speedup / workers)
+        if not args.no_cli:
+            cliRate = total / runCli(paths, workers, args.calc, args.shard_size)
+            if cliBase is None:
+                cliBase = cliRate
+            result["cli_records_per_s"] = cliRate
+            result["cli_speedup"] = cliRate / cliBase
+            line += " %14.0f %8.2fx" % (cliRate, cliRate / cliBase)
+        print(line)
+        if records != total or checksum != reference:
+            print("  FAIL: The decoded values differ.")
+            failed = True
+        results["results"].append(result)
+
+    if args.output:
+        with open(args.output, "w") as fd:
+            json.dump(results, fd, indent=2)
+    if args.compare:
+        with open(args.compare, "r") as fd:
+            compare(results, json.load(fd))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+#
+# BME280 driver throughput benchmark with simulated bus latency.
+#
+# Measures samples per second and per sample latency of read(), readAsync()
+# and readForced() for every bus backend code path and every CALC_ mode.
+# The bus is simulated by mock smbus/spidev/machine modules with a
+# configurable latency per bus transaction.
+#
+
+import argparse
+import asyncio
+import binascii
+import json
+import os
+import platform
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import bme280
+import bme280.bme280 as bme280_driver
+
+CAL1 = binascii.unhexlify("04719f673200198a4dd6d00bc419fafff9ff0c3020d18813004b")
+CAL2 = binascii.unhexlify("5a01001626031e")
+DATA = binascii.unhexlify("5e962085efc07bd2")
+
+class BusLatency:
+    """Simulated per transaction bus latency.
+    """
+    latency = 0.0
+
+    @classmethod
+    def wait(cls):
+        latency = cls.latency
+        if latency <= 0.0:
+            return
+        if latency >= 0.002:
+            time.sleep(latency)
+            return
+        end = time.perf_counter() + latency
+        while time.perf_counter() < end:
+            pass
+
+def registerData(reg, length):
+    if reg == 0xD0:
+        return b"\x60" + bytes(length - 1)
+    if reg == 0x88:
+        return CAL1[:length]
+    if reg == 0xE1:
+        return CAL2[:length]
+    if reg == 0xF7:
+        return DATA[:length]
+    return bytes(length)
+
+def registerRead(reg, length):
+    BusLatency.wait()
+    return registerData(reg, length)
+
+class TransportMock(bme280.BME280Transport):
+    """Custom transport with one bus latency per transaction.
+    """
+    def read(self, reg, length):
+        return registerRead(reg, length)
+
+    def write(self, reg, data):
+        BusLatency.wait()
+
+class BatchTransportMock(TransportMock):
+    """Custom transport with one bus latency per batch.
+    """
+    def transfer(self, ops):
+        BusLatency.wait()
+        return [ (registerData(reg, arg) if isinstance(arg, int) else None)
+                 for reg, arg in ops ]
+
+class SMBusMock:
+    def __init__(self, bus):
+        pass
+
+    def close(self):
+        pass
+
+    def write_i2c_block_data(self, addr, reg, data):
+        BusLatency.wait()
+
+    def read_i2c_block_data(self, addr, reg, length):
+        return list(registerRead(reg, length))
+
+class SpiDevMock:
+    def open(self, bus, cs):
+        pass
+
+    def close(self):
+        pass
+
+    def xfer2(self, data):
+        reg = data[0]
+        if reg & 0x80:
+            return b"\0" + registerRead(reg, len(data) - 1)
+        BusLatency.wait()
+        return bytes(len(data))
+
+class PinMock:
+    OUT = IN = OPEN_DRAIN = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __call__(self, value=None):
+        pass
+
+class I2CMock:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def deinit(self):
+        pass
+
+    def writeto_mem(self, addr, reg, data):
+        BusLatency.wait()
+
+    def readfrom_mem(self, addr, reg, length):
+        return registerRead(reg, length)
+
+class SPIMock:
+    MSB = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def deinit(self):
+        pass
+
+    def write(self, data):
+        BusLatency.wait()
+
+    def read(self, nbytes, write=0):
+        return b"\0" + registerRead(write, nbytes - 1)
+
+def installMocks():
+    sys.modules["smbus"] = types.SimpleNamespace(SMBus=SMBusMock)
+    sys.modules["spidev"] = types.SimpleNamespace(SpiDev=SpiDevMock)
+    sys.modules["machine"] = types.SimpleNamespace(I2C=I2CMock, SoftI2C=I2CMock,
+                                                   SPI=SPIMock, SoftSPI=SPIMock,
+                                                   Pin=PinMock)
+
+BACKENDS = {
+    "linux-i2c"         : (False, { "i2cBus" : 1 }),
+    "linux-spi"         : (False, { "spiBus" : 0, "spiCS" : 0 }),
+    "micropython-i2c"   : (True, { "i2cBus" : 0 }),
+    "micropython-spi"   : (True, { "spiBus" : 0, "spiCS" : 5 }),
+    "transport"         : (False, { "transport" : TransportMock() }),
+    "batch-transport"   : (False, { "transport" : BatchTransportMock() }),
+}
+
+CALCS = {
+    "float"     : bme280.CALC_FLOAT,
+    "int32"     : bme280.CALC_INT32,
+    "int64"     : bme280.CALC_INT64,
+}
+
+METHODS = ("read", "readAsync", "readForced")
+
+def runOne(backend, calc, method, samples):
+    """Benchmark one combination. Returns the per sample latencies, in seconds.
+    """
+    micropython, busArgs = BACKENDS[backend]
+    bme280_driver.isMicropython = micropython
+    latencies = []
+    with bme280.BME280(calc=CALCS[calc], **busArgs) as bme:
+        bme.start(mode=bme280.MODE_NORMAL)
+        if method == "read":
+            for _ in range(samples):
+                begin = time.perf_counter()
+                bme.read()
+                latencies.append(time.perf_counter() - begin)
+        elif method == "readAsync":
+            async def run():
+                for _ in range(samples):
+                    begin = time.perf_counter()
+                    await bme.readAsync()
+                    latencies.append(time.perf_counter() - begin)
+            asyncio.run(run())
+        else:
+            for _ in range(samples):
+                begin = time.perf_counter()
+                bme.readForced(pollSleep=0.0)
+                latencies.append(time.perf_counter() - begin)
+    return latencies
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    n = len(latencies)
+    return {
+        "samples"           : n,
+        "samples_per_sec"   : (n / total) if total else 0.0,
+        "mean_us"           : total / n * 1e6,
+        "p50_us"            : latencies[n // 2] * 1e6,
+        "p99_us"            : latencies[min(n - 1, (n * 99) // 100)] * 1e6,
+        "max_us"            : latencies[-1] * 1e6,
+    }
+
+def compare(results, oldResults):
+    """Print the relative change against a previous result file.
+    """
+    old = { (r["backend"], r["calc"], r["method"]) : r
+            for r in oldResults["results"] }
+    print("\nComparison against previous results (samples/s):")
+    for r in results["results"]:
+        key = (r["backend"], r["calc"], r["method"])
+        if key not in old:
+            continue
+        before = old[key]["samples_per_sec"]
+        after = r["samples_per_sec"]
+        change = ((after / before) - 1.0) * 100.0 if before else 0.0
+        print("  %-16s %-6s %-11s %10.1f -> %10.1f  (%+.1f %%)" % (
+              key + (before, after, change)))
+
+def main():
+    p = argparse.ArgumentParser(description="BME280 driver throughput benchmark.")
+    p.add_argument("-n", "--samples", type=int, default=1000,
+                   help="Number of samples per combination. Default: 1000")
+    p.add_argument("-l", "--latency", type=float, default=0.0,
+                   help="Simulated latency per bus transaction, in microseconds. Default: 0")
+    p.add_argument("-b", "--backend", choices=BACKENDS.keys(), action="append",
+                   help="Backend to benchmark. May be given multiple times. Default: all")
+    p.add_argument("-c", "--calc", choices=CALCS.keys(), action="append",
+                   help="Calculation mode to benchmark. May be given multiple times. Default: all")
+    p.add_argument("-m", "--method", choices=METHODS, action="append",
+                   help="Read method to benchmark. May be given multiple times. Default: all")
+    p.add_argument("-o", "--output", default=None,
+                   help="Write the results as JSON to this file.")
+    p.add_argument("-C", "--compare", default=None,
+                   help="Compare against a previous JSON result file.")
+    args = p.parse_args()
+
+    installMocks()
+    BusLatency.latency = args.latency * 1e-6
+
+    results = {
+        "time"          : time.time(),
+        "python"        : sys.version,
+        "implementation": sys.implementation.name,
+        "platform"      : platform.platform(),
+        "bus_latency_us": args.latency,
+        "results"       : [],
+    }
+    print("%-16s %-6s %-11s %12s %10s %10s %10s" % (
+          "backend", "calc", "method", "samples/s", "mean us", "p50 us", "p99 us"))
+    for backend in (args.backend or BACKENDS.keys()):
+        for calc in (args.calc or CALCS.keys()):
+            for method in (args.method or METHODS):
+                summary = summarize(runOne(backend, calc, method, args.samples))
+                print("%-16s %-6s %-11s %12.1f %10.1f %10.1f %10.1f" % (
+                      backend, calc, method, summary["samples_per_sec"],
+                      summary["mean_us"], summary["p50_us"], summary["p99_us"]))
+                summary.update({ "backend" : backend, "calc" : calc, "method" : method })
+                results["results"].append(summary)
+
+    if args.output:
+        with open(args.output, "w") as fd:
+            json.dump(results, fd, indent=2)
+    if args.compare:
+        with open(args.compare, "r") as fd:
+            compare(results, json.load(fd))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+#
+# BME280 compensation accuracy and speed sweep.
+#
+# Generates random but realistic calibration sets, sweeps the raw
+# ut/uh/up input range through the compensation of every CALC_ mode
+# and compares the results against a high precision reference
+# implementation of the datasheet floating point formulas.
+# Reports the time per sample, maximum and RMS deviation and
+# clamping or overflow discrepancies of each mode.
+#
+# Runs on CPython and on the Micropython unix port:
+#   python3 compensation-sweep.py [CALSETS] [STEPS] [SEED]
+#   micropython compensation-sweep.py [CALSETS] [STEPS] [SEED]
+#
+
+import sys
+import math
+import random
+import time
+
+try:
+    import argparse
+except ImportError:
+    argparse = None
+
+try:
+    _basedir = __file__.rsplit("/", 1)[0] if "/" in __file__ else "."
+except NameError:
+    _basedir = "."
+sys.path.insert(0, _basedir + "/..")
+import bme280
+
+try:
+    from fractions import Fraction as Number
+except ImportError:
+    Number = float # Micropython: use the best available float.
+
+if hasattr(time, "ticks_us"):
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+else:
+    def ticks_us():
+        return time.perf_counter_ns() // 1000
+    def ticks_diff(a, b):
+        return a - b
+
+CALCS = (
+    ("float", bme280.CALC_FLOAT),
+    ("int32", bme280.CALC_INT32),
+    ("int64", bme280.CALC_INT64),
+)
+
+# Clamp ranges of the driver.
+T_MIN, T_MAX = -40.0, 85.0
+H_MIN, H_MAX = 0.0, 1.0
+P_MIN, P_MAX = 30000.0, 110000.0
+
+# Deviations above these limits are reported as discrepancies.
+T_TOL = 0.05        # degree Celsius
+H_TOL = 0.005       # relative humidity, 0.5 %
+P_TOL = 5.0         # Pascal
+
+# (name, nominal value, spread, bits, signed) of the calibration values.
+# The nominal values are those of a real device.
+CAL_PARAMS = (
+    ("T1", 28932, 1500, 16, False),
+    ("T2", 26527, 800, 16, True),
+    ("T3", 50, 50, 16, True),
+    ("P1", 35353, 2000, 16, False),
+    ("P2", -10675, 400, 16, True),
+    ("P3", 3024, 100, 16, True),
+    ("P4", 6596, 2000, 16, True),
+    ("P5", -6, 150, 16, True),
+    ("P6", -7, 3, 16, True),
+    ("P7", 12300, 3000, 16, True),
+    ("P8", -12000, 2500, 16, True),
+    ("P9", 5000, 1000, 16, True),
+    ("H1", 75, 10, 8, False),
+    ("H2", 346, 30, 16, True),
+    ("H3", 0, 2, 8, False),
+    ("H4", 358, 40, 12, True),
+    ("H5", 50, 20, 12, True),
+    ("H6", 30, 5, 8, True),
+)
+
+def randint(lo, hi):
+    return lo + (random.getrandbits(16) % (hi - lo + 1))
+
+def makeCalibration():
+    """Generate a random calibration set.
+    Returns (dict of values, raw calibration bytes for the driver).
+    """
+    cal = {}
+    for name, nominal, spread, bits, signed in CAL_PARAMS:
+        value = nominal + randint(-spread, spread)
+        if signed:
+            value = max(min(value, (1 << (bits - 1)) - 1), -(1 << (bits - 1)))
+        else:
+            value = max(min(value, (1 << bits) - 1), 0)
+        cal[name] = value
+
+    def u16(v):
+        v &= 0xFFFF
+        return bytes((v & 0xFF, v >> 8))
+
+    raw = b""
+    for name in ("T1", "T2", "T3", "P1", "P2", "P3", "P4", "P5", "P6", "P7", "P8", "P9"):
+        raw += u16(cal[name])
+    raw += b"\x00" + bytes((cal["H1"], ))
+    h4 = cal["H4"] & 0xFFF
+    h5 = cal["H5"] & 0xFFF
+    raw += u16(cal["H2"])
+    raw += bytes((cal["H3"],
+                  h4 >> 4,
+                  (h4 & 0xF) | ((h5 & 0xF) << 4),
+                  h5 >> 4,
+                  cal["H6"] & 0xFF))
+    return cal, raw
+
+def reference(cal, ut, uh, up):
+    """High precision reference of the datasheet floating point formulas.
+    Returns the unclamped (t, h, p).
+    """
+    N = Number
+    T1, T2, T3 = N(cal["T1"]), N(cal["T2"]), N(cal["T3"])
+    a = (N(ut) / 16384 - T1 / 1024) * T2
+    b = N(ut) / 131072 - T1 / 8192
+    t_fine = a + b * b * T3
+    t = t_fine / 5120
+
+    P1, P2, P3 = N(cal["P1"]), N(cal["P2"]), N(cal["P3"])
+    P4, P5, P6 = N(cal["P4"]), N(cal["P5"]), N(cal["P6"])
+    P7, P8, P9 = N(cal["P7"]), N(cal["P8"]), N(cal["P9"])
+    a = t_fine / 2 - 64000
+    b = a * a * P6 / 32768
+    b += a * P5 * 2
+    b = b / 4 + P4 * 65536
+    a = (P3 * a * a / 524288 + P2 * a) / 524288
+    a = (1 + a / 32768) * P1
+    if a:
+        p = (1048576 - N(up) - b / 4096) * 6250 / a
+        p += (P9 * p * p / 2147483648 + p * P8 / 32768 + P7) / 16
+    else:
+        p = N(0)
+
+    H1, H2, H3 = N(cal["H1"]), N(cal["H2"]), N(cal["H3"])
+    H4, H5, H6 = N(cal["H4"]), N(cal["H5"]), N(cal["H6"])
+    # The H3/H6 terms are applied to the humidity difference,
+    # as in the datasheet's 32 bit integer formula.
+    h = N(uh) - (H4 * 64 + H5 / 16384 * (t_fine - 76800))
+    h = h * (H2 / 65536 * (1 + H6 / 67108864 * h * (1 + H3 / 67108864 * h)))
+    h = h * (1 - H1 * h / 524288)
+
+    return float(t), float(h) / 100.0, float(p)
+
+def clamp(value, lo, hi):
+    return min(max(value, lo), hi)
+
+def sweepInputs(steps):
+    """Raw input grid covering the full ADC ranges.
+    """
+    inputs = []
+    for i in range(steps):
+        ut = (i * 0xFFFFF) // (steps - 1)
+        for j in range(steps):
+            uh = (j * 0xFFFF) // (steps - 1)
+            up = (j * 0xFFFFF) // (steps - 1)
+            inputs.append((ut, uh, up))
+    return inputs
+
+class Result:
+    def __init__(self, name):
+        self.name = name
+        self.samples = 0
+        self.timeUs = 0
+        self.maxDev = [ 0.0, 0.0, 0.0 ]
+        self.sqSum = [ 0.0, 0.0, 0.0 ]
+        self.clampDiscrepancies = 0
+        self.deviations = 0
+        self.examples = []
+
+    def add(self, inputs, value, ref):
+        self.samples += 1
+        bounds = ((T_MIN, T_MAX, T_TOL), (H_MIN, H_MAX, H_TOL), (P_MIN, P_MAX, P_TOL))
+        for i in range(3):
+            lo, hi, tol = bounds[i]
+            refClamped = clamp(ref[i], lo, hi)
+            dev = abs(value[i] - refClamped)
+            self.sqSum[i] += dev * dev
+            self.maxDev[i] = max(self.maxDev[i], dev)
+            if dev > tol:
+                refInRange = lo <= ref[i] <= hi
+                valueAtBound = value[i] in (lo, hi)
+                if refInRange == valueAtBound:
+                    self.clampDiscrepancies += 1
+                    kind = "clamp"
+                else:
+                    self.deviations += 1
+                    kind = "overflow/precision"
+                if len(self.examples) < 5:
+                    self.examples.append((kind, "thp"[i], inputs, value[i], ref[i]))
+
+    def report(self):
+        n = max(self.samples, 1)
+        rms = [ math.sqrt(s / n) for s in self.sqSum ]
+        print("%-6s %8.3f us/sample  max dev: t=%.4f C  h=%.5f  p=%.2f Pa" % (
+              self.name, self.timeUs / n,
+              self.maxDev[0], self.maxDev[1], self.maxDev[2]))
+        print("%-6s %8s             RMS dev: t=%.4f C  h=%.5f  p=%.2f Pa" % (
+              "", "", rms[0], rms[1], rms[2]))
+        print("%-6s %8s             discrepancies: %d clamp, %d overflow/precision" % (
+              "", "", self.clampDiscrepancies, self.deviations))
+        for kind, what, inputs, value, ref in self.examples:
+            print("%-6s %8s               %s %s ut=0x%05X uh=0x%04X up=0x%05X: %r (ref %r)" % (
+                  "", "", kind, what, inputs[0], inputs[1], inputs[2], value, ref))
+
+def parseArgs():
+    """Returns (calsets, steps, seed).
+    """
+    if argparse is None:
+        # Micropython without argparse.
+        args = sys.argv[1:]
+        if len(args) > 3 or any(not a.isdigit() for a in args):
+            print("Usage: compensation-sweep.py [CALSETS] [STEPS] [SEED]")
+            sys.exit(1)
+        args = [ int(a) for a in args ] + [ 20, 48, 1 ][len(args):]
+        return args[0], args[1], args[2]
+    p = argparse.ArgumentParser(description="BME280 compensation accuracy and speed sweep.")
+    p.add_argument("calsets", type=int, nargs="?", default=20,
+                   help="Number of random calibration sets. Default: 20")
+    p.add_argument("steps", type=int, nargs="?", default=48,
+                   help="Number of steps per raw input axis. Default: 48")
+    p.add_argument("seed", type=int, nargs="?", default=1,
+                   help="Random seed. Default: 1")
+    args = p.parse_args()
+    return args.calsets, args.steps, args.seed
+
+def main():
+    calsets, steps, seed = parseArgs()
+    random.seed(seed)
+
+    print("Compensation sweep: %d calibration sets, %d raw inputs each, reference %s" % (
+          calsets, steps * steps, "exact" if Number is not float else "float"))
+    inputs = sweepInputs(steps)
+    results = [ Result(name) for name, _ in CALCS ]
+    for _ in range(calsets):
+        cal, raw = makeCalibration()
+        refs = [ reference(cal, *i) for i in inputs ]
+        for result, (name, calc) in zip(results, CALCS):
+            comp = bme280.BME280(calibration=raw, calc=calc).compensate
+            values = []
+            begin = ticks_us()
+            for ut, uh, up in inputs:
+                values.append(comp(ut, uh, up))
+            result.timeUs += ticks_diff(ticks_us(), begin)
+            for i in range(len(inputs)):
+                result.add(inputs[i], values[i], refs[i])
+    for result in results:
+        result.report()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# vim: ts=4 sw=4 expandtab
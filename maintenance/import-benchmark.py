@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+#
+# BME280 driver import time and heap usage benchmark.
+#
+# Each measurement runs in a fresh interpreter process:
+#   import      "import bme280"
+#   compensate  import and one compensate() call of an offline compensator
+# The heap usage is measured with tracemalloc on CPython and with
+# gc.mem_alloc() on Micropython. It is also checked, whether
+# the sync-only path loaded asyncio.
+# Interpreters: python3 and, if found in PATH, the Micropython unix port.
+#
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CAL = "04719f673200198a4dd6d00bc419fafff9ff0c3020d18813004b5a01001626031e"
+
+SCENARIOS = {
+    "import"        : "import bme280\n",
+    "compensate"    : ("import bme280\n"
+                       "b = bme280.BME280(calibration=bytes.fromhex('" + CAL + "'))\n"
+                       "b.compensate(0x85EFC, 0x7BD2, 0x5E962)\n"),
+}
+
+CPYTHON_PROLOGUE = """
+import sys, time, tracemalloc
+sys.path.insert(0, %r)
+tracemalloc.start()
+begin = time.perf_counter_ns()
+"""
+
+CPYTHON_EPILOGUE = """
+duration = (time.perf_counter_ns() - begin) // 1000
+heap = tracemalloc.get_traced_memory()[0]
+print("time_us", duration)
+print("heap_bytes", heap)
+print("asyncio", int("asyncio" in sys.modules))
+"""
+
+MICROPYTHON_PROLOGUE = """
+import sys, time, gc
+sys.path.insert(0, %r)
+gc.collect()
+heapBegin = gc.mem_alloc()
+begin = time.ticks_us()
+"""
+
+MICROPYTHON_EPILOGUE = """
+duration = time.ticks_diff(time.ticks_us(), begin)
+gc.collect()
+print("time_us", duration)
+print("heap_bytes", gc.mem_alloc() - heapBegin)
+print("asyncio", int("uasyncio" in sys.modules or "asyncio" in sys.modules))
+"""
+
+def interpreters():
+    found = { "python3" : sys.executable }
+    micropython = shutil.which("micropython")
+    if micropython:
+        found["micropython"] = micropython
+    return found
+
+def runOne(interpreter, path, scenario):
+    """Run one scenario in a fresh process. Returns a dict of the results.
+    """
+    if interpreter == "micropython":
+        code = MICROPYTHON_PROLOGUE % ROOT + SCENARIOS[scenario] + MICROPYTHON_EPILOGUE
+    else:
+        code = CPYTHON_PROLOGUE % ROOT + SCENARIOS[scenario] + CPYTHON_EPILOGUE
+    env = dict(os.environ)
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    out = subprocess.run([ path, "-c", code ],
+                         env=env,
+                         check=True,
+                         stdout=subprocess.PIPE).stdout.decode("UTF-8")
+    result = {}
+    for line in out.splitlines():
+        key, value = line.split()
+        result[key] = int(value)
+    return result
+
+def summarize(runs):
+    times = sorted(r["time_us"] for r in runs)
+    return {
+        "runs"          : len(runs),
+        "min_time_us"   : times[0],
+        "p50_time_us"   : times[len(times) // 2],
+        "heap_bytes"    : max(r["heap_bytes"] for r in runs),
+        "asyncio"       : any(r["asyncio"] for r in runs),
+    }
+
+def compare(results, oldResults):
+    """Print the relative change against a previous result file.
+    """
+    old = { (r["interpreter"], r["scenario"]) : r
+            for r in oldResults["results"] }
+    print("\nComparison against previous results (p50 time us, heap bytes):")
+    for r in results["results"]:
+        key = (r["interpreter"], r["scenario"])
+        if key not in old:
+            continue
+        o = old[key]
+        print("  %-12s %-11s %8d -> %8d   %8d -> %8d" % (
+              key + (o["p50_time_us"], r["p50_time_us"],
+                     o["heap_bytes"], r["heap_bytes"])))
+
+def main():
+    p = argparse.ArgumentParser(description="BME280 driver import time and heap usage benchmark.")
+    p.add_argument("-n", "--runs", type=int, default=10,
+                   help="Number of runs per combination. Default: 10")
+    p.add_argument("-i", "--interpreter", choices=interpreters().keys(), action="append",
+                   help="Interpreter to benchmark. May be given multiple times. Default: all")
+    p.add_argument("-s", "--scenario", choices=SCENARIOS.keys(), action="append",
+                   help="Scenario to benchmark. May be given multiple times. Default: all")
+    p.add_argument("-T", "--max-time", type=int, default=None,
+                   help="Fail, if the p50 time exceeds this limit, in microseconds.")
+    p.add_argument("-H", "--max-heap", type=int, default=None,
+                   help="Fail, if the heap usage exceeds this limit, in bytes.")
+    p.add_argument("-o", "--output", default=None,
+                   help="Write the results as JSON to this file.")
+    p.add_argument("-C", "--compare", default=None,
+                   help="Compare against a previous JSON result file.")
+    args = p.parse_args()
+
+    results = {
+        "time"          : time.time(),
+        "python"        : sys.version,
+        "platform"      : platform.platform(),
+        "results"       : [],
+    }
+    failed = False
+    print("%-12s %-11s %12s %12s %12s %8s" % (
+          "interpreter", "scenario", "min us", "p50 us", "heap bytes", "asyncio"))
+    for name, path in interpreters().items():
+        if args.interpreter and name not in args.interpreter:
+            continue
+        for scenario in (args.scenario or SCENARIOS.keys()):
+            summary = summarize([ runOne(name, path, scenario)
+                                  for _ in range(args.runs) ])
+            print("%-12s %-11s %12d %12d %12d %8s" % (
+                  name, scenario, summary["min_time_us"], summary["p50_time_us"],
+                  summary["heap_bytes"], "yes" if summary["asyncio"] else "no"))
+            summary.update({ "interpreter" : name, "scenario" : scenario })
+            results["results"].append(summary)
+            if summary["asyncio"]:
+                print("  FAIL: asyncio was imported.")
+                failed = True
+            if args.max_time is not None and summary["p50_time_us"] > args.max_time:
+                print("  FAIL: time limit exceeded.")
+                failed = True
+            if args.max_heap is not None and summary["heap_bytes"] > args.max_heap:
+                print("  FAIL: heap limit exceeded.")
+                failed = True
+
+    if args.output:
+        with open(args.output, "w") as fd:
+            json.dump(results, fd, indent=2)
+    if args.compare:
+        with open(args.compare, "r") as fd:
+            compare(results, json.load(fd))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# vim: ts=4 sw=4 expandtab
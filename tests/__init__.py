@@ -1,2 +1,24 @@
 from test_i2c_dummy import *
 from test_spi_dummy import *
+from test_main import *
+from test_storage import *
+from test_exporter import *
+from test_daemon import *
+from test_shm import *
+from test_mqtt import *
+from test_stats import *
+from test_simulator import *
+from test_transport import *
+from test_mux import *
+from test_discovery import *
+from test_retry import *
+from test_derived import *
+from test_filter import *
+from test_deadband import *
+from test_adaptive import *
+from test_planner import *
+from test_import import *
+from test_buspool import *
+from test_replay import *
+from test_health import *
+from test_archive import *
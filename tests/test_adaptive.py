@@ -0,0 +1,82 @@
+from unittest import TestCase
+from unittest.mock import patch
+import bme280
+from bme280.adaptive import *
+from bme280.simulator import *
+from test_simulator import FakeClock
+import asyncio
+
+class Test_Adaptive(TestCase):
+    @patch("bme280.bme280.isMicropython", False)
+    def test_adaptive(self):
+        def pressure(t):
+            # Stable, 50 Pa/s ramp (e.g. an elevator), stable.
+            return 95000.0 - 50.0 * min(max(t - 1010.0, 0.0), 20.0)
+        clock = FakeClock()
+        sim = BME280Simulator(pressure=pressure, noise=True, seed=1, clock=clock)
+        bus = SimulatedSMBus({ 0x76: sim })
+        with bme280.BME280(i2cBus=bus) as bme:
+            sampler = AdaptiveSampler(bme)
+            clock.step = 0.001
+            sampler.start()
+            clock.step = 0.0
+            self.assertEqual(sampler.level, len(LEVELS) - 1)
+
+            levels = []
+            reads = 0
+            transactions = bus.transactions
+            while clock.now < 1080.0:
+                clock.now += sampler.interval
+                t, h, p = sampler.read()
+                reads += 1
+                self.assertAlmostEqual(p, pressure(clock.now), delta=60.0)
+                if not levels or levels[-1][1] != sampler.level:
+                    levels.append((clock.now, sampler.level))
+
+            # Fast and coarse during the ramp, slow and fine when stable.
+            self.assertEqual(min(level for when, level in levels if when < 1030.0), 0)
+            self.assertEqual(levels[-1][1], len(LEVELS) - 1)
+            self.assertGreater(levels[-1][0], 1030.0)
+            self.assertLess(len(levels), 12)
+            # Registers are only written on level changes.
+            self.assertLessEqual(bus.transactions - transactions - reads, 4 * len(levels))
+
+    @patch("bme280.bme280.isMicropython", False)
+    def test_limits(self):
+        clock = FakeClock()
+        sim = BME280Simulator(pressure=lambda t: 95000.0 - 100.0 * (t - 1000.0), clock=clock)
+        with bme280.BME280(i2cBus=SimulatedSMBus({ 0x76: sim })) as bme:
+            sampler = AdaptiveSampler(bme, minLevel=2, maxLevel=3)
+            clock.step = 0.001
+            sampler.start()
+            clock.step = 0.0
+            self.assertEqual(sampler.level, 3)
+            for i in range(100):
+                clock.now += sampler.interval
+                sampler.read()
+                self.assertIn(sampler.level, (2, 3))
+            self.assertEqual(sampler.level, 2)
+        with self.assertRaises(ValueError):
+            AdaptiveSampler(bme, minLevel=3, maxLevel=2)
+        with self.assertRaises(ValueError):
+            AdaptiveSampler(bme, raiseAt=1.0, lowerAt=1.0)
+
+    @patch("bme280.bme280.isMicropython", False)
+    def test_async(self):
+        clock = FakeClock()
+        sim = BME280Simulator(pressure=lambda t: 95000.0 - 100.0 * (t - 1000.0), clock=clock)
+        async def coroutine_():
+            async with bme280.BME280(i2cBus=SimulatedSMBus({ 0x76: sim })) as bme:
+                sampler = AdaptiveSampler(bme, minLevel=2, maxLevel=3)
+                clock.step = 0.001
+                await sampler.startAsync()
+                clock.step = 0.0
+                self.assertEqual(sampler.level, 3)
+                for i in range(100):
+                    clock.now += sampler.interval
+                    t, h, p = await sampler.readAsync()
+                self.assertEqual(sampler.level, 2)
+                self.assertAlmostEqual(p, 95000.0 - 100.0 * (clock.now - 1000.0), delta=60.0)
+        asyncio.run(coroutine_())
+
+# vim: ts=4 sw=4 expandtab
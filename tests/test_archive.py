@@ -0,0 +1,87 @@
+from unittest import TestCase
+import bme280
+from bme280.archive import *
+from bme280.replay import Capture
+from bme280.simulator import BME280Simulator, DEFAULT_CALIBRATION
+import os
+import tempfile
+
+def makeCapture(path, count, t0, temperature):
+    sim = BME280Simulator()
+    capture = Capture(DEFAULT_CALIBRATION)
+    for i in range(count):
+        ut, uh, up = sim.rawFor(temperature + 0.01 * i, 0.5, 100000.0 - i)
+        capture.append(t0 + i, bytes(((up >> 12) & 0xFF, (up >> 4) & 0xFF, (up << 4) & 0xF0,
+                                      (ut >> 12) & 0xFF, (ut >> 4) & 0xFF, (ut << 4) & 0xF0,
+                                      (uh >> 8) & 0xFF, uh & 0xFF)))
+    capture.save(path)
+    return capture
+
+class Test_Archive(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.paths = [ os.path.join(self.tmp.name, "a.bin"),
+                       os.path.join(self.tmp.name, "b.bin") ]
+        self.captures = [ makeCapture(self.paths[0], 100, 1000.0, 20.0),
+                          makeCapture(self.paths[1], 50, 1020.0, 30.0) ]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_shard(self):
+        shards = shard(self.paths, shardSize=30)
+        self.assertEqual([ (s.path, s.first, s.count) for s in shards ],
+                         [ (self.paths[0], 0, 30), (self.paths[0], 30, 30),
+                           (self.paths[0], 60, 30), (self.paths[0], 90, 10),
+                           (self.paths[1], 0, 30), (self.paths[1], 30, 20) ])
+        shards = shard(self.paths, start=1010.0, end=1030.5, shardSize=30)
+        self.assertEqual([ (s.path, s.first, s.count) for s in shards ],
+                         [ (self.paths[0], 10, 21), (self.paths[1], 0, 11) ])
+        self.assertEqual(shard(self.paths, start=2000.0), [])
+
+    def test_decode(self):
+        comp = bme280.BME280(calibration=DEFAULT_CALIBRATION).compensate
+        expected = []
+        for capture in self.captures:
+            for i in range(len(capture)):
+                timestamp, b = capture[i]
+                expected.append((timestamp, ) + comp((b[3] << 12) | (b[4] << 4) | (b[5] >> 4),
+                                                     (b[6] << 8) | b[7],
+                                                     (b[0] << 12) | (b[1] << 4) | (b[2] >> 4)))
+        self.assertAlmostEqual(expected[99][1], 20.99, delta=0.01)
+        self.assertAlmostEqual(expected[100][1], 30.0, delta=0.01)
+        for workers in (0, 2):
+            result = []
+            paths = []
+            for s, values in decode(self.paths, workers=workers, shardSize=7, inFlight=3):
+                paths.append(s.path)
+                result.extend(tuple(values[i:i+4]) for i in range(0, len(values), 4))
+            self.assertEqual(result, expected)
+            self.assertEqual(paths, sorted(paths))
+
+        # The workers format the CSV lines.
+        text = "".join(t for s, t in decode(self.paths, workers=2, shardSize=7,
+                                             output=OUTPUT_CSV))
+        lines = text.splitlines()
+        self.assertEqual(len(lines), len(expected))
+        self.assertEqual(lines[100], "%s,%.6f,%.2f,%.4f,%.1f" % ((self.paths[1], ) + expected[100]))
+
+        # Stopping early cancels the queued shards.
+        for s, values in decode(self.paths, workers=1, shardSize=7):
+            break
+
+        with self.assertRaises(bme280.BME280Error):
+            list(decode([ os.path.join(self.tmp.name, "missing.bin") ], workers=0))
+
+    def test_main(self):
+        out = os.path.join(self.tmp.name, "out.csv")
+        self.assertEqual(bme280.archive.main([ "-j", "0", "-s", "1065", "-e", "1070",
+                                               "-o", out ] + self.paths), 0)
+        with open(out, "r") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], "sensor,timestamp,temperature,humidity,pressure")
+        self.assertEqual(len(lines), 1 + 5 + 5)
+        self.assertTrue(lines[1].startswith(self.paths[0] + ",1065.000000,20.65,"))
+        self.assertTrue(lines[6].startswith(self.paths[1] + ",1065.000000,30.45,"))
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,134 @@
+from unittest import TestCase
+from unittest.mock import patch
+from test_i2c_dummy import SMBusMock, I2CMock, SoftI2CMock, PinMock
+from test_spi_dummy import SpiDevMock
+import bme280
+import bme280.bme280 as bme280_driver
+import machine
+
+class CountingSMBusMock(SMBusMock):
+    opened = 0
+    closed = 0
+
+    def __init__(self, bus):
+        SMBusMock.__init__(self, bus)
+        CountingSMBusMock.opened += 1
+
+    def close(self):
+        CountingSMBusMock.closed += 1
+
+class CountingI2CMock(I2CMock):
+    opened = 0
+    deinitialized = 0
+
+    def __init__(self, *args, **kwargs):
+        I2CMock.__init__(self, *args, **kwargs)
+        CountingI2CMock.opened += 1
+
+    def deinit(self):
+        CountingI2CMock.deinitialized += 1
+
+class CountingSpiDevMock(SpiDevMock):
+    opened = []
+    closed = 0
+
+    def open(self, bus, cs):
+        SpiDevMock.open(self, bus, cs)
+        CountingSpiDevMock.opened.append((bus, cs))
+
+    def close(self):
+        CountingSpiDevMock.closed += 1
+
+class Test_BusPool(TestCase):
+    def setUp(self):
+        CountingSMBusMock.opened = 0
+        CountingSMBusMock.closed = 0
+        CountingI2CMock.opened = 0
+        CountingI2CMock.deinitialized = 0
+        CountingSpiDevMock.opened = []
+        CountingSpiDevMock.closed = 0
+
+    @patch("bme280.bme280.isMicropython", False)
+    @patch("smbus.SMBus", CountingSMBusMock)
+    def test_index(self):
+        a = bme280.BME280(i2cBus=42, i2cAddr=0x76)
+        b = bme280.BME280(i2cBus=42, i2cAddr=0x77)
+        self.assertEqual(CountingSMBusMock.opened, 1)
+        self.assertEqual(bme280_driver._busPool.users(("smbus", 42)), 2)
+        a.close()
+        self.assertEqual(CountingSMBusMock.closed, 0)
+        self.assertTrue(b.readForced()[0] > 0)
+        b.close()
+        self.assertEqual(CountingSMBusMock.closed, 1)
+        self.assertEqual(bme280_driver._busPool.users(("smbus", 42)), 0)
+        # Closing twice does not release the bus again.
+        b.close()
+        self.assertEqual(CountingSMBusMock.closed, 1)
+
+        # A new device opens a new handle.
+        with bme280.BME280(i2cBus=42) as c:
+            self.assertEqual(CountingSMBusMock.opened, 2)
+        self.assertEqual(CountingSMBusMock.closed, 2)
+
+    @patch("bme280.bme280.isMicropython", False)
+    def test_object(self):
+        bus = CountingSMBusMock(42)
+        a = bme280.BME280(i2cBus=bus, i2cAddr=0x76)
+        b = bme280.BME280(i2cBus=bus, i2cAddr=0x77)
+        a.close()
+        self.assertEqual(CountingSMBusMock.closed, 0)
+        self.assertTrue(b.readForced()[0] > 0)
+        b.close()
+        self.assertEqual(CountingSMBusMock.closed, 1)
+
+    @patch("bme280.bme280.isMicropython", True)
+    @patch("machine.I2C", CountingI2CMock, create=True)
+    @patch("machine.SoftI2C", SoftI2CMock, create=True)
+    @patch("machine.Pin", PinMock, create=True)
+    def test_micropython(self):
+        a = bme280.BME280(i2cBus={ "index": 42, "scl": 11, "sda": 12 }, i2cAddr=0x76)
+        b = bme280.BME280(i2cBus={ "index": 42, "scl": 11, "sda": 12 }, i2cAddr=0x77)
+        c = bme280.BME280(i2cBus=42)
+        self.assertEqual(CountingI2CMock.opened, 2)
+        a.close()
+        c.close()
+        self.assertEqual(CountingI2CMock.deinitialized, 1)
+        self.assertTrue(b.readForced()[0] > 0)
+        b.close()
+        self.assertEqual(CountingI2CMock.deinitialized, 2)
+
+        bus = CountingI2CMock(42, scl=11, sda=12, freq=100000)
+        a = bme280.BME280(i2cBus=bus, i2cAddr=0x76)
+        b = bme280.BME280(i2cBus=bus, i2cAddr=0x77)
+        a.close()
+        self.assertEqual(CountingI2CMock.deinitialized, 2)
+        b.close()
+        self.assertEqual(CountingI2CMock.deinitialized, 3)
+
+    @patch("bme280.bme280.isMicropython", False)
+    @patch("smbus.SMBus", CountingSMBusMock)
+    def test_lock(self):
+        with bme280.BME280(i2cBus=42, i2cAddr=0x76, busLock=True) as a:
+            with bme280.BME280(i2cBus=42, i2cAddr=0x77, busLock=True) as b:
+                lock = bme280_driver._busPool.acquire(("smbus", 42), None, True)[1]
+                bme280_driver._busPool.release(("smbus", 42), None)
+                self.assertIsNotNone(lock)
+                self.assertTrue(a.readForced()[0] > 0)
+                self.assertTrue(b.readForced()[0] > 0)
+                self.assertFalse(lock.locked())
+        self.assertEqual(CountingSMBusMock.opened, 1)
+        self.assertEqual(CountingSMBusMock.closed, 1)
+
+    @patch("bme280.bme280.isMicropython", False)
+    @patch("spidev.SpiDev", CountingSpiDevMock)
+    def test_spidev(self):
+        a = bme280.BME280(spiBus=42, spiCS=2)
+        b = bme280.BME280(spiBus=42, spiCS=2)
+        self.assertEqual(CountingSpiDevMock.opened, [ (42, 2) ])
+        a.close()
+        self.assertEqual(CountingSpiDevMock.closed, 0)
+        self.assertTrue(b.readForced()[0] > 0)
+        b.close()
+        self.assertEqual(CountingSpiDevMock.closed, 1)
+
+# vim: ts=4 sw=4 expandtab
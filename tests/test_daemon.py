@@ -0,0 +1,138 @@
+from unittest import TestCase
+from unittest.mock import patch
+from test_i2c_dummy import SMBusMock
+import bme280
+import bme280.daemon
+import asyncio
+import os
+import socket
+import tempfile
+
+class CountingSMBusMock(SMBusMock):
+    dataReads = 0
+
+    def read_i2c_block_data(self, addr, reg, length):
+        if reg == 0xF7:
+            CountingSMBusMock.dataReads += 1
+        return SMBusMock.read_i2c_block_data(self, addr, reg, length)
+
+class Test_Daemon(TestCase):
+    @patch("bme280.bme280.isMicropython", False)
+    @patch("smbus.SMBus", CountingSMBusMock)
+    def test_clients(self):
+        async def coroutine_(path):
+            CountingSMBusMock.dataReads = 0
+            readCount = lambda: CountingSMBusMock.dataReads
+            async with bme280.BME280(i2cBus=42, calc=bme280.CALC_INT32) as bme:
+                daemon = bme280.daemon.SensorDaemon(path, [ bme ], pollSleep=0.001)
+                await daemon.startAsync()
+                try:
+                    clients = [ bme280.daemon.SensorClient(path) for _ in range(5) ]
+
+                    # No sample, yet.
+                    with self.assertRaises(bme280.BME280Error):
+                        await clients[0].readAsync()
+
+                    # Concurrent forced reads share one conversion.
+                    results = await asyncio.gather(*(c.readForcedAsync() for c in clients))
+                    self.assertEqual(readCount(), 1)
+                    for t, h, p in results:
+                        self.assertAlmostEqual(t, 27.1, places=4)
+                        self.assertAlmostEqual(p, 98484.0, places=1)
+
+                    # Latest sample without conversion.
+                    t, h, p = await clients[1].readAsync()
+                    self.assertAlmostEqual(h, 0.451729, places=4)
+                    self.assertEqual(readCount(), 1)
+
+                    # Subscription stream.
+                    stream = clients[2].subscribeAsync()
+                    nextSample = asyncio.ensure_future(stream.__anext__())
+                    await asyncio.sleep(0.05)
+                    await clients[3].readForcedAsync()
+                    timestamp, (t, h, p) = await nextSample
+                    self.assertAlmostEqual(t, 27.1, places=4)
+                    await stream.aclose()
+
+                    # Invalid sensor index.
+                    invalid = bme280.daemon.SensorClient(path, sensor=7)
+                    with self.assertRaises(bme280.BME280Error):
+                        await invalid.readForcedAsync()
+                    await invalid.closeAsync()
+
+                    for c in clients:
+                        await c.closeAsync()
+                finally:
+                    await daemon.stopAsync()
+            self.assertFalse(os.path.exists(path))
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            asyncio.run(coroutine_(os.path.join(tmpdir, "sock")))
+
+    @patch("bme280.bme280.isMicropython", False)
+    @patch("smbus.SMBus", SMBusMock)
+    def test_slow_subscriber(self):
+        async def coroutine_(path):
+            async with bme280.BME280(i2cBus=42, calc=bme280.CALC_INT32) as bme:
+                daemon = bme280.daemon.SensorDaemon(path, [ bme ], maxBacklog=1024,
+                                                    pollSleep=0.0)
+                await daemon.startAsync()
+                try:
+                    # A subscriber that never reads.
+                    slow = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024)
+                    slow.connect(path)
+                    slow.sendall(bme280.daemon.REQUEST.pack(bme280.daemon.OP_SUBSCRIBE, 0))
+                    await asyncio.sleep(0.05)
+                    client = bme280.daemon.SensorClient(path)
+                    for _ in range(2000):
+                        await client.readForcedAsync()
+                    # The daemon dropped the subscriber: Its stream ends
+                    # after the backlog of the kernel socket buffer.
+                    slow.settimeout(5.0)
+                    count = 0
+                    try:
+                        while True:
+                            data = slow.recv(1 << 16)
+                            if not data:
+                                break
+                            count += len(data)
+                    except ConnectionError:
+                        pass
+                    self.assertLess(count, 2000 * bme280.daemon.REPLY.size)
+                    slow.close()
+                    # The daemon still serves the other clients.
+                    t, h, p = await client.readForcedAsync()
+                    self.assertAlmostEqual(t, 27.1, places=4)
+                    await client.closeAsync()
+                finally:
+                    await daemon.stopAsync()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            asyncio.run(coroutine_(os.path.join(tmpdir, "sock")))
+
+    @patch("bme280.bme280.isMicropython", False)
+    @patch("smbus.SMBus", SMBusMock)
+    def test_sync_client(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "sock")
+            results = []
+
+            async def coroutine_():
+                async with bme280.BME280(i2cBus=42, calc=bme280.CALC_INT32) as bme:
+                    daemon = bme280.daemon.SensorDaemon(path, [ bme ], pollSleep=0.001)
+                    await daemon.startAsync()
+                    try:
+                        def client():
+                            with bme280.daemon.SensorClient(path) as c:
+                                results.append(c.readForced())
+                                results.append(c.read())
+                        await asyncio.get_event_loop().run_in_executor(None, client)
+                    finally:
+                        await daemon.stopAsync()
+            asyncio.run(coroutine_())
+            self.assertEqual(len(results), 2)
+            self.assertEqual(results[0], results[1])
+            self.assertAlmostEqual(results[0][0], 27.1, places=4)
+
+# vim: ts=4 sw=4 expandtab
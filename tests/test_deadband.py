@@ -0,0 +1,56 @@
+from unittest import TestCase
+from unittest.mock import patch
+import bme280
+from bme280.simulator import *
+
+class Test_Deadband(TestCase):
+    def __check(self, calc):
+        sim = BME280Simulator(temperature=20.0, humidity=0.5, pressure=95000.0)
+        stats = bme280.BME280Stats()
+        hook = []
+        with bme280.BME280(i2cBus=SimulatedSMBus({ 0x76: sim }), calc=calc) as bme:
+            bme.setStats(stats)
+            bme.setSampleHook(lambda raw, values: hook.append(values))
+            bme.setDeadband(t=0.5, h=0.02, p=50.0)
+            def read():
+                return bme.readForced(pollSleep=0.001,
+                                      tempOversampling=bme280.OVSMPL_16,
+                                      humidityOversampling=bme280.OVSMPL_16,
+                                      pressureOversampling=bme280.OVSMPL_16)
+            first = read()
+            self.assertEqual(len(hook), 1)
+            self.assertIs(read(), first)
+            for name, small, large in (("temperature", 20.3, 20.7),
+                                       ("humidity", 0.51, 0.53),
+                                       ("pressure", 95030.0, 95070.0)):
+                count = len(hook)
+                setattr(sim, name, small)
+                self.assertIs(read(), hook[-1], name)
+                self.assertEqual(len(hook), count, name)
+                setattr(sim, name, large)
+                values = read()
+                self.assertEqual(len(hook), count + 1, name)
+                self.assertIs(values, hook[-1])
+            self.assertAlmostEqual(values[0], 20.7, delta=0.02)
+            self.assertAlmostEqual(values[1], 0.53, delta=0.002)
+            self.assertAlmostEqual(values[2], 95070.0, delta=3.0)
+            self.assertEqual(stats.suppressed, 4)
+
+            # Ignored channels never report.
+            bme.setDeadband(p=50.0)
+            read()
+            sim.temperature = 30.0
+            sim.humidity = 0.9
+            self.assertIs(read(), hook[-1])
+
+            bme.setDeadband()
+            count = len(hook)
+            self.assertEqual(read(), read())
+            self.assertEqual(len(hook), count + 2)
+
+    @patch("bme280.bme280.isMicropython", False)
+    def test_deadband(self):
+        for calc in (bme280.CALC_FLOAT, bme280.CALC_INT32, bme280.CALC_INT64):
+            self.__check(calc)
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,87 @@
+from unittest import TestCase, skipUnless
+from bme280.derived import *
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class Test_Derived(TestCase):
+    def test_exact(self):
+        self.assertAlmostEqual(altitude(SEA_LEVEL_PRESSURE), 0.0, places=6)
+        self.assertAlmostEqual(altitude(89874.6), 1000.0, delta=1.0)
+        self.assertAlmostEqual(altitude(95000.0, p0=95000.0), 0.0, places=6)
+        self.assertAlmostEqual(seaLevelPressure(89874.6, 1000.0), SEA_LEVEL_PRESSURE, delta=15.0)
+        self.assertAlmostEqual(dewPoint(20.0, 0.5), 9.26, delta=0.01)
+        self.assertAlmostEqual(dewPoint(25.0, 1.0), 25.0, places=6)
+        self.assertEqual(dewPoint(25.0, 0.0), -273.15)
+        self.assertAlmostEqual(absoluteHumidity(20.0, 0.5), 8.63, delta=0.02)
+
+    def test_sequences(self):
+        p = [ 101325.0, 95000.0, 89874.6 ]
+        self.assertEqual(altitude(p), [ altitude(x) for x in p ])
+        self.assertEqual(altitude(array("d", p)), [ altitude(x) for x in p ])
+        self.assertEqual(seaLevelPressure(p, 500.0), [ seaLevelPressure(x, 500.0) for x in p ])
+        t = [ 10.0, 20.0, 30.0 ]
+        h = [ 0.3, 0.5, 0.7 ]
+        self.assertEqual(dewPoint(t, h), [ dewPoint(*x) for x in zip(t, h) ])
+        self.assertEqual(absoluteHumidity(t, 0.5), [ absoluteHumidity(x, 0.5) for x in t ])
+
+    @skipUnless(numpy, "numpy not available")
+    def test_numpy(self):
+        p = numpy.array([ 101325.0, 95000.0, 89874.6 ])
+        t = numpy.array([ 10.0, 20.0, 30.0 ])
+        h = numpy.array([ 0.3, 0.5, 0.0 ])
+        numpy.testing.assert_allclose(altitude(p), [ altitude(x) for x in p ])
+        numpy.testing.assert_allclose(dewPoint(t, h), [ dewPoint(10.0, 0.3), dewPoint(20.0, 0.5), -273.15 ])
+        numpy.testing.assert_allclose(absoluteHumidity(t, h), [ absoluteHumidity(*x) for x in zip(t, h) ])
+
+        # The interpolation tables are evaluated vectorized, too.
+        # Including extrapolation beyond the table ranges.
+        p = numpy.array([ 101325.0, 95000.0, 89874.6, 10000.0, 120000.0 ])
+        numpy.testing.assert_allclose(altitude(p, fast=True), [ altitude(x, fast=True) for x in p ])
+        alt = numpy.array([ -1000.0, 0.0, 500.0, 9500.0 ])
+        numpy.testing.assert_allclose(seaLevelPressure(95000.0, alt, fast=True),
+                                      [ seaLevelPressure(95000.0, x, fast=True) for x in alt ])
+        t = numpy.array([ -50.0, 10.0, 20.0, 30.0, 90.0 ])
+        h = numpy.array([ 0.3, 0.5, 0.0, 0.005, 1.0 ])
+        numpy.testing.assert_allclose(dewPoint(t, h, fast=True),
+                                      [ dewPoint(*x, fast=True) for x in zip(t, h) ])
+        numpy.testing.assert_allclose(absoluteHumidity(t, h, fast=True),
+                                      [ absoluteHumidity(*x, fast=True) for x in zip(t, h) ])
+        altimeter = Altimeter(fast=True)
+        numpy.testing.assert_allclose(altimeter.altitude(p), [ altimeter.altitude(x) for x in p ])
+
+    def test_fast(self):
+        # The documented error bounds.
+        for i in range(1001):
+            p = SEA_LEVEL_PRESSURE * (0.25 + 0.9 * i / 1000)
+            self.assertAlmostEqual(altitude(p, fast=True), altitude(p), delta=0.05)
+            alt = -500.0 + 9500.0 * i / 1000
+            self.assertAlmostEqual(seaLevelPressure(110000.0, alt, fast=True),
+                                   seaLevelPressure(110000.0, alt), delta=0.5)
+            t = -40.0 + 125.0 * i / 1000
+            self.assertAlmostEqual(absoluteHumidity(t, 1.0, fast=True),
+                                   absoluteHumidity(t, 1.0), delta=0.005)
+            h = 0.01 + 0.99 * i / 1000
+            for t in (-40.0, 0.0, 25.0, 85.0):
+                self.assertAlmostEqual(dewPoint(t, h, fast=True), dewPoint(t, h),
+                                       delta=(0.001 if h >= 0.05 else 0.02))
+
+    def test_altimeter(self):
+        alt = Altimeter()
+        self.assertEqual(alt.reference, SEA_LEVEL_PRESSURE)
+        self.assertEqual(alt.altitude(95000.0), altitude(95000.0))
+        alt.calibrate(95000.0, 500.0)
+        self.assertAlmostEqual(alt.altitude(95000.0), 500.0, places=6)
+        self.assertAlmostEqual(alt.reference, seaLevelPressure(95000.0, 500.0))
+        self.assertEqual(alt.seaLevelPressure([ 95000.0, 96000.0 ], 500.0),
+                         [ seaLevelPressure(95000.0, 500.0), seaLevelPressure(96000.0, 500.0) ])
+
+        fast = Altimeter(p0=alt.reference, fast=True)
+        self.assertAlmostEqual(fast.altitude(95000.0), 500.0, delta=0.05)
+        self.assertAlmostEqual(fast.altitude([ 95000.0 ])[0], 500.0, delta=0.05)
+        self.assertAlmostEqual(fast.seaLevelPressure(95000.0, 500.0), alt.reference, delta=0.5)
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,51 @@
+from unittest import TestCase
+from unittest.mock import patch
+from test_i2c_dummy import SMBusMock
+import bme280
+from bme280.discovery import *
+from bme280.simulator import *
+
+class Test_Discovery(TestCase):
+    @patch("bme280.bme280.isMicropython", False)
+    def test_linux(self):
+        bus1 = SimulatedSMBus({ 0x76: BME280Simulator(temperature=20.0),
+                                0x77: BME280Simulator(temperature=25.0) })
+        bus2 = SimulatedSMBus({ 0x77: BME280Simulator(temperature=30.0) })
+        bus3 = SimulatedSMBus({})
+        sensors = discover([ bus1, bus2, bus3 ])
+        self.assertEqual([ (bus, addr) for bus, addr, bme in sensors ],
+                         [ (bus1, 0x76), (bus1, 0x77), (bus2, 0x77) ])
+        for (bus, addr, bme), t in zip(sensors, (20.0, 25.0, 30.0)):
+            self.assertAlmostEqual(bme.readForced(pollSleep=0.001,
+                                                  tempOversampling=bme280.OVSMPL_16)[0],
+                                   t, delta=0.01)
+            bme.close()
+
+        # Without reset only the calibration is read.
+        transactions = bus1.transactions
+        sensors = discover([ bus1 ], addrs=(0x77, ), reset=False, calc=bme280.CALC_INT32)
+        self.assertEqual(len(sensors), 1)
+        self.assertLessEqual(bus1.transactions - transactions, 1 + 3)
+        self.assertEqual(len(sensors[0][2].getCalibration()), 33)
+
+    @patch("bme280.bme280.isMicropython", False)
+    @patch("smbus.SMBus", SMBusMock)
+    def test_linux_index(self):
+        sensors = discover([ 42 ], addrs=(0x76, ))
+        self.assertEqual(len(sensors), 1)
+        bus, addr, bme = sensors[0]
+        self.assertEqual((bus, addr), (42, 0x76))
+        t, h, p = bme.readForced(pollSleep=0.001)
+        self.assertTrue(t > 0 and h > 0 and p > 0)
+        bme.close()
+        self.assertIsInstance(i2cBuses(), list)
+
+    @patch("bme280.bme280.isMicropython", True)
+    def test_micropython(self):
+        bus = SimulatedI2C({ 0x77: BME280Simulator(temperature=-5.0) })
+        sensors = discover([ bus ], calc=bme280.CALC_INT32)
+        self.assertEqual([ (b, addr) for b, addr, bme in sensors ], [ (bus, 0x77) ])
+        with self.assertRaises(bme280.BME280Error):
+            discover()
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,53 @@
+from unittest import TestCase
+from unittest.mock import patch
+from test_i2c_dummy import SMBusMock
+import bme280
+import bme280.exporter
+import asyncio
+
+class Test_Exporter(TestCase):
+    @patch("bme280.bme280.isMicropython", False)
+    @patch("smbus.SMBus", SMBusMock)
+    def test_scrape(self):
+        async def scrape(port, path):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET %s HTTP/1.1\r\nHost: localhost\r\n\r\n" % path)
+            data = await reader.read()
+            writer.close()
+            return data
+
+        async def coroutine_():
+            async with bme280.BME280(i2cBus=42, calc=bme280.CALC_INT32) as bme:
+                exporter = bme280.exporter.MetricsExporter({ "room": bme },
+                                                           interval=0.01,
+                                                           port=0,
+                                                           pollSleep=0.001)
+                await exporter.startAsync()
+                try:
+                    for _ in range(100):
+                        await asyncio.sleep(0.01)
+                        if b"bme280_temperature_celsius{" in exporter.render():
+                            break
+                    response = await scrape(exporter.port, b"/metrics")
+                    notFound = await scrape(exporter.port, b"/foo")
+                finally:
+                    await exporter.stopAsync()
+            return response, notFound
+
+        response, notFound = asyncio.run(coroutine_())
+        head, _, body = response.partition(b"\r\n\r\n")
+        self.assertTrue(head.startswith(b"HTTP/1.1 200 OK"))
+        self.assertIn(b"application/openmetrics-text", head)
+        self.assertTrue(body.endswith(b"# EOF\n"))
+        self.assertIn(b'bme280_temperature_celsius{sensor="room"} 27.1', body)
+        self.assertIn(b'bme280_pressure_pascals{sensor="room"} 98484.0', body)
+        self.assertIn(b'bme280_bus_errors_total{sensor="room"} 0', body)
+        self.assertIn(b'bme280_read_latency_seconds_bucket{sensor="room",le="+Inf"}', body)
+        self.assertTrue(notFound.startswith(b"HTTP/1.1 404"))
+
+    def test_label_escape(self):
+        exporter = bme280.exporter.MetricsExporter({ 'a\\b "c"\nd': None })
+        self.assertIn(b'bme280_samples_total{sensor="a\\\\b \\"c\\"\\nd"} 0\n',
+                      exporter.render())
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,115 @@
+from unittest import TestCase
+from unittest.mock import patch
+import random
+import bme280
+from bme280.filter import *
+from bme280.simulator import *
+
+class Test_Filter(TestCase):
+    def test_median(self):
+        rnd = random.Random(42)
+        for window in (1, 2, 3, 4, 5, 8, 11):
+            f = MedianFilter(window)
+            values = []
+            for i in range(200):
+                x = rnd.randrange(-1000, 1000) if i % 7 else 5
+                values.append(x)
+                last = sorted(values[-window:])
+                n = len(last)
+                if n & 1:
+                    expected = last[n // 2]
+                else:
+                    expected = (last[n // 2 - 1] + last[n // 2]) >> 1
+                self.assertEqual(f.update(x), expected)
+                self.assertEqual(f.count, n)
+            f.reset()
+            self.assertEqual(f.count, 0)
+            self.assertEqual(f(3.5), 3.5)
+        with self.assertRaises(ValueError):
+            MedianFilter(0)
+
+    def test_iir(self):
+        f = IIRFilter(3)
+        self.assertEqual(f.update(1000), 1000)
+        for i in range(200):
+            y = f.update(2000)
+        self.assertEqual(y, 2000)
+        # A step is followed with a time constant of 8 samples.
+        f.reset()
+        f.update(0)
+        y = [ f.update(8000) for i in range(8) ]
+        self.assertEqual(y[0], 1000)
+        self.assertTrue(all(a < b for a, b in zip(y, y[1:])))
+        self.assertAlmostEqual(y[-1], 8000 * (1 - (7 / 8) ** 8), delta=2)
+        self.assertEqual(IIRFilter(0).update(123), 123)
+
+    def test_kalman(self):
+        rnd = random.Random(1)
+        f = KalmanFilter(0.001, 4.0)
+        errors = []
+        for i in range(500):
+            y = f.update(100.0 + rnd.gauss(0.0, 2.0))
+            if i >= 100:
+                errors.append(abs(y - 100.0))
+        self.assertLess(max(errors), 1.0)
+        self.assertLess(f.variance, 4.0)
+        # Integers are filtered in fixed point.
+        f = KalmanFilter(0.001, 4.0)
+        fFloat = KalmanFilter(0.001, 4.0)
+        for i in range(500):
+            x = 100000 + rnd.randrange(-4, 5)
+            y = f.update(x)
+            self.assertIsInstance(y, int)
+            self.assertAlmostEqual(y, fFloat.update(float(x)), delta=1.0)
+        self.assertEqual(KalmanFilter(1.0, 1.0, fracBits=0).update(7), 7)
+        with self.assertRaises(ValueError):
+            KalmanFilter(1.0, 1.0, fracBits=-1)
+
+    def test_sample(self):
+        f = SampleFilter(t=MedianFilter(3), p=FilterChain(MedianFilter(3), IIRFilter(1)))
+        self.assertEqual(f((10, 20, 30)), (10, 20, 30))
+        self.assertEqual(f((90, 21, 30)), (50, 21, 30))
+        self.assertEqual(f((11, 22, 900)), (11, 22, 30))
+        f.reset()
+        self.assertEqual(f((1, 2, 3)), (1, 2, 3))
+
+    @patch("bme280.bme280.isMicropython", False)
+    def test_driver(self):
+        sim = BME280Simulator(temperature=22.0, pressure=95000.0)
+        hookRaw = []
+        with bme280.BME280(i2cBus=SimulatedSMBus({ 0x76: sim })) as bme:
+            bme.setSampleHook(lambda raw, values: hookRaw.append(raw))
+            bme.readForced(pollSleep=0.001)
+            raw = bme.readRaw()
+            bme.setRawFilter(SampleFilter(p=MedianFilter(3)))
+            bme.read()
+            t, h, p = bme.read()
+            self.assertAlmostEqual(p, 95000.0, delta=5.0)
+            # An outlier is rejected by the median.
+            sim.pressure = 50000.0
+            self.assertAlmostEqual(bme.readForced(pollSleep=0.001)[2], 95000.0, delta=5.0)
+            self.assertEqual(hookRaw[-1][2], raw[2])
+            self.assertAlmostEqual(bme.read()[2], 50000.0, delta=5.0)
+            bme.setRawFilter(None)
+            self.assertAlmostEqual(bme.read()[2], 50000.0, delta=5.0)
+
+    @patch("bme280.bme280.isMicropython", False)
+    def test_driver_kalman_int(self):
+        for calc in (bme280.CALC_INT32, bme280.CALC_INT64):
+            sim = BME280Simulator(temperature=22.0, pressure=95000.0)
+            with bme280.BME280(i2cBus=SimulatedSMBus({ 0x76: sim }), calc=calc) as bme:
+                bme.readForced(pollSleep=0.001)
+                bme.setRawFilter(SampleFilter(t=KalmanFilter(1.0, 10.0),
+                                              h=KalmanFilter(1.0, 10.0),
+                                              p=KalmanFilter(1.0, 10.0)))
+                for i in range(5):
+                    t, h, p = bme.read()
+                self.assertAlmostEqual(t, 22.0, delta=0.1)
+                self.assertAlmostEqual(p, 95000.0, delta=5.0)
+                # The estimate follows a step.
+                sim.pressure = 96000.0
+                for i in range(50):
+                    p = bme.readForced(pollSleep=0.001)[2]
+                self.assertAlmostEqual(p, 96000.0, delta=5.0)
+
+# vim: ts=4 sw=4 expandtab
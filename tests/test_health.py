@@ -0,0 +1,128 @@
+from unittest import TestCase
+from unittest.mock import patch
+from test_simulator import FakeClock
+import bme280
+from bme280.simulator import *
+from bme280.health import *
+
+RAW = (0x85EFC, 0x7BD2, 0x5E962)
+
+class Test_Health(TestCase):
+    def test_latency(self):
+        states = []
+        mon = HealthMonitor(warmup=4, latencyRatio=2.0, latencyShift=2, hook=states.append)
+        for i in range(4):
+            self.assertIsNone(mon.latency)
+            self.assertEqual(mon.check((RAW[0] + i, ) + RAW[1:], 100), RECOVER_NONE)
+        self.assertEqual(mon.latencyBaseline, 100)
+        self.assertEqual(mon.latency, 100)
+        # A single spike is smoothed out.
+        mon.check(RAW, 300)
+        self.assertEqual(mon.latency, 150)
+        self.assertTrue(mon.healthy)
+        # Creeping latency.
+        for i in range(8):
+            mon.check((RAW[0] + i, ) + RAW[1:], 400)
+        self.assertEqual(mon.state, HEALTH_LATENCY)
+        self.assertEqual(states, [ HEALTH_LATENCY ])
+        mon.rebaseline()
+        self.assertTrue(mon.healthy)
+        self.assertEqual(states, [ HEALTH_LATENCY, HEALTH_OK ])
+
+    def test_stuck(self):
+        mon = HealthMonitor(stuckAfter=4, resetAfter=2, latencyRatio=0)
+        actions = [ mon.check(RAW, 0) for _ in range(12) ]
+        self.assertEqual(actions, [ RECOVER_NONE ] * 3 + [ RECOVER_REVALIDATE ] +
+                                  [ RECOVER_NONE ] * 3 + [ RECOVER_RESET ] +
+                                  [ RECOVER_NONE ] * 3 + [ RECOVER_REVALIDATE ])
+        self.assertEqual(mon.state, HEALTH_STUCK)
+        self.assertEqual((mon.revalidations, mon.resets), (2, 1))
+        mon.check((RAW[0] + 1, ) + RAW[1:], 0)
+        self.assertTrue(mon.healthy)
+
+    def test_invalid(self):
+        mon = HealthMonitor(resetAfter=3, latencyRatio=0)
+        # Skipped humidity and pressure are fine.
+        self.assertEqual(mon.check((RAW[0], 0x8000, 0x80000), 0), RECOVER_NONE)
+        self.assertTrue(mon.healthy)
+        self.assertEqual(mon.check(RAW, 0), RECOVER_NONE)
+        # Once measured, the skip value indicates a lost configuration.
+        self.assertEqual(mon.check((RAW[0], 0x8000, RAW[2]), 0), RECOVER_REVALIDATE)
+        self.assertEqual(mon.state, HEALTH_INVALID)
+        self.assertEqual(mon.check((0x80000, 0x8000, 0x80000), 0), RECOVER_REVALIDATE)
+        self.assertEqual(mon.check((0xFFFFF, 0xFFFF, 0xFFFFF), 0), RECOVER_RESET)
+        self.assertEqual(mon.check(RAW, 0), RECOVER_NONE)
+        self.assertTrue(mon.healthy)
+
+        # Clamped values request a recovery with the next read.
+        mon.checkValues((85.0, 0.5, 100000.0))
+        self.assertEqual(mon.state, HEALTH_RANGE)
+        self.assertEqual(mon.check((RAW[0] + 1, ) + RAW[1:], 0), RECOVER_REVALIDATE)
+        mon.checkValues((25.0, 0.5, 100000.0))
+        self.assertTrue(mon.healthy)
+
+    @patch("bme280.bme280.isMicropython", False)
+    def test_recovery(self):
+        clock = FakeClock()
+        sim = BME280Simulator(pressure=97000.0, noise=True, clock=clock, seed=1)
+        mon = HealthMonitor(stuckAfter=3, resetAfter=3)
+        with bme280.BME280(i2cBus=SimulatedSMBus({ 0x76: sim })) as bme:
+            bme.setHealth(mon)
+            clock.step = 0.001
+            bme.start(mode=bme280.MODE_NORMAL,
+                      standbyTime=bme280.T_SB_p5ms,
+                      humidityOversampling=bme280.OVSMPL_2)
+            clock.step = 0.0
+            for _ in range(5):
+                clock.now += 0.1
+                self.assertAlmostEqual(bme.read()[2], 97000.0, delta=20.0)
+            self.assertTrue(mon.healthy)
+
+            # Brown-out: The device lost its configuration.
+            sim.reset()
+            bme.read()
+            self.assertEqual(mon.state, HEALTH_INVALID)
+            self.assertEqual(sim.readRegisters(0xF2, 1)[0], bme280.OVSMPL_2)
+            clock.now += 0.1
+            self.assertAlmostEqual(bme.read()[2], 97000.0, delta=20.0)
+            self.assertTrue(mon.healthy)
+            self.assertEqual(mon.revalidations, 1)
+
+            # The device stopped converting.
+            sim.writeRegister(0xF4, sim.readRegisters(0xF4, 1)[0] & ~3)
+            for _ in range(2):
+                clock.now += 0.1
+                bme.read()
+            self.assertEqual(mon.state, HEALTH_STUCK)
+            self.assertEqual(mon.revalidations, 2)
+            clock.now += 0.1
+            bme.read()
+            self.assertTrue(mon.healthy)
+            self.assertEqual(mon.resets, 0)
+
+    @patch("bme280.bme280.isMicropython", False)
+    def test_reset(self):
+        clock = FakeClock()
+        sim = BME280Simulator(clock=clock)
+        mon = HealthMonitor(resetAfter=1)
+        with bme280.BME280(i2cBus=SimulatedSMBus({ 0x76: sim })) as bme:
+            bme.setHealth(mon)
+            clock.step = 0.001
+            bme.start(mode=bme280.MODE_NORMAL,
+                      standbyTime=bme280.T_SB_10ms,
+                      filter=bme280.FILTER_4)
+            clock.step = 0.0
+            clock.now += 0.1
+            bme.read()
+            sim.reset()
+            clock.step = 0.001
+            bme.read()
+            clock.step = 0.0
+            self.assertEqual(mon.resets, 1)
+            self.assertEqual(sim.readRegisters(0xF4, 2)[1], (bme280.T_SB_10ms << 5) | (bme280.FILTER_4 << 2))
+            self.assertEqual(sim.readRegisters(0xF4, 1)[0] & 3, bme280.MODE_NORMAL)
+            clock.now += 0.1
+            bme.read()
+            self.assertTrue(mon.healthy)
+
+# vim: ts=4 sw=4 expandtab
@@ -95,6 +95,21 @@ class Test_I2CDummy(TestCase):
             self.assertAlmostEqual(h, 0.451729, places=2)
             self.assertAlmostEqual(p / 100, 984.84001160, places=1)
 
+        # Offline compensation with the calibration data of the device.
+        with bme280.BME280(i2cBus=42, calc=bme280.CALC_INT32) as bme:
+            t, h, p = bme.readForced()
+            cal = bme.getCalibration()
+            raw = bme.readRaw()
+        offline = bme280.BME280(calibration=cal, calc=bme280.CALC_INT32)
+        self.assertEqual(offline.compensate(*raw), (t, h, p))
+        with self.assertRaises(bme280.BME280Error):
+            offline.read()
+        with self.assertRaises(bme280.BME280Error):
+            bme280.BME280(calibration=cal[:-1])
+        with self.assertRaises(bme280.BME280Error):
+            with bme280.BME280(i2cBus=42) as bme:
+                bme.getCalibration()
+
     @patch("bme280.bme280.isMicropython", True)
     @patch("machine.I2C", I2CMock, create=True)
     @patch("machine.SoftI2C", SoftI2CMock, create=True)
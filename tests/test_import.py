@@ -0,0 +1,39 @@
+from unittest import TestCase
+import asyncio
+import os
+import subprocess
+import sys
+import bme280
+from bme280.simulator import *
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+class Test_Import(TestCase):
+    def test_lazy_asyncio(self):
+        # The sync path must not import asyncio.
+        code = ("import sys\n"
+                "sys.path.insert(0, %r)\n"
+                "import bme280\n"
+                "from bme280.simulator import *\n"
+                "with bme280.BME280(i2cBus=SimulatedSMBus({ 0x76: BME280Simulator() })) as bme:\n"
+                "    bme.readForced(pollSleep=0.001)\n"
+                "    bme.read()\n"
+                "    import bme280.adaptive\n"
+                "    sampler = bme280.adaptive.AdaptiveSampler(bme)\n"
+                "    sampler.start()\n"
+                "    sampler.read()\n"
+                "print(int('asyncio' in sys.modules))\n") % ROOT
+        out = subprocess.run([ sys.executable, "-c", code ],
+                             check=True, stdout=subprocess.PIPE).stdout
+        self.assertEqual(out.strip(), b"0")
+
+    def test_sync_in_loop(self):
+        # Sync calls work without an event loop, even inside of a running one.
+        sim = BME280Simulator(temperature=23.0)
+        with bme280.BME280(i2cBus=SimulatedSMBus({ 0x76: sim })) as bme:
+            async def coroutine_():
+                return bme.readForced(pollSleep=0.001)
+            t, h, p = asyncio.run(coroutine_())
+            self.assertAlmostEqual(t, 23.0, delta=0.01)
+
+# vim: ts=4 sw=4 expandtab
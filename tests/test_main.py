@@ -0,0 +1,52 @@
+from unittest import TestCase
+from unittest.mock import patch
+from test_i2c_dummy import SMBusMock
+from test_spi_dummy import SpiDevMock
+import bme280
+import bme280.__main__ as bme280_main
+import json
+import os
+import tempfile
+
+class Test_Main(TestCase):
+    @patch("bme280.bme280.isMicropython", False)
+    @patch("smbus.SMBus", SMBusMock)
+    @patch("spidev.SpiDev", SpiDevMock)
+    def test_formats(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "log")
+
+            ret = bme280_main.main([ "--i2c", "42", "--spi", "42:2", "--calc", "int32",
+                                     "--rate", "0", "--count", "3",
+                                     "--format", "csv", "--output", path ])
+            self.assertEqual(ret, 0)
+            with open(path, "r") as fd:
+                lines = fd.read().splitlines()
+            self.assertEqual(len(lines), 1 + 3 * 2)
+            self.assertEqual(lines[0], "timestamp,sensor,temperature,humidity,pressure")
+            self.assertEqual(lines[1].split(",")[1:], [ "0", "27.10", "0.4517", "98484.0" ])
+
+            ret = bme280_main.main([ "--i2c", "42:0x76", "--mode", "normal",
+                                     "--rate", "0", "--count", "2",
+                                     "--format", "json", "--output", path ])
+            self.assertEqual(ret, 0)
+            with open(path, "r") as fd:
+                samples = [ json.loads(l) for l in fd ]
+            self.assertEqual(len(samples), 2)
+            self.assertEqual(samples[0]["sensor"], 0)
+            self.assertAlmostEqual(samples[0]["temperature"], 27.1, places=1)
+
+            ret = bme280_main.main([ "--i2c", "42", "--calc", "int32",
+                                     "--rate", "0", "--count", "4",
+                                     "--format", "binary", "--output", path ])
+            self.assertEqual(ret, 0)
+            with open(path, "rb") as fd:
+                data = fd.read()
+            Writer = bme280_main.BinaryWriter
+            self.assertTrue(data.startswith(Writer.MAGIC))
+            data = data[len(Writer.MAGIC):]
+            self.assertEqual(len(data), 4 * Writer.RECORD.size)
+            ts, sensor, t, h, p = Writer.RECORD.unpack_from(data, 0)
+            self.assertEqual((sensor, t, h, p), (0, 2710, 4517, 9848400))
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,145 @@
+from unittest import TestCase
+from unittest.mock import patch
+from test_i2c_dummy import SMBusMock
+import bme280
+import bme280.mqtt
+import asyncio
+import socket
+import threading
+import time
+
+class BrokerStandIn:
+    """Minimal local MQTT broker stand-in.
+    Accepts connections and records all PUBLISH packets.
+    """
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(4)
+        self.port = self.sock.getsockname()[1]
+        self.clientIds = []
+        self.published = []
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def __recv(self, conn, length):
+        data = b""
+        while len(data) < length:
+            chunk = conn.recv(length - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
+
+    def __packet(self, conn):
+        packetType = self.__recv(conn, 1)[0]
+        length, shift = 0, 0
+        while True:
+            byte = self.__recv(conn, 1)[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not (byte & 0x80):
+                break
+        return packetType, self.__recv(conn, length)
+
+    def __run(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            with conn:
+                try:
+                    while True:
+                        packetType, body = self.__packet(conn)
+                        if packetType == 0x10:
+                            assert body[:7] == b"\x00\x04MQTT\x04"
+                            idLen = int.from_bytes(body[10:12], "big")
+                            self.clientIds.append(body[12:12+idLen].decode())
+                            conn.sendall(b"\x20\x02\x00\x00")
+                        elif packetType & 0xF0 == 0x30:
+                            topicLen = int.from_bytes(body[:2], "big")
+                            self.published.append((body[2:2+topicLen].decode(),
+                                                   body[2+topicLen:]))
+                        elif packetType == 0xE0:
+                            break
+                except EOFError:
+                    pass
+
+    def close(self):
+        self.sock.close()
+
+class DisconnectedClient:
+    def connect(self):
+        raise OSError("Broker unreachable.")
+
+    def publish(self, topic, msg):
+        raise OSError("Not connected.")
+
+class Test_MQTT(TestCase):
+    def test_codec(self):
+        samples = [ (1700000000000 + i * 250, 2710 - i, 4517 + 3 * i, 984840 - 7 * i)
+                    for i in range(50) ]
+        payload = bme280.mqtt.encodeBatch(samples)
+        self.assertLess(len(payload), 50 * 6)
+        decoded = bme280.mqtt.decodeBatch(payload)
+        self.assertEqual(len(decoded), 50)
+        self.assertAlmostEqual(decoded[3][0], 1700000000.75, places=3)
+        self.assertAlmostEqual(decoded[3][1], 27.07, places=4)
+        self.assertAlmostEqual(decoded[3][2], 0.4526, places=4)
+        self.assertAlmostEqual(decoded[3][3], 98481.9, places=2)
+        with self.assertRaises(bme280.BME280Error):
+            bme280.mqtt.decodeBatch(payload[:-2])
+
+    def test_broker(self):
+        broker = BrokerStandIn()
+        try:
+            client = bme280.mqtt.MQTTClient("bme-test", "127.0.0.1", port=broker.port)
+            pub = bme280.mqtt.BatchPublisher(client, maxSamples=10, maxAge=1000.0)
+            for i in range(25):
+                self.assertTrue(pub.add("env/a", 20.0, 0.5, 100000.0 + i,
+                                        timestamp=1700000000.0 + i))
+            pub.add("env/b", -1.0, 0.25, 90000.0, timestamp=1700000000.0)
+            self.assertEqual(pub.published, 2)
+            self.assertTrue(pub.flush())
+            pub.close()
+            self.assertEqual(pub.published, 4)
+            for _ in range(500):
+                if len(broker.published) >= 4:
+                    break
+                time.sleep(0.01)
+        finally:
+            broker.close()
+        self.assertEqual(broker.clientIds, [ "bme-test" ])
+        topics = [ topic for topic, _ in broker.published ]
+        self.assertEqual(topics.count("env/a"), 3)
+        self.assertEqual(topics.count("env/b"), 1)
+        samples = []
+        for topic, payload in broker.published:
+            if topic == "env/a":
+                samples.extend(bme280.mqtt.decodeBatch(payload))
+        self.assertEqual([ s[3] for s in samples ],
+                         [ 100000.0 + i for i in range(25) ])
+
+    def test_backpressure(self):
+        pub = bme280.mqtt.BatchPublisher(DisconnectedClient(),
+                                         maxSamples=2, maxAge=1000.0, maxQueue=2,
+                                         reconnectInterval=0.0)
+        accepted = [ pub.add("t", 20.0, 0.5, 100000.0) for _ in range(10) ]
+        self.assertEqual(accepted, [ True ] * 6 + [ False ] * 4)
+        self.assertTrue(pub.full)
+        self.assertEqual(pub.queued, 2)
+        self.assertEqual(pub.rejected, 4)
+        self.assertEqual(pub.published, 0)
+        self.assertFalse(pub.flush())
+
+    @patch("bme280.bme280.isMicropython", False)
+    @patch("smbus.SMBus", SMBusMock)
+    def test_sample(self):
+        pub = bme280.mqtt.BatchPublisher(DisconnectedClient(), maxSamples=1, maxQueue=1)
+        with bme280.BME280(i2cBus=42, calc=bme280.CALC_INT32) as bme:
+            bme.start(mode=bme280.MODE_NORMAL)
+            self.assertIsNotNone(asyncio.run(pub.sampleAsync("t", bme)))
+            self.assertIsNone(asyncio.run(pub.sampleAsync("t", bme)))
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,136 @@
+from unittest import TestCase
+from unittest.mock import patch
+from test_i2c_dummy import SMBusMock
+import bme280
+import bme280.bme280 as bme280_driver
+import bme280.__main__ as bme280_main
+from bme280.simulator import *
+import os
+import tempfile
+
+# smbus.SMBus with a TCA9548A multiplexer at 0x70
+# and a BME280 at 0x76 on each channel.
+class MuxSMBusMock(SMBusMock):
+    selected = 0
+    selects = []
+    failNext = False
+
+    def write_byte(self, addr, value):
+        assert addr == 0x70
+        MuxSMBusMock.selected = value
+        MuxSMBusMock.selects.append(value)
+
+    def read_i2c_block_data(self, addr, reg, length):
+        if MuxSMBusMock.failNext:
+            MuxSMBusMock.failNext = False
+            # The multiplexer lost its state.
+            MuxSMBusMock.selected = 0
+            raise OSError("NACK")
+        if MuxSMBusMock.selected not in (1 << 1, 1 << 2, 1 << 3):
+            return [ 0, ] * length
+        return SMBusMock.read_i2c_block_data(self, addr, reg, length)
+
+# Simulated bus with a TCA9548A multiplexer at 0x70.
+# The devices are addressed by (channel mask, I2C address).
+class MuxSimulatedSMBus(SimulatedSMBus):
+    devices = {}
+    selected = 0
+    selects = []
+
+    def __init__(self, index):
+        SimulatedSMBus.__init__(self, MuxSimulatedSMBus.devices)
+
+    def write_byte(self, addr, value):
+        assert addr == 0x70
+        MuxSimulatedSMBus.selected = value
+        MuxSimulatedSMBus.selects.append(value)
+
+    def _device(self, addr):
+        return SimulatedSMBus._device(self, (MuxSimulatedSMBus.selected, addr))
+
+class Test_Mux(TestCase):
+    def setUp(self):
+        bme280_driver._muxChannels.clear()
+        MuxSMBusMock.selected = 0
+        MuxSMBusMock.selects = []
+        MuxSMBusMock.failNext = False
+        MuxSimulatedSMBus.selected = 0
+        MuxSimulatedSMBus.selects = []
+
+    @patch("bme280.bme280.isMicropython", False)
+    @patch("smbus.SMBus", MuxSMBusMock)
+    def test_channel_cache(self):
+        with bme280.BME280(i2cBus={ "index": 42, "mux": 0x70, "channel": 1 }) as bme1, \
+             bme280.BME280(i2cBus={ "index": 42, "mux": 0x70, "channel": 2 }) as bme2:
+            self.assertEqual(bme1.muxChannel, (0x70, 1))
+            self.assertEqual(bme2.muxChannel, (0x70, 2))
+
+            bme1.readForced(pollSleep=0.001)
+            bme1.readForced(pollSleep=0.001)
+            self.assertEqual(MuxSMBusMock.selects, [ 1 << 1 ])
+
+            bme2.readForced(pollSleep=0.001)
+            bme1.read()
+            self.assertEqual(MuxSMBusMock.selects, [ 1 << 1, 1 << 2, 1 << 1 ])
+
+            # The channel is selected again after a bus error.
+            MuxSMBusMock.failNext = True
+            with self.assertRaises(bme280.BME280Error):
+                bme1.read()
+            t, h, p = bme1.read()
+            self.assertTrue(t > 0 and h > 0 and p > 0)
+            self.assertEqual(MuxSMBusMock.selects, [ 1 << 1, 1 << 2, 1 << 1, 1 << 1 ])
+
+        with self.assertRaises(bme280.BME280Error):
+            bme280.BME280(i2cBus={ "index": 42, "mux": 0x70, "channel": 8 })
+        with bme280.BME280(i2cBus=42) as bme:
+            self.assertIsNone(bme.muxChannel)
+
+    @patch("bme280.bme280.isMicropython", False)
+    @patch("smbus.SMBus", MuxSMBusMock)
+    def test_logger_grouping(self):
+        self.assertEqual(bme280_main.parseI2C("42:0x77@0x70:3"),
+                         { "i2cBus" : { "index" : 42, "mux" : 0x70, "channel" : 3 },
+                           "i2cAddr" : 0x77 })
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "log")
+            ret = bme280_main.main([ "--i2c", "42@0x70:2", "--i2c", "42@0x70:1",
+                                     "--i2c", "42@0x70:2", "--i2c", "42@0x70:1",
+                                     "--mode", "normal",
+                                     "--rate", "0", "--count", "3",
+                                     "--output", path ])
+            self.assertEqual(ret, 0)
+            with open(path, "r") as fd:
+                self.assertEqual(len(fd.read().splitlines()), 1 + 3 * 4)
+        # Startup and close access the sensors in the given order,
+        # which switches the channel 4 and 3 times.
+        # The sampling rounds access both sensors on a channel back to back,
+        # which switches the channel only once per round.
+        self.assertEqual(len(MuxSMBusMock.selects), 4 + 5 + 3)
+        self.assertEqual(MuxSMBusMock.selects[4:-3], [ 1 << 2, 1 << 1, 1 << 2, 1 << 1, 1 << 2 ])
+
+    @patch("bme280.bme280.isMicropython", False)
+    @patch("smbus.SMBus", MuxSimulatedSMBus)
+    def test_logger_grouping_forced(self):
+        MuxSimulatedSMBus.devices = {
+            (1 << ch, addr) : BME280Simulator() for ch in (1, 2) for addr in (0x76, 0x77)
+        }
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "log")
+            ret = bme280_main.main([ "--i2c", "42:0x76@0x70:2", "--i2c", "42:0x76@0x70:1",
+                                     "--i2c", "42:0x77@0x70:2", "--i2c", "42:0x77@0x70:1",
+                                     "--poll", "0.001",
+                                     "--rate", "0", "--count", "3",
+                                     "--output", path ])
+            self.assertEqual(ret, 0)
+            with open(path, "r") as fd:
+                self.assertEqual(len(fd.read().splitlines()), 1 + 3 * 4)
+        # The conversions poll the status several times. Still, all sensors
+        # on a channel are sampled before switching to the next channel,
+        # which switches the channel once per channel and round.
+        # Close accesses the sensors in the given order and switches 3 times.
+        selects = MuxSimulatedSMBus.selects
+        self.assertEqual(len(selects), 3 * 2 + 3)
+        self.assertEqual(selects[:6], [ 1 << 1, 1 << 2 ] * 3)
+
+# vim: ts=4 sw=4 expandtab
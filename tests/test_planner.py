@@ -0,0 +1,77 @@
+from unittest import TestCase
+from unittest.mock import patch
+import bme280
+from bme280.planner import *
+from bme280.simulator import *
+from test_simulator import FakeClock
+
+class Test_Planner(TestCase):
+    def test_tables(self):
+        # Datasheet section 9.1 examples.
+        self.assertAlmostEqual(measurementTime(bme280.OVSMPL_1, bme280.OVSMPL_1, bme280.OVSMPL_1), 0.008)
+        self.assertAlmostEqual(measurementTime(bme280.OVSMPL_1, bme280.OVSMPL_1, bme280.OVSMPL_1,
+                                               maximum=True), 0.0093)
+        self.assertAlmostEqual(measurementTime(bme280.OVSMPL_1, bme280.OVSMPL_SKIP, bme280.OVSMPL_SKIP), 0.003)
+        self.assertAlmostEqual(outputDataRate(bme280.OVSMPL_1, bme280.OVSMPL_1, bme280.OVSMPL_1,
+                                              bme280.T_SB_1000ms), 1.0 / 1.008)
+
+        # Weather monitoring: forced mode, 1 sample per minute, about 0.16 uA.
+        p = evaluate(bme280.MODE_FORCED, rate=1.0 / 60.0)
+        self.assertAlmostEqual(p.current, 0.16, delta=0.01)
+        self.assertAlmostEqual(p.forcedWait, 0.0093)
+        self.assertEqual(p.pressureNoise, 3.3)
+        self.assertEqual(p.ctrl_meas, 0x25)
+        self.assertEqual(p.ctrl_hum, 0x01)
+
+        p = evaluate(bme280.MODE_NORMAL, bme280.T_SB_p5ms, bme280.FILTER_16,
+                     bme280.OVSMPL_2, bme280.OVSMPL_1, bme280.OVSMPL_16)
+        self.assertEqual(p.pressureNoise, 0.2)
+        self.assertAlmostEqual(p.rate, 1.0 / (0.0005 + 0.001 + 0.004 + 0.0325 + 0.0025))
+        self.assertAlmostEqual(p.responseTime, 22.0 / p.rate)
+        self.assertEqual(p.config, 0x10)
+        self.assertEqual(p.ctrl_meas, 0x57)
+        self.assertEqual(p.kwargs["pressureOversampling"], bme280.OVSMPL_16)
+        with self.assertRaises(bme280.BME280Error):
+            evaluate(bme280.MODE_FORCED)
+
+    def test_plan(self):
+        p = plan(1.0)
+        self.assertGreaterEqual(p.rate, 1.0)
+        self.assertEqual((p.tempOversampling, p.humidityOversampling, p.pressureOversampling, p.filter),
+                         (bme280.OVSMPL_1, bme280.OVSMPL_1, bme280.OVSMPL_1, bme280.FILTER_OFF))
+
+        p = plan(25.0, pressureNoise=0.5, responseTime=0.5)
+        self.assertGreaterEqual(p.rate, 25.0)
+        self.assertLessEqual(p.pressureNoise, 0.5)
+        self.assertLessEqual(p.responseTime, 0.5)
+        # Nothing cheaper meets the requirements.
+        for mode, rate in ((bme280.MODE_NORMAL, None), (bme280.MODE_FORCED, 25.0)):
+            for osrs in (bme280.OVSMPL_1, bme280.OVSMPL_2, bme280.OVSMPL_4):
+                for filter in (bme280.FILTER_OFF, bme280.FILTER_2, bme280.FILTER_4,
+                               bme280.FILTER_8, bme280.FILTER_16):
+                    q = evaluate(mode, bme280.T_SB_10ms, filter,
+                                 bme280.OVSMPL_1, bme280.OVSMPL_1, osrs, rate=rate)
+                    if q.current < p.current - 0.001:
+                        self.assertTrue(q.rate < 25.0 or q.pressureNoise > 0.5 or q.responseTime > 0.5)
+
+        p = plan(150.0, humidity=False)
+        self.assertEqual(p.humidityOversampling, bme280.OVSMPL_SKIP)
+        with self.assertRaises(bme280.BME280Error):
+            plan(150.0)
+        with self.assertRaises(bme280.BME280Error):
+            plan(1.0, pressureNoise=0.1)
+
+    @patch("bme280.bme280.isMicropython", False)
+    def test_driver(self):
+        p = plan(10.0, pressureNoise=1.0, mode=bme280.MODE_NORMAL)
+        clock = FakeClock()
+        sim = BME280Simulator(clock=clock)
+        with bme280.BME280(i2cBus=SimulatedSMBus({ 0x76: sim })) as bme:
+            clock.step = 0.001
+            bme.start(mode=p.mode, **p.kwargs)
+            snap = bme.snapshot()
+            self.assertEqual((snap["config"], snap["ctrl_hum"], snap["ctrl_meas"]),
+                             (p.config, p.ctrl_hum, p.ctrl_meas))
+            self.assertAlmostEqual(sim.measurementTime, p.measurementTime)
+
+# vim: ts=4 sw=4 expandtab
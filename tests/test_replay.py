@@ -0,0 +1,126 @@
+from unittest import TestCase
+from unittest.mock import patch
+from test_simulator import FakeClock
+import bme280
+from bme280.simulator import *
+from bme280.replay import *
+from bme280.bme280 import BME280I2C
+import asyncio
+import os
+import tempfile
+import time
+
+class Test_Replay(TestCase):
+    @patch("bme280.bme280.isMicropython", False)
+    def record(self, count):
+        clock = FakeClock()
+        sim = BME280Simulator(temperature=lambda t: 20.0 + (t - 1000.0),
+                              humidity=0.4,
+                              pressure=lambda t: 98000.0 - 10.0 * (t - 1000.0),
+                              clock=clock)
+        bus = BME280I2C(SimulatedSMBus({ 0x76: sim }), 0x76, 100)
+        recorder = Recorder(bus, clock=clock)
+        values = []
+        with bme280.BME280(transport=recorder) as bme:
+            clock.step = 0.001
+            bme.reset()
+            cal = bme.getCalibration()
+            for i in range(count):
+                clock.now = 1000.0 + i
+                values.append(bme.readForced(pollSleep=0.0,
+                                             tempOversampling=bme280.OVSMPL_16,
+                                             pressureOversampling=bme280.OVSMPL_16))
+        capture = recorder.capture
+        self.assertEqual(capture.calibration, cal)
+        self.assertEqual(len(capture), count)
+        return capture, values
+
+    def test_roundtrip(self):
+        capture, values = self.record(5)
+        self.assertAlmostEqual(values[4][0], 24.07, delta=0.02)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "capture.bin")
+            capture.save(path)
+            loaded = Capture.load(path)
+            self.assertEqual(loaded.calibration, capture.calibration)
+            self.assertEqual([ loaded[i] for i in range(len(loaded)) ],
+                             [ capture[i] for i in range(len(capture)) ])
+
+            replay = ReplayTransport(path)
+            with bme280.BME280(transport=replay) as bme:
+                self.assertEqual(bme.readForced(), values[0])
+                self.assertEqual(bme.getCalibration(), capture.calibration)
+                self.assertEqual(replay.timestamp, capture[0][0])
+                self.assertEqual([ bme.read() for _ in range(4) ], values[1:])
+                self.assertEqual(replay.remaining, 0)
+                with self.assertRaises(bme280.BME280Error):
+                    bme.read()
+
+            with open(path, "r+b") as f:
+                f.truncate(os.path.getsize(path) - 1)
+            with self.assertRaises(bme280.BME280Error):
+                Capture.load(path)
+        with self.assertRaises(bme280.BME280Error):
+            ReplayTransport(Capture())
+
+    def test_loop(self):
+        capture, values = self.record(3)
+        replay = ReplayTransport(capture, loop=True)
+        with bme280.BME280(transport=replay) as bme:
+            bme.reset()
+            self.assertEqual([ bme.read() for _ in range(7) ],
+                             values + values + values[:1])
+            replay.rewind()
+            self.assertEqual(replay.position, 0)
+            self.assertEqual(bme.read(), values[0])
+
+    def test_realtime(self):
+        capture, values = self.record(4)
+        clock = FakeClock()
+        sleeps = []
+        def sleep(seconds):
+            sleeps.append(seconds)
+            clock.now += seconds
+        replay = ReplayTransport(capture, realtime=True, speed=2.0,
+                                 clock=clock, sleep=sleep)
+        with bme280.BME280(transport=replay) as bme:
+            bme.reset()
+            bme.read()
+            clock.now += 0.1
+            bme.read()
+            bme.read()
+            bme.read()
+        # One second between the records, replayed at double speed.
+        self.assertEqual(len(sleeps), 3)
+        self.assertAlmostEqual(sleeps[0], 0.4, delta=0.005)
+        self.assertAlmostEqual(sleeps[1], 0.5, delta=0.005)
+        self.assertAlmostEqual(sleeps[2], 0.5, delta=0.005)
+
+    def test_realtime_async(self):
+        capture, values = self.record(4)
+        def sleep(seconds):
+            self.fail("Blocking sleep in a coroutine.")
+        # One second between the records, replayed at 20x speed.
+        replay = ReplayTransport(capture, realtime=True, speed=20.0, sleep=sleep)
+        async def coroutine_():
+            ticks = 0
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.005)
+                    ticks += 1
+            task = asyncio.create_task(ticker())
+            async with bme280.BME280(transport=replay) as bme:
+                await bme.resetAsync()
+                begin = time.monotonic()
+                result = [ await bme.readAsync() for _ in range(4) ]
+                elapsed = time.monotonic() - begin
+            task.cancel()
+            return result, elapsed, ticks
+        result, elapsed, ticks = asyncio.run(coroutine_())
+        self.assertEqual(result, values)
+        self.assertGreaterEqual(elapsed, 0.14)
+        # The event loop kept running while waiting.
+        self.assertGreater(ticks, 10)
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,88 @@
+from unittest import TestCase
+from unittest.mock import patch
+import bme280
+from bme280.simulator import *
+
+class FlakySMBus(SimulatedSMBus):
+    """Simulated bus that fails the next 'failures' transactions
+    and returns all-0xFF data for the next 'floating' data bursts.
+    """
+    def __init__(self, devices):
+        SimulatedSMBus.__init__(self, devices)
+        self.failures = 0
+        self.floating = 0
+
+    def _device(self, addr):
+        if self.failures:
+            self.failures -= 1
+            raise OSError(121, "Remote I/O error")
+        return SimulatedSMBus._device(self, addr)
+
+    def read_i2c_block_data(self, addr, reg, length):
+        data = SimulatedSMBus.read_i2c_block_data(self, addr, reg, length)
+        if reg == 0xF7 and self.floating:
+            self.floating -= 1
+            data = [ 0xFF, ] * length
+        return data
+
+class Test_Retry(TestCase):
+    @patch("bme280.bme280.isMicropython", False)
+    def test_transient(self):
+        bus = FlakySMBus({ 0x76: BME280Simulator(temperature=22.0) })
+        stats = bme280.BME280Stats()
+        with bme280.BME280(i2cBus=bus) as bme:
+            bme.setStats(stats)
+            bme.readForced(pollSleep=0.001)
+
+            # Without retries a NACK is an error.
+            bus.failures = 1
+            with self.assertRaises(bme280.BME280Error):
+                bme.read()
+            self.assertEqual(stats.retries, 0)
+
+            bme.setRetry(retries=3, backoff=0.0001)
+            bus.failures = 2
+            t, h, p = bme.read()
+            self.assertAlmostEqual(t, 22.0, delta=0.1)
+            self.assertEqual(stats.retries, 2)
+
+            # Bounded: give up after the configured retries.
+            bus.failures = 10
+            with self.assertRaises(bme280.BME280Error):
+                bme.read()
+            self.assertEqual(stats.retries, 2 + 3)
+            bus.failures = 0
+
+            # A floating bus pattern is read again.
+            bus.floating = 1
+            t, h, p = bme.readForced(pollSleep=0.001)
+            self.assertAlmostEqual(t, 22.0, delta=0.1)
+            self.assertEqual(stats.retries, 2 + 3 + 1)
+            bus.floating = 10
+            with self.assertRaises(bme280.BME280Error):
+                bme.read()
+
+    @patch("bme280.bme280.isMicropython", False)
+    def test_brownout(self):
+        sim = BME280Simulator(temperature=22.0)
+        with bme280.BME280(i2cBus=SimulatedSMBus({ 0x76: sim })) as bme:
+            bme.setRetry(retries=8, backoff=0.002, maxBackoff=0.01, escalateAfter=2)
+            bme.start(mode=bme280.MODE_NORMAL,
+                      standbyTime=bme280.T_SB_p5ms,
+                      filter=bme280.FILTER_2)
+            bme.readForced(pollSleep=0.001) # Wait for the first conversion.
+            bme.start(mode=bme280.MODE_NORMAL,
+                      standbyTime=bme280.T_SB_p5ms,
+                      filter=bme280.FILTER_2)
+
+            # The device loses its configuration.
+            # The escalation restores it without a full reset.
+            sim.reset()
+            t, h, p = bme.read()
+            self.assertAlmostEqual(t, 22.0, delta=0.1)
+            snap = bme.snapshot()
+            self.assertEqual(snap["mode"], bme280.MODE_NORMAL)
+            self.assertEqual(snap["filter"], bme280.FILTER_2)
+            self.assertEqual(snap["osrs_h"], bme280.OVSMPL_1)
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,50 @@
+from unittest import TestCase
+from unittest.mock import patch
+from test_i2c_dummy import SMBusMock
+import bme280
+import bme280.shm
+import os
+import tempfile
+
+class Test_SharedMemory(TestCase):
+    @patch("bme280.bme280.isMicropython", False)
+    @patch("smbus.SMBus", SMBusMock)
+    def test_publish(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "shm")
+            with bme280.shm.SharedSampleWriter(path) as writer, \
+                 bme280.shm.SharedSampleReader(path) as reader, \
+                 bme280.BME280(i2cBus=42, calc=bme280.CALC_INT32) as bme:
+
+                with self.assertRaises(bme280.BME280Error):
+                    reader.read()
+
+                bme.setSampleHook(writer)
+                values = bme.readForced()
+                count, timestamp, sample, raw = reader.readSample()
+                self.assertEqual(count, 1)
+                self.assertEqual(sample, values)
+                self.assertEqual(raw, bme.readRaw())
+                self.assertEqual(raw, (0x85EFC, 0x7BD2, 0x5E962))
+                self.assertEqual(bme.compensate(*raw), values)
+
+                bme.read()
+                self.assertEqual(reader.readSample()[0], 2)
+                self.assertEqual(reader.read(), values)
+                self.assertEqual(reader.readRaw(), raw)
+
+                bme.setSampleHook(None)
+                bme.read()
+                self.assertEqual(reader.readSample()[0], 2)
+
+    def test_invalid(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "shm")
+            with open(path, "wb") as fd:
+                fd.write(bytes(bme280.shm.SIZE))
+            with self.assertRaises(bme280.BME280Error):
+                bme280.shm.SharedSampleReader(path)
+            with self.assertRaises(bme280.BME280Error):
+                bme280.shm.SharedSampleReader(os.path.join(tmpdir, "nonexistent"))
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,169 @@
+from unittest import TestCase
+from unittest.mock import patch
+import bme280
+from bme280.simulator import *
+import asyncio
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.step = 0.0
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+class Test_Simulator(TestCase):
+    def assertSample(self, sample, t, h, p):
+        self.assertAlmostEqual(sample[0], t, delta=0.01)
+        self.assertAlmostEqual(sample[1], h, delta=0.001)
+        self.assertAlmostEqual(sample[2], p, delta=1.0)
+
+    @patch("bme280.bme280.isMicropython", False)
+    def test_linux(self):
+        sim = BME280Simulator(temperature=23.5, humidity=0.42, pressure=96000.0)
+        bus = SimulatedSMBus({ 0x76: sim })
+        with bme280.BME280(i2cBus=bus) as bme:
+            self.assertSample(bme.readForced(pollSleep=0.001,
+                                             tempOversampling=bme280.OVSMPL_16,
+                                             pressureOversampling=bme280.OVSMPL_16),
+                              23.5, 0.42, 96000.0)
+        with self.assertRaises(bme280.BME280Error):
+            bme280.BME280(i2cBus=bus, i2cAddr=0x77).reset()
+
+        sim = BME280Simulator(temperature=-10.0, humidity=0.9, pressure=105000.0)
+        with bme280.BME280(spiBus=SimulatedSpiDev(sim)) as bme:
+            self.assertSample(bme.readForced(pollSleep=0.001,
+                                             tempOversampling=bme280.OVSMPL_16,
+                                             pressureOversampling=bme280.OVSMPL_16),
+                              -10.0, 0.9, 105000.0)
+
+    @patch("bme280.bme280.isMicropython", True)
+    def test_micropython(self):
+        sim = BME280Simulator(temperature=30.0, humidity=0.2, pressure=90000.0)
+        bus = SimulatedI2C({ 0x77: sim })
+        self.assertEqual(bus.scan(), [ 0x77 ])
+        with bme280.BME280(i2cBus=bus, i2cAddr=0x77, calc=bme280.CALC_INT32) as bme:
+            self.assertSample(bme.readForced(pollSleep=0.001,
+                                             tempOversampling=bme280.OVSMPL_16,
+                                             pressureOversampling=bme280.OVSMPL_16),
+                              30.0, 0.2, 90000.0)
+
+    @patch("bme280.bme280.isMicropython", False)
+    def test_snapshot(self):
+        sim = BME280Simulator(temperature=21.0, humidity=0.55, pressure=99000.0)
+        bus = SimulatedSMBus({ 0x76: sim })
+        with bme280.BME280(i2cBus=bus) as bme:
+            bme.readForced(pollSleep=0.001,
+                           filter=bme280.FILTER_4,
+                           tempOversampling=bme280.OVSMPL_16,
+                           humidityOversampling=bme280.OVSMPL_2,
+                           pressureOversampling=bme280.OVSMPL_16)
+            cal = bme.getCalibration()
+            raw = bme.readRaw()
+            # SMBus block reads are limited to 32 bytes.
+            transactions = bus.transactions
+            snap = bme.snapshot()
+            self.assertEqual(bus.transactions - transactions, 3)
+        self.assertEqual(snap["id"], 0x60)
+        self.assertFalse(snap["measuring"])
+        self.assertEqual(snap["mode"], bme280.MODE_SLEEP)
+        self.assertEqual(snap["osrs_t"], bme280.OVSMPL_16)
+        self.assertEqual(snap["osrs_p"], bme280.OVSMPL_16)
+        self.assertEqual(snap["osrs_h"], bme280.OVSMPL_2)
+        self.assertEqual(snap["filter"], bme280.FILTER_4)
+        self.assertEqual(snap["calibration"], cal)
+        self.assertEqual(snap["raw"], raw)
+        self.assertSample(snap["values"], 21.0, 0.55, 99000.0)
+
+        # Without burst limit a snapshot is one transaction
+        # and it does not require a reset.
+        sim = BME280Simulator(temperature=21.0, humidity=0.55, pressure=99000.0)
+        spi = SimulatedSpiDev(sim)
+        bme = bme280.BME280(spiBus=spi)
+        snap = bme.snapshot()
+        self.assertEqual(spi.transactions, 1)
+        self.assertEqual(snap["calibration"], bme280.simulator.DEFAULT_CALIBRATION)
+        self.assertEqual(snap["mode"], bme280.MODE_SLEEP)
+
+    def test_multi_byte_write(self):
+        sim = BME280Simulator()
+        bus = SimulatedSMBus({ 0x76: sim })
+        # Register and value pairs. Registers are not auto-incremented.
+        bus.write_i2c_block_data(0x76, 0xF2, [ 0x03, 0xF5, 0xA8, 0xF4 ])
+        self.assertEqual(sim.readRegisters(0xF2, 1)[0], 0x03)
+        self.assertEqual(sim.readRegisters(0xF5, 1)[0], 0xA8)
+        self.assertEqual(sim.readRegisters(0xF4, 1)[0], 0x00)
+        bus.write_i2c_block_data(0x76, 0xF4, [ 0x24, 0x10 ])
+        self.assertEqual(sim.readRegisters(0xF4, 2), bytes((0x24, 0xA8)))
+
+    @patch("bme280.bme280.isMicropython", False)
+    def test_timing(self):
+        clock = FakeClock()
+        sim = BME280Simulator(temperature=20.0, clock=clock)
+        bme = bme280.BME280(i2cBus=SimulatedSMBus({ 0x76: sim }))
+        async def coroutine_():
+            # Let time pass during the reset polling.
+            clock.step = 0.001
+            await bme.resetAsync()
+            clock.step = 0.0
+            clock.now += 0.01
+
+            # Forced mode: 1 + 2*1 + (2*1+0.5) + (2*1+0.5) = 8 ms.
+            await bme.startAsync(mode=bme280.MODE_FORCED)
+            self.assertAlmostEqual(sim.measurementTime, 0.008)
+            self.assertTrue(await bme.isMeasuringAsync())
+            self.assertEqual((await bme.readRawAsync())[0], 0x80000)
+            clock.now += 0.0079
+            self.assertTrue(await bme.isMeasuringAsync())
+            clock.now += 0.0002
+            self.assertFalse(await bme.isMeasuringAsync())
+            self.assertAlmostEqual((await bme.readAsync())[0], 20.0, delta=0.05)
+            self.assertEqual(sim.conversions, 1)
+
+            # Skipped pressure measurement.
+            await bme.startAsync(mode=bme280.MODE_FORCED,
+                                 pressureOversampling=bme280.OVSMPL_SKIP)
+            clock.now += 0.1
+            self.assertEqual((await bme.readRawAsync())[2], 0x80000)
+
+            # Normal mode cadence: 8 ms measurement + 62.5 ms standby.
+            await bme.startAsync(mode=bme280.MODE_NORMAL,
+                                 standbyTime=bme280.T_SB_62p5ms)
+            conversions = sim.conversions
+            clock.now += 0.0705 * 10 + 0.004
+            self.assertEqual(sim.status() & 0x08, 0x08)
+            self.assertEqual(sim.conversions, conversions + 10)
+            clock.now += 0.006
+            self.assertEqual(sim.status() & 0x08, 0)
+            self.assertEqual(sim.conversions, conversions + 11)
+
+            # IIR filter: a temperature step only propagates partially.
+            await bme.startAsync(mode=bme280.MODE_NORMAL,
+                                 standbyTime=bme280.T_SB_p5ms,
+                                 filter=bme280.FILTER_16,
+                                 tempOversampling=bme280.OVSMPL_16)
+            clock.now += 0.1
+            sim.temperature = 40.0
+            clock.now += 0.0415
+            t = (await bme.readAsync())[0]
+            self.assertGreater(t, 21.0)
+            self.assertLess(t, 30.0)
+            clock.now += 10.0
+            self.assertAlmostEqual((await bme.readAsync())[0], 40.0, delta=0.05)
+        asyncio.run(coroutine_())
+
+    def test_waveform(self):
+        clock = FakeClock()
+        clock.now = 0.0
+        sim = BME280Simulator(pressure=sine(100000.0, 500.0, 4.0), noise=True, seed=1, clock=clock)
+        bme = bme280.BME280(spiBus=SimulatedSpiDev(sim))
+        clock.step = 0.001
+        bme.reset()
+        clock.step = 0.0
+        clock.now = 1.0
+        bme.start(mode=bme280.MODE_FORCED, pressureOversampling=bme280.OVSMPL_16)
+        clock.now += 0.1
+        self.assertAlmostEqual(bme.read()[2], 100500.0, delta=5.0)
+
+# vim: ts=4 sw=4 expandtab
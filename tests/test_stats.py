@@ -0,0 +1,61 @@
+from unittest import TestCase
+from unittest.mock import patch
+from test_i2c_dummy import SMBusMock
+import bme280
+import json
+
+class ErrorSMBusMock(SMBusMock):
+    def read_i2c_block_data(self, addr, reg, length):
+        if reg == 0xF7:
+            raise OSError("NACK")
+        return SMBusMock.read_i2c_block_data(self, addr, reg, length)
+
+class Test_Stats(TestCase):
+    @patch("bme280.bme280.isMicropython", False)
+    @patch("smbus.SMBus", SMBusMock)
+    def test_stats(self):
+        hookEvents = []
+        stats = bme280.BME280Stats(trace=True,
+                                   hook=lambda op, begin, duration: hookEvents.append(op))
+        with bme280.BME280(i2cBus=42) as bme:
+            bme.setStats(stats)
+            bme.readForced(pollSleep=0.001)
+            self.assertEqual(stats.errors, 0)
+            self.assertEqual(stats.retries, 0)
+            self.assertGreater(stats.transactions, 10)
+            self.assertGreaterEqual(stats.bytesRead, 26 + 7 + 8)
+            self.assertEqual(stats.bytesWritten, 4)
+            for op in bme280.BME280Stats.OPS:
+                # Status is polled in reset and in the conversion wait loop.
+                self.assertEqual(sum(stats.histograms[op]), 2 if op == "status" else 1, op)
+            self.assertIsNotNone(stats.percentile("data", 0.99))
+            self.assertEqual(len(stats.events), len(hookEvents))
+            self.assertEqual(hookEvents.count("reset"), 1)
+            self.assertEqual(hookEvents.count("write"), 4)
+
+            trace = json.loads(stats.chromeTrace())
+            self.assertEqual(len(trace["traceEvents"]), len(stats.events))
+            self.assertEqual(trace["traceEvents"][0]["ph"], "X")
+
+            # Disabled instrumentation does not count anything.
+            bme.setStats(None)
+            transactions = stats.transactions
+            bme.readForced(pollSleep=0.001)
+            self.assertEqual(stats.transactions, transactions)
+
+            stats.clear()
+            self.assertEqual(stats.transactions, 0)
+            self.assertIsNone(stats.percentile("data", 0.5))
+
+    @patch("bme280.bme280.isMicropython", False)
+    @patch("smbus.SMBus", ErrorSMBusMock)
+    def test_errors(self):
+        stats = bme280.BME280Stats()
+        with bme280.BME280(i2cBus=42) as bme:
+            bme.setStats(stats)
+            with self.assertRaises(bme280.BME280Error):
+                bme.readForced(pollSleep=0.001)
+            self.assertEqual(stats.errors, 1)
+            self.assertEqual(stats.events, [])
+
+# vim: ts=4 sw=4 expandtab
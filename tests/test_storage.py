@@ -0,0 +1,79 @@
+from unittest import TestCase
+from unittest.mock import patch
+from test_i2c_dummy import SMBusMock
+import bme280
+import bme280.storage
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+class Test_Storage(TestCase):
+    def test_rollup(self):
+        with bme280.storage.SQLiteSink(":memory:", batchSize=10, batchAge=1000.0) as db:
+            base = 1700000000.0 - (1700000000.0 % 3600)
+            for i in range(25):
+                db.add("a", 20.0 + i * 0.01, 0.5, 100000.0 + i, timestamp=base + i * 10.0)
+            db.add("b", -5.0, 0.25, 95000.0, timestamp=base)
+
+            raw = db.query("a", base, base + 60.0)
+            self.assertEqual(len(raw), 6)
+            self.assertAlmostEqual(raw[1][1], 20.01, places=4)
+            self.assertAlmostEqual(raw[5][3], 100005.0, places=1)
+
+            minutes = db.query("a", base, base + 3600.0, bme280.storage.ROLLUP_MINUTE)
+            self.assertEqual([ m[1] for m in minutes ], [ 6, 6, 6, 6, 1 ])
+            ts, n, t, h, p = minutes[0]
+            self.assertEqual(ts, base)
+            self.assertAlmostEqual(t[0], 20.025, places=4)
+            self.assertAlmostEqual(t[1], 20.0, places=4)
+            self.assertAlmostEqual(t[2], 20.05, places=4)
+            self.assertAlmostEqual(p[2], 100005.0, places=1)
+
+            hours = db.query("a", base, base + 3600.0, bme280.storage.ROLLUP_HOUR)
+            self.assertEqual(len(hours), 1)
+            self.assertEqual(hours[0][1], 25)
+            self.assertAlmostEqual(hours[0][4][0], 100012.0, places=1)
+
+            hours = db.query("b", base, base + 3600.0, bme280.storage.ROLLUP_HOUR)
+            self.assertEqual(hours[0][1], 1)
+            self.assertAlmostEqual(hours[0][2][0], -5.0, places=4)
+            self.assertAlmostEqual(hours[0][3][0], 0.25, places=4)
+
+    def test_flush_error(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "db.sqlite")
+            with bme280.storage.SQLiteSink(path, batchSize=1000, batchAge=1000.0) as db:
+                db.sensorId("a")
+                other = sqlite3.connect(path)
+                other.execute("CREATE TRIGGER fail BEFORE INSERT ON samples "
+                              "BEGIN SELECT RAISE(ABORT, 'disk full'); END")
+                other.commit()
+                for i in range(3):
+                    db.add("a", 20.0, 0.5, 100000.0, timestamp=1000.0 + i)
+                with self.assertRaises(bme280.BME280Error):
+                    db.flush()
+                # The batch is kept and committed with the next flush.
+                other.execute("DROP TRIGGER fail")
+                other.commit()
+                other.close()
+                db.add("a", 20.0, 0.5, 100000.0, timestamp=1003.0)
+                db.flush()
+                self.assertEqual(len(db.query("a", 0, 1e10)), 4)
+                hours = db.query("a", 0, 1e10, bme280.storage.ROLLUP_HOUR)
+                self.assertEqual(hours[0][1], 4)
+
+    @patch("bme280.bme280.isMicropython", False)
+    @patch("smbus.SMBus", SMBusMock)
+    def test_sample(self):
+        with bme280.storage.SQLiteSink(":memory:") as db:
+            with bme280.BME280(i2cBus=42, calc=bme280.CALC_INT32) as bme:
+                bme.start(mode=bme280.MODE_NORMAL)
+                t, h, p = asyncio.run(db.sampleAsync("x", bme))
+            raw = db.query("x", 0, 1e10)
+            self.assertEqual(len(raw), 1)
+            self.assertAlmostEqual(raw[0][1], 27.1, places=2)
+            self.assertAlmostEqual(raw[0][2], 0.4517, places=4)
+            self.assertAlmostEqual(raw[0][3], 98484.0, places=1)
+
+# vim: ts=4 sw=4 expandtab
@@ -0,0 +1,140 @@
+from unittest import TestCase
+from test_i2c_dummy import SMBusMock
+import bme280
+import asyncio
+
+class TransportMock(bme280.BME280Transport):
+    """Plain transport without batch support.
+    """
+    def __init__(self):
+        self.smbus = SMBusMock(42)
+        self.roundTrips = 0
+        self.writes = []
+        self.polls = 0
+
+    def read(self, reg, length):
+        self.roundTrips += 1
+        if reg == 0xF3:
+            # Report one pending measurement after each trigger.
+            self.polls += 1
+            return bytes((0x08 if self.polls == 1 else 0x00, ))
+        return bytes(self.smbus.read_i2c_block_data(0x76, reg, length))
+
+    def write(self, reg, data):
+        self.roundTrips += 1
+        self.writes.append((reg, bytes(data)))
+        if reg == 0xF4:
+            self.polls = 0
+
+class BatchTransportMock(TransportMock):
+    """Transport with batch submission.
+    """
+    def __init__(self):
+        TransportMock.__init__(self)
+        self.batches = []
+
+    def transfer(self, ops):
+        self.batches.append(ops)
+        roundTrips = self.roundTrips
+        results = []
+        for reg, arg in ops:
+            if isinstance(arg, int):
+                results.append(self.read(reg, arg))
+            else:
+                self.write(reg, arg)
+                results.append(None)
+        self.roundTrips = roundTrips + 1
+        return results
+
+class AsyncTransportMock(BatchTransportMock):
+    """Transport with coroutine variants.
+    """
+    def __init__(self):
+        BatchTransportMock.__init__(self)
+        self.awaited = 0
+
+    async def readAsync(self, reg, length):
+        self.awaited += 1
+        return self.read(reg, length)
+
+    async def writeAsync(self, reg, data):
+        self.awaited += 1
+        self.write(reg, data)
+
+    async def transferAsync(self, ops):
+        self.awaited += 1
+        return self.transfer(ops)
+
+class FailingTransportMock(BatchTransportMock):
+    def transfer(self, ops):
+        raise bme280.BME280Error("BME280: Link down.")
+
+class Test_Transport(TestCase):
+    def check(self, values):
+        t, h, p = values
+        self.assertAlmostEqual(t, 27.099998, places=4)
+        self.assertAlmostEqual(h, 0.451729, places=4)
+        self.assertAlmostEqual(p, 98484.001160, places=1)
+
+    def test_plain(self):
+        transport = TransportMock()
+        with bme280.BME280(transport=transport, calc=bme280.CALC_INT32) as bme:
+            self.check(bme.readForced(pollSleep=0.001))
+            self.assertEqual(bme.readRaw(), (0x85EFC, 0x7BD2, 0x5E962))
+        # ctrl_hum is written before ctrl_meas.
+        regs = [ reg for reg, data in transport.writes ]
+        self.assertLess(regs.index(0xF2), regs.index(0xF4))
+
+    def test_batch(self):
+        plain = TransportMock()
+        with bme280.BME280(transport=plain, calc=bme280.CALC_INT32) as bme:
+            bme.reset()
+            plain.roundTrips = 0
+            self.check(bme.readForced(pollSleep=0.001))
+            plainRoundTrips = plain.roundTrips
+
+        batched = BatchTransportMock()
+        with bme280.BME280(transport=batched, calc=bme280.CALC_INT32) as bme:
+            bme.reset()
+            # The ID checks and calibration reads are batched.
+            self.assertIn(((0xD0, 1), ) * 10, batched.batches)
+            self.assertIn(((0x88, 26), (0xE1, 7)), batched.batches)
+            batched.roundTrips = 0
+            self.check(bme.readForced(pollSleep=0.001))
+            self.assertLess(batched.roundTrips, plainRoundTrips)
+            # Unchanged cached registers are not written again.
+            batched.writes = []
+            bme.readForced(pollSleep=0.001)
+            self.assertEqual([ reg for reg, data in batched.writes ], [ 0xF4 ])
+
+    def test_async(self):
+        transport = AsyncTransportMock()
+        async def run():
+            async with bme280.BME280(transport=transport, calc=bme280.CALC_INT32) as bme:
+                self.check(await bme.readForcedAsync(pollSleep=0.001))
+                self.assertEqual(await bme.readRawAsync(), (0x85EFC, 0x7BD2, 0x5E962))
+        asyncio.run(run())
+        self.assertGreater(transport.awaited, 0)
+
+    def test_stats(self):
+        stats = bme280.BME280Stats(trace=True)
+        with bme280.BME280(transport=BatchTransportMock()) as bme:
+            bme.setStats(stats)
+            bme.readForced(pollSleep=0.001)
+            self.assertGreater(stats.transactions, 10)
+            self.assertGreaterEqual(stats.bytesRead, 10 + 26 + 7 + 8)
+            self.assertEqual(stats.bytesWritten, 4)
+            self.assertIn("transfer", [ e[0] for e in stats.events ])
+            # Two status polls in reset() and one while measuring.
+            # The final status and data batch is accounted as data only.
+            self.assertEqual(sum(stats.histograms["status"]), 3)
+            self.assertEqual(sum(stats.histograms["data"]), 1)
+
+        stats = bme280.BME280Stats()
+        with bme280.BME280(transport=FailingTransportMock()) as bme:
+            bme.setStats(stats)
+            with self.assertRaises(bme280.BME280Error):
+                bme.readForced(pollSleep=0.001)
+            self.assertEqual(stats.errors, 1)
+
+# vim: ts=4 sw=4 expandtab